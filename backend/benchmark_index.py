@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark rebuild_index() cold starts on synthetic car files.
+
+Generates N car_data_*_latest.json files modelled on a real listing and times
+the scan/parse/index phases for serial loading, the thread pool, the process
+pool, with the standard json module and with orjson (when installed), plus a
+restart from the index snapshot with no changed files.
+
+    uv run python benchmark_index.py --counts 10000 100000
+"""
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import main
+import storage
+from storage import JsonFileStorage
+
+SAMPLE_DESCRIPTION = (
+    "Witam, mam do sprzedania kampera na bazie Forda Transita z 2013 r. Ogrzewanie Webasto (4 kW 12V), "
+    "lodówka na 12V, kuchenka na kartusze, zbiornik na wodę czystą i brudną po 25 litrów, zlewozmywak, "
+    "nowa markiza, kamera cofania, tempomat, hak. "
+) * 4
+
+
+def synthetic_car(i: int, rng: random.Random) -> dict:
+    car_id = f"ID6B{i:07d}"
+    return {
+        "url": f"https://www.otomoto.pl/dostawcze/oferta/ford-transit-{car_id}.html",
+        "timestamp": "2025-07-14T23:52:19.247Z",
+        "version": 1_750_000_000_000 + i,
+        "data": {
+            "car_name": rng.choice(["Ford Transit", "Fiat Ducato", "Renault Master", "Mercedes-Benz Sprinter"]),
+            "price": f"{rng.randint(20, 250)} {rng.randint(0, 999):03d}",
+            "location": "Boguszów-Gorce, wałbrzyski, Dolnośląskie",
+            "description": SAMPLE_DESCRIPTION,
+            "vin": f"WF0XXXTTFXDG{i:05d}"[:17],
+            "mileage": f"{rng.randint(10, 450)} {rng.randint(0, 999):03d} km",
+            "year": str(rng.randint(1995, 2024)),
+            "cubic_capacity": "2 198 cm3",
+            "user_grade": rng.randint(0, 5),
+            "user_notes": "",
+        },
+    }
+
+
+def generate(directory: Path, count: int):
+    rng = random.Random(count)
+    for i in range(count):
+        car = synthetic_car(i, rng)
+        car_id = f"ID6B{i:07d}"
+        with open(directory / f"car_data_{car_id}_latest.json", 'w', encoding='utf-8') as f:
+            json.dump(car, f, ensure_ascii=False, indent=2)
+
+
+def run(directory: Path, workers: int, executor: str, use_orjson: bool) -> dict:
+    saved_orjson = storage.orjson
+    storage.orjson = saved_orjson if use_orjson else None
+    main.SNAPSHOT_PATH = ""
+    try:
+        main.STORAGE = JsonFileStorage(directory, workers=workers, executor=executor)
+        main.rebuild_index()
+        return dict(main.INDEX_TIMINGS)
+    finally:
+        storage.orjson = saved_orjson
+
+
+def run_snapshot_restart(directory: Path, workers: int) -> dict:
+    main.SNAPSHOT_PATH = str(directory.parent / f"{directory.name}-snapshot.json")
+    try:
+        main.STORAGE = JsonFileStorage(directory, workers=workers)
+        main.rebuild_index()
+        main.write_index_snapshot()
+        main.rebuild_index()
+        return dict(main.INDEX_TIMINGS)
+    finally:
+        Path(main.SNAPSHOT_PATH).unlink(missing_ok=True)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark rebuild_index() on synthetic car files")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--workers", type=int, default=storage.LOAD_WORKERS)
+    args = parser.parse_args()
+
+    configs = [("serial", 1, "thread", False), ("threads", args.workers, "thread", False),
+               ("processes", args.workers, "process", False)]
+    if storage.orjson is not None:
+        configs += [("serial+orjson", 1, "thread", True), ("threads+orjson", args.workers, "thread", True),
+                    ("processes+orjson", args.workers, "process", True)]
+
+    results = []
+    for count in args.counts:
+        directory = Path(tempfile.mkdtemp(prefix="otomoto-bench-"))
+        try:
+            started = time.perf_counter()
+            generate(directory, count)
+            print(f"Generated {count} files in {time.perf_counter() - started:.1f}s")
+            for name, workers, executor, use_orjson in configs:
+                timings = run(directory, workers, executor, use_orjson)
+                results.append((count, name, timings))
+            results.append((count, "snapshot restart", run_snapshot_restart(directory, args.workers)))
+        finally:
+            shutil.rmtree(directory)
+
+    print()
+    print(f"{'files':>8}  {'config':<18} {'scan':>7} {'parse':>7} {'index':>7} {'total':>7}")
+    for count, name, timings in results:
+        # A snapshot restart scans the directory with stat() and reads the snapshot instead
+        scan = timings.get("scan", timings.get("stat", 0) + timings.get("snapshot", 0) + timings.get("restore", 0))
+        print(f"{count:>8}  {name:<18} {scan:>7.2f} " + " ".join(f"{timings.get(phase, 0):>7.2f}"
+                                                                for phase in ("parse", "index", "total")))
+
+
+if __name__ == "__main__":
+    main_benchmark()
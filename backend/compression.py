@@ -0,0 +1,150 @@
+"""
+Response compression middleware (brotli when available, gzip otherwise).
+
+Starlette only ships gzip; brotli is used if the optional "brotli" package is
+installed. Strong ETags get a content-coding suffix ("-br" / "-gzip") so the
+compressed and identity representations never share a validator.
+"""
+import gzip
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is an optional speedup
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/css", "application/javascript")
+ETAG_SUFFIXES = {"br": "-br", "gzip": "-gzip"}
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported content-coding from an Accept-Encoding header"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def strip_encoding_suffix(etag: str) -> str:
+    """Remove the content-coding suffix added to an ETag by the middleware"""
+    for suffix in ETAG_SUFFIXES.values():
+        if etag.endswith(suffix + '"'):
+            return etag[: -len(suffix) - 1] + '"'
+    return etag
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def matched_etag(if_none_match: str, etag: str) -> str:
+    """The If-None-Match entry that matched an ETag, with or without its content-coding suffix"""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if strip_encoding_suffix(candidate) == etag:
+            return candidate
+    return etag
+
+
+def representation_headers(headers: List[Tuple[bytes, bytes]], encoding: str,
+                           if_none_match: Optional[str] = None) -> List[Tuple[bytes, bytes]]:
+    """Headers with Vary: Accept-Encoding and the ETag suffixed for the content-coding
+
+    For a 304 (if_none_match given), the ETag is the validator the client
+    matched: a response stored uncompressed because it was small has none.
+    """
+    header_map = {k.lower(): v for k, v in headers}
+    headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"etag", b"vary")]
+    vary = header_map.get(b"vary", b"")
+    headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+    etag = header_map.get(b"etag")
+    if etag is not None and if_none_match is not None:
+        headers.append((b"etag", matched_etag(if_none_match, etag.decode("latin-1")).encode("latin-1")))
+    elif etag is not None:
+        suffixed = etag.decode("latin-1")
+        if etag.endswith(b'"') and not etag.startswith(b"W/"):
+            suffixed = suffixed[:-1] + ETAG_SUFFIXES[encoding] + '"'
+        headers.append((b"etag", suffixed.encode("latin-1")))
+    return headers
+
+
+class CompressionMiddleware:
+    """Compress JSON/HTML responses of a known length of at least minimum_size
+
+    The decision is made from the response headers: images, already encoded,
+    small and streamed (no Content-Length) bodies pass through unbuffered.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    def compressible(self, headers: List[Tuple[bytes, bytes]]) -> bool:
+        header_map = {k.lower(): v for k, v in headers}
+        content_type = header_map.get(b"content-type", b"").decode("latin-1")
+        try:
+            length = int(header_map[b"content-length"])
+        except (KeyError, ValueError):
+            return False
+        return (
+            length >= self.minimum_size
+            and b"content-encoding" not in header_map
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope.get("headers", []))
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        buffering = False
+        body_parts: List[bytes] = []
+
+        async def send_wrapper(message):
+            nonlocal start_message, buffering
+            if message["type"] == "http.response.start":
+                headers = list(message["headers"])
+                if message["status"] == 304:
+                    # Unless the body type is never compressed, echo the validator the client holds
+                    content_type = dict((k.lower(), v) for k, v in headers).get(b"content-type", b"")
+                    if not content_type or content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES):
+                        if_none_match = request_headers.get(b"if-none-match", b"").decode("latin-1")
+                        headers = representation_headers(headers, encoding, if_none_match)
+                    await send({**message, "headers": headers})
+                elif self.compressible(headers):
+                    start_message, buffering = message, True
+                else:
+                    await send(message)
+                return
+            if not buffering or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = compress(b"".join(body_parts), encoding)
+            headers = representation_headers(start_message["headers"], encoding)
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
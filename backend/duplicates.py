@@ -0,0 +1,237 @@
+"""
+Perceptual-hash index of mirrored car images to spot reposted listings.
+
+A camper relisted under a new ID usually comes back with the same photos,
+re-encoded by the CDN. Every mirrored image gets a 64-bit difference hash
+(dHash: whether each pixel of a 9x8 grayscale thumbnail is brighter than its
+right neighbour), which survives re-encoding and resizing, and two images are
+considered the same photo when their hashes differ in at most
+DUPLICATE_MAX_DISTANCE bits. Cars sharing DUPLICATE_MIN_MATCHES such photos
+are likely the same vehicle.
+
+Near hashes are found with multi-index hashing: the 64 bits are split into
+max_distance + 1 chunks, and two hashes within the distance must agree exactly
+on at least one chunk (pigeonhole), so a lookup is one dict probe per chunk
+plus a popcount per candidate instead of a scan.
+
+dHash needs the optional Pillow package; without it only byte-identical photos
+(same sha256 in the image store) are matched. Hashes are cached in dhash.log
+next to the images.
+
+    uv run python duplicates.py benchmark --images 100000
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is an optional speedup
+    Image = None
+
+from image_store import ImageStore
+
+DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", "6"))
+DUPLICATE_MIN_MATCHES = int(os.getenv("DUPLICATE_MIN_MATCHES", "2"))
+HASH_BITS = 64
+# Hashes of flat images (placeholders, blank frames) carry no information
+MIN_HASH_BITS_SET = 4
+
+
+def dhash(path: Path) -> Optional[int]:
+    """64-bit difference hash of an image file (None without Pillow or if unreadable)"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            pixels = list(image.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    except Exception as e:
+        print(f"Failed to hash image {path.name[:12]}: {e}")
+        return None
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            value = value << 1 | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+    return value
+
+
+def informative(value: int) -> bool:
+    return MIN_HASH_BITS_SET <= value.bit_count() <= HASH_BITS - MIN_HASH_BITS_SET
+
+
+class MultiIndexHash:
+    """Set of 64-bit hashes searchable by Hamming distance"""
+
+    def __init__(self, max_distance: int = DUPLICATE_MAX_DISTANCE, bits: int = HASH_BITS):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        # (shift, mask) of each chunk; the first chunks take the leftover bits
+        self.chunks: List[Tuple[int, int]] = []
+        shift = bits
+        for i in range(chunks):
+            width = bits // chunks + (1 if i < bits % chunks else 0)
+            shift -= width
+            self.chunks.append((shift, (1 << width) - 1))
+        self.tables: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in self.chunks]
+        self.values: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, value: int):
+        if value in self.values:
+            return
+        self.values.add(value)
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table[value >> shift & mask].add(value)
+
+    def search(self, value: int) -> List[Tuple[int, int]]:
+        """(distance, value) of the stored hashes within max_distance bits, nearest first"""
+        candidates: Set[int] = set()
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            candidates.update(table.get(value >> shift & mask, ()))
+        matches = []
+        for candidate in candidates:
+            distance = (value ^ candidate).bit_count()
+            if distance <= self.max_distance:
+                matches.append((distance, candidate))
+        return sorted(matches)
+
+
+class DuplicateIndex:
+    """Links cars whose mirrored images show the same photos"""
+
+    def __init__(self, store: ImageStore, max_distance: int = DUPLICATE_MAX_DISTANCE,
+                 min_matches: int = DUPLICATE_MIN_MATCHES):
+        self.store = store
+        self.min_matches = min_matches
+        self.log_path = store.directory / "dhash.log"
+        self.fingerprints: Dict[str, int] = self._read_log()
+        self.hashes = MultiIndexHash(max_distance)
+        # dHash -> image hashes (sha256) with it
+        self.images_by_dhash: Dict[int, Set[str]] = defaultdict(set)
+        self.car_images: Dict[str, Set[str]] = defaultdict(set)
+        self.image_cars: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+        # Bumped whenever a car gains an image, so pages listing duplicates can be revalidated
+        self.generation = 0
+
+    def _read_log(self) -> Dict[str, int]:
+        fingerprints = {}
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    image_hash, _, value = line.strip().partition(" ")
+                    try:
+                        fingerprints[image_hash] = int(value, 16)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return fingerprints
+
+    def fingerprint(self, image_hash: str) -> Optional[int]:
+        """dHash of a mirrored image, computed once and cached in dhash.log"""
+        value = self.fingerprints.get(image_hash)
+        if value is None:
+            value = dhash(self.store.object_path(image_hash))
+            if value is None:
+                return None
+            with self._lock:
+                if image_hash not in self.fingerprints:
+                    with open(self.log_path, 'a', encoding='utf-8') as f:
+                        f.write(f"{image_hash} {value:016x}\n")
+                    self.fingerprints[image_hash] = value
+        return value
+
+    def add(self, car_id: str, image_hash: str):
+        """Record that a car shows a mirrored image"""
+        if image_hash in self.car_images.get(car_id, ()):
+            return
+        value = self.fingerprint(image_hash)
+        with self._lock:
+            if value is not None and informative(value):
+                self.hashes.add(value)
+                self.images_by_dhash[value].add(image_hash)
+            self.car_images[car_id].add(image_hash)
+            self.image_cars[image_hash].add(car_id)
+            self.generation += 1
+
+    def remove_car(self, car_id: str):
+        with self._lock:
+            for image_hash in self.car_images.pop(car_id, ()):
+                self.image_cars[image_hash].discard(car_id)
+            self.generation += 1
+
+    def similar_images(self, image_hash: str) -> Set[str]:
+        """Image hashes of the same photo (the image itself included)"""
+        similar = {image_hash}
+        value = self.fingerprints.get(image_hash)
+        if value is not None and informative(value):
+            for _, match in self.hashes.search(value):
+                similar.update(self.images_by_dhash[match])
+        return similar
+
+    def duplicates(self, car_id: str) -> Optional[Dict[str, int]]:
+        """Other cars sharing min_matches photos with this one: car_id -> number of its photos they share
+
+        None (unknown) while fewer than min_matches of the car's photos are hashed, e.g.
+        for a car restored from the snapshot with only its main image mirrored: one
+        shared stock photo is not evidence of a repost.
+        """
+        with self._lock:
+            images = list(self.car_images.get(car_id, ()))
+            if len(images) < self.min_matches:
+                return None
+            shared: Dict[str, int] = defaultdict(int)
+            for image_hash in images:
+                others = set()
+                for similar in self.similar_images(image_hash):
+                    others.update(self.image_cars.get(similar, ()))
+                others.discard(car_id)
+                for other in others:
+                    shared[other] += 1
+        return {other: count for other, count in shared.items() if count >= self.min_matches}
+
+
+def benchmark(images: int, lookups: int, max_distance: int):
+    """Time lookups in an index of random hashes, with a near copy of every queried hash stored"""
+    rng = random.Random(42)
+    index = MultiIndexHash(max_distance)
+    values = [rng.getrandbits(HASH_BITS) for _ in range(images)]
+    started = time.perf_counter()
+    for value in values:
+        index.add(value)
+    print(f"Indexed {images} hashes in {time.perf_counter() - started:.2f}s")
+
+    queries = []
+    for value in rng.sample(values, lookups):
+        for bit in rng.sample(range(HASH_BITS), max_distance):
+            value ^= 1 << bit
+        queries.append(value)
+    started = time.perf_counter()
+    found = sum(1 for value in queries if index.search(value))
+    elapsed = time.perf_counter() - started
+    print(f"{lookups} lookups at distance {max_distance}: {elapsed / lookups * 1e6:.0f} us each, {found} found")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perceptual-hash index of car images")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    benchmark_parser = subparsers.add_parser("benchmark", help="Time lookups in a synthetic index")
+    benchmark_parser.add_argument("--images", type=int, default=100_000)
+    benchmark_parser.add_argument("--lookups", type=int, default=2000)
+    benchmark_parser.add_argument("--max-distance", type=int, default=DUPLICATE_MAX_DISTANCE)
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        benchmark(args.images, args.lookups, args.max_distance)
+
+
+if __name__ == "__main__":
+    main()
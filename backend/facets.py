@@ -0,0 +1,150 @@
+"""
+Faceted filtering of cars by the CamperFeatures the extractor found.
+
+Every car with features gets a bit position, and each facet value (e.g.
+has_webasto=true, kitchen_location=inside) keeps a bitmap of the cars having
+it as a Python int. A selection ORs the bitmaps of the values chosen within a
+field and ANDs the fields together, and facet counts are popcounts of those
+ANDs, so any combination is a handful of big-int operations over n/64 machine
+words rather than a scan of the feature dicts.
+
+The fields mirror extractor/models.py: boolean has_* flags and the Literal
+enum fields (free-text fields such as bed_length are not facets).
+"""
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+BOOLEAN_FACETS = (
+    "has_solar_panels", "has_webasto", "has_air_conditioning",
+    "has_water_tap_inside", "has_roof_window", "has_door_window",
+)
+VALUE_FACETS = (
+    "bed_orientation", "roof_height", "kitchen_location", "shower_location",
+    "front_back_connection", "stealth_level", "van_height",
+)
+FACET_FIELDS = BOOLEAN_FACETS + VALUE_FACETS
+
+# field -> values chosen (any of them matches); sorted tuples so queries hash and compare
+Selection = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+def facet_value(field: str, value: Any) -> Optional[str]:
+    if field in BOOLEAN_FACETS:
+        return ("true" if value else "false") if isinstance(value, bool) else None
+    return value.strip().lower() if isinstance(value, str) and value.strip() else None
+
+
+def parse_selection(params: Mapping[str, str]) -> Selection:
+    """Facet filters from query parameters: has_webasto=true&kitchen_location=inside,outside"""
+    selection = []
+    for field in FACET_FIELDS:
+        values = {value.strip().lower() for value in (params.get(field) or '').split(',') if value.strip()}
+        if values:
+            selection.append((field, tuple(sorted(values))))
+    return tuple(selection)
+
+
+class FacetIndex:
+    """Bitmaps of the cars having each facet value"""
+
+    def __init__(self):
+        self.positions: Dict[str, int] = {}
+        self.car_ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        self.bitmaps: Dict[Tuple[str, str], int] = {}
+        self._values: Dict[str, List[Tuple[str, str]]] = {}
+        # Bitmap of every car with features
+        self.all = 0
+        # Bumped on every change, so pages filtered by features can be revalidated
+        self.generation = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def set(self, car_id: str, features: Dict[str, Any]):
+        keys = [(field, value) for field in FACET_FIELDS
+                if (value := facet_value(field, features.get(field))) is not None]
+        with self._lock:
+            if self._values.get(car_id) == keys:
+                return
+            self.remove(car_id)
+            position = self._free.pop() if self._free else len(self.car_ids)
+            if position == len(self.car_ids):
+                self.car_ids.append(None)
+            self.car_ids[position] = car_id
+            self.positions[car_id] = position
+            bit = 1 << position
+            for key in keys:
+                self.bitmaps[key] = self.bitmaps.get(key, 0) | bit
+            self._values[car_id] = keys
+            self.all |= bit
+            self.generation += 1
+
+    def remove(self, car_id: str):
+        with self._lock:
+            position = self.positions.pop(car_id, None)
+            if position is None:
+                return
+            mask = ~(1 << position)
+            for key in self._values.pop(car_id):
+                self.bitmaps[key] &= mask
+                if not self.bitmaps[key]:
+                    del self.bitmaps[key]
+            self.all &= mask
+            self.car_ids[position] = None
+            self._free.append(position)
+            self.generation += 1
+
+    def clear(self):
+        with self._lock:
+            self.positions.clear()
+            self.car_ids.clear()
+            self._free.clear()
+            self.bitmaps.clear()
+            self._values.clear()
+            self.all = 0
+            self.generation += 1
+
+    def field_bitmap(self, field: str, values: Tuple[str, ...]) -> int:
+        bits = 0
+        for value in values:
+            bits |= self.bitmaps.get((field, value), 0)
+        return bits
+
+    def filter(self, selection: Selection, skip: Optional[str] = None) -> int:
+        """Bitmap of the cars matching every field of the selection (but the skipped one)"""
+        with self._lock:
+            bits = self.all
+            for field, values in selection:
+                if field != skip:
+                    bits &= self.field_bitmap(field, values)
+            return bits
+
+    def select(self, selection: Selection) -> List[str]:
+        """Car IDs matching the selection, in bit order"""
+        # Positions are reused after removals, so the bitmap is mapped to IDs under the same lock
+        with self._lock:
+            return self._ids(self.filter(selection))
+
+    def _ids(self, bits: int) -> List[str]:
+        ids = []
+        car_ids = self.car_ids
+        # Scanning the binary digits is linear; clearing bits one by one copies the int each time
+        digits = bin(bits)[:1:-1]
+        position = digits.find('1')
+        while position >= 0:
+            ids.append(car_ids[position])
+            position = digits.find('1', position + 1)
+        return ids
+
+    def counts(self, selection: Selection) -> Dict[str, Dict[str, int]]:
+        """Cars per value of each field, under the selection of the other fields"""
+        counts: Dict[str, Dict[str, int]] = {field: {} for field in FACET_FIELDS}
+        with self._lock:
+            base = self.filter(selection)
+            # A field's own choice doesn't narrow its alternatives
+            within = {field: self.filter(selection, skip=field) for field, _ in selection}
+            for (field, value), bitmap in self.bitmaps.items():
+                counts[field][value] = (within.get(field, base) & bitmap).bit_count()
+        return {field: dict(sorted(values.items())) for field, values in counts.items()}
@@ -0,0 +1,53 @@
+"""
+Camper features written by the extractor to parsed_data/features_{car_id}_latest.json.
+
+The backend keeps them in memory next to the car records (search indexes the
+accessories) and picks up new extractions with the same file watchers as
+extracted_data/.
+"""
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+FEATURES_FILE = re.compile(r'^features_(.+)_latest\.json$')
+
+
+def features_car_id(filename: str) -> Optional[str]:
+    match = FEATURES_FILE.match(filename)
+    return match.group(1) if match else None
+
+
+def read_features(path: Path) -> Optional[Dict[str, Any]]:
+    """The features of one extraction result, or None if unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Skipping unreadable features file {path.name}: {e}")
+        return None
+    features = result.get('features') if isinstance(result, dict) else None
+    return features if isinstance(features, dict) else None
+
+
+def load_features(directory: Path) -> Dict[str, Dict[str, Any]]:
+    """car_id -> features of every extraction result in the directory"""
+    loaded = {}
+    for path in sorted(Path(directory).glob("features_*_latest.json")):
+        car_id = features_car_id(path.name)
+        features = read_features(path)
+        if car_id and features is not None:
+            loaded[car_id] = features
+    return loaded
+
+
+def stat_files(directory: Path) -> Dict[str, Tuple[int, int]]:
+    """(mtime_ns, size) of every features file, for the polling watcher"""
+    stats = {}
+    for path in Path(directory).glob("features_*_latest.json"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        stats[path.name] = (stat.st_mtime_ns, stat.st_size)
+    return stats
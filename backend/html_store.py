@@ -0,0 +1,332 @@
+"""
+Content-addressed store for the offer page HTML posted to /save-html.
+
+Each capture is hashed (sha256 of the UTF-8 HTML) and stored once under
+objects/{hash[:2]}/{hash}, compressed with zstd when the optional "zstandard"
+package is installed and zlib otherwise. Both codecs use a dictionary shared by
+all snapshots (trained from stored captures with zstd; with zlib, a recent
+capture serves as the preset dictionary), because offer pages are mostly
+identical boilerplate. Every object records the codec and dictionary it was
+written with, so dictionaries can be retrained without rewriting old objects.
+
+cars/{car_id}.json lists the captures of a car, newest last; capturing an
+unchanged page only updates last_seen. Retention keeps the newest
+HTML_KEEP_PER_CAR distinct captures per car (and drops those older than
+HTML_RETENTION_DAYS, if set); gc() deletes objects no car refers to.
+
+    uv run python html_store.py train|gc|stats|import-legacy
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstandard is an optional speedup
+    zstandard = None
+
+HTML_KEEP_PER_CAR = int(os.getenv("HTML_KEEP_PER_CAR", "5"))
+HTML_RETENTION_DAYS = int(os.getenv("HTML_RETENTION_DAYS", "0"))
+# Train a dictionary automatically once this many objects exist without one
+DICT_TRAIN_SAMPLES = int(os.getenv("HTML_DICT_TRAIN_SAMPLES", "50"))
+DICT_SIZE = 112 * 1024
+# zlib only looks back 32 KB, so a larger preset dictionary is wasted
+ZLIB_DICT_SIZE = 32 * 1024
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+MAGIC = b"OHS1"
+CODEC_ZSTD = b"s"
+CODEC_ZLIB = b"z"
+UNKNOWN_CAR = "_other"
+
+
+class SavedSnapshot(NamedTuple):
+    car_id: str
+    hash: str
+    size: int
+    stored_size: int
+    deduplicated: bool
+
+
+def now_iso() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+def write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class HtmlSnapshotStore:
+    def __init__(self, directory: Path, keep_per_car: int = HTML_KEEP_PER_CAR,
+                 retention_days: int = HTML_RETENTION_DAYS, train_samples: int = DICT_TRAIN_SAMPLES):
+        self.directory = Path(directory)
+        self.objects_dir = self.directory / "objects"
+        self.cars_dir = self.directory / "cars"
+        self.dicts_dir = self.directory / "dictionaries"
+        for directory in (self.objects_dir, self.cars_dir, self.dicts_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        self.keep_per_car = keep_per_car
+        self.retention_days = retention_days
+        self.train_samples = train_samples
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+        self._dictionaries: Dict[str, bytes] = {}
+        self._car_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        # Serializes dictionary training and the object existence checks of saves and gc
+        self._objects_lock = threading.RLock()
+        self._training_failed = False
+        self.dictionary_id = self._current_dictionary_id()
+
+    # Dictionaries
+
+    def _dictionary_path(self, dict_id: str) -> Path:
+        return self.dicts_dir / dict_id
+
+    def _current_dictionary_id(self) -> str:
+        """Newest dictionary for the active codec ("" if none was trained yet)"""
+        current = self.dicts_dir / f"current.{self.codec.decode()}"
+        try:
+            return current.read_text(encoding='utf-8').strip()
+        except FileNotFoundError:
+            return ""
+
+    def dictionary(self, dict_id: str) -> bytes:
+        if dict_id not in self._dictionaries:
+            self._dictionaries[dict_id] = self._dictionary_path(dict_id).read_bytes()
+        return self._dictionaries[dict_id]
+
+    def train_dictionary(self, samples: Optional[List[bytes]] = None) -> str:
+        """Build a shared dictionary from stored captures and make it current"""
+        with self._objects_lock:
+            return self._train_dictionary(samples)
+
+    def _train_dictionary(self, samples: Optional[List[bytes]]) -> str:
+        if samples is None:
+            samples = [self.read(object_hash).encode('utf-8') for object_hash in self.object_hashes()[-500:]]
+        if not samples:
+            raise ValueError("No snapshots to train a dictionary from")
+        if self.codec == CODEC_ZSTD:
+            dictionary = zstandard.train_dictionary(DICT_SIZE, samples).as_bytes()
+        else:
+            # zlib has no trainer: the tail of the newest capture holds the shared page chrome
+            dictionary = samples[-1][-ZLIB_DICT_SIZE:]
+        dict_id = f"{self.codec.decode()}-{hashlib.sha256(dictionary).hexdigest()[:16]}"
+        write_atomic(self._dictionary_path(dict_id), dictionary)
+        write_atomic(self.dicts_dir / f"current.{self.codec.decode()}", dict_id.encode('utf-8'))
+        self.dictionary_id = dict_id
+        return dict_id
+
+    def _maybe_train(self):
+        """Train the first dictionary once enough captures are stored to learn from (objects lock held)"""
+        if self.dictionary_id or not self.train_samples or self._training_failed:
+            return
+        if len(self.object_hashes()) < self.train_samples:
+            return
+        try:
+            print(f"Trained HTML snapshot dictionary {self.train_dictionary()}")
+        except Exception as e:
+            self._training_failed = True
+            print(f"Failed to train HTML snapshot dictionary: {e}")
+
+    # Objects
+
+    def object_path(self, object_hash: str) -> Path:
+        return self.objects_dir / object_hash[:2] / object_hash
+
+    def object_hashes(self) -> List[str]:
+        """Stored object hashes, oldest first"""
+        paths = [path for path in self.objects_dir.glob("*/*") if not path.name.startswith(".")]
+        paths.sort(key=lambda path: path.stat().st_mtime_ns)
+        return [path.name for path in paths]
+
+    def compress(self, raw: bytes) -> bytes:
+        dict_id = self.dictionary_id
+        if self.codec == CODEC_ZSTD:
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary(dict_id)) if dict_id else None
+            payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress(raw)
+        else:
+            compressor = (zlib.compressobj(ZLIB_LEVEL, zdict=self.dictionary(dict_id)) if dict_id
+                          else zlib.compressobj(ZLIB_LEVEL))
+            payload = compressor.compress(raw) + compressor.flush()
+        return MAGIC + self.codec + bytes([len(dict_id)]) + dict_id.encode('ascii') + payload
+
+    def decompress(self, blob: bytes) -> bytes:
+        if not blob.startswith(MAGIC):
+            raise ValueError("Not an HTML snapshot object")
+        codec = blob[4:5]
+        dict_len = blob[5]
+        dict_id = blob[6:6 + dict_len].decode('ascii')
+        payload = blob[6 + dict_len:]
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this snapshot")
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary(dict_id)) if dict_id else None
+            return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(payload)
+        decompressor = zlib.decompressobj(zdict=self.dictionary(dict_id)) if dict_id else zlib.decompressobj()
+        return decompressor.decompress(payload) + decompressor.flush()
+
+    def read(self, object_hash: str) -> str:
+        return self.decompress(self.object_path(object_hash).read_bytes()).decode('utf-8')
+
+    # Captures
+
+    def _car_lock(self, car_id: str) -> threading.Lock:
+        with self._lock:
+            return self._car_locks.setdefault(car_id, threading.Lock())
+
+    def _captures_path(self, car_id: str) -> Path:
+        return self.cars_dir / f"{car_id}.json"
+
+    def captures(self, car_id: str) -> List[Dict[str, Any]]:
+        """Captures of a car, oldest first"""
+        try:
+            with open(self._captures_path(car_id), 'rb') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def car_ids(self) -> List[str]:
+        return sorted(path.stem for path in self.cars_dir.glob("*.json"))
+
+    def save(self, car_id: str, url: str, html: str) -> SavedSnapshot:
+        """Store a capture; identical HTML is stored once"""
+        car_id = car_id or UNKNOWN_CAR
+        raw = html.encode('utf-8')
+        object_hash = hashlib.sha256(raw).hexdigest()
+        path = self.object_path(object_hash)
+        with self._objects_lock:
+            deduplicated = path.exists()
+            if deduplicated:
+                # A fresh mtime keeps a concurrent gc from deleting the object before it is listed
+                os.utime(path)
+            else:
+                self._maybe_train()
+        if not deduplicated:
+            write_atomic(path, self.compress(raw))
+
+        with self._car_lock(car_id):
+            captures = self.captures(car_id)
+            timestamp = now_iso()
+            if captures and captures[-1]["hash"] == object_hash:
+                captures[-1]["last_seen"] = timestamp
+            else:
+                captures = [capture for capture in captures if capture["hash"] != object_hash]
+                captures.append({"hash": object_hash, "url": url, "size": len(raw),
+                                 "captured_at": timestamp, "last_seen": timestamp})
+            write_atomic(self._captures_path(car_id), json.dumps(self.apply_retention(captures)).encode('utf-8'))
+        return SavedSnapshot(car_id, object_hash, len(raw), path.stat().st_size, deduplicated)
+
+    def apply_retention(self, captures: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep the newest captures allowed by the retention policy (always at least the latest)"""
+        kept = captures[-self.keep_per_car:] if self.keep_per_car > 0 else list(captures)
+        if self.retention_days > 0:
+            cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.retention_days)
+            older = [capture for capture in kept[:-1]
+                     if datetime.datetime.fromisoformat(capture["last_seen"]) >= cutoff]
+            kept = older + kept[-1:]
+        return kept
+
+    def gc(self, grace_seconds: float = 3600) -> int:
+        """Apply retention to every car and delete unreferenced objects; returns objects removed.
+
+        Objects younger than grace_seconds are kept: a save in progress writes its
+        object before listing it under the car.
+        """
+        referenced = set()
+        for car_id in self.car_ids():
+            with self._car_lock(car_id):
+                captures = self.captures(car_id)
+                kept = self.apply_retention(captures) if captures else []
+                if kept != captures:
+                    write_atomic(self._captures_path(car_id), json.dumps(kept).encode('utf-8'))
+            referenced.update(capture["hash"] for capture in kept)
+        removed = 0
+        cutoff = time.time() - grace_seconds
+        for object_hash in self.object_hashes():
+            if object_hash in referenced:
+                continue
+            path = self.object_path(object_hash)
+            # Saves deduplicating against the object touch it under the same lock
+            with self._objects_lock:
+                try:
+                    if path.stat().st_mtime >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                path.unlink()
+            removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        captures = [capture for car_id in self.car_ids() for capture in self.captures(car_id)]
+        sizes = {capture["hash"]: capture["size"] for capture in captures}
+        return {
+            "cars": len(self.car_ids()),
+            "captures": len(captures),
+            "objects": len(self.object_hashes()),
+            "html_bytes": sum(capture["size"] for capture in captures),
+            "unique_html_bytes": sum(sizes.values()),
+            "stored_bytes": sum(path.stat().st_size for path in self.objects_dir.glob("*/*")),
+        }
+
+
+def car_id_from_html(html: str) -> str:
+    """Offer ID from the canonical URL of a saved page"""
+    match = re.search(r'otomoto\.pl/[^"\'\s]*-(ID[A-Za-z0-9]+)\.html', html)
+    return match.group(1) if match else ""
+
+
+def import_legacy(store: HtmlSnapshotStore, directory: Path, remove: bool = False) -> int:
+    """Move page_html_{timestamp}.html files written before the store into it"""
+    imported = 0
+    for path in sorted(directory.glob("page_html_*.html")):
+        html = path.read_text(encoding='utf-8')
+        store.save(car_id_from_html(html), "", html)
+        if remove:
+            path.unlink()
+        imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML snapshot store maintenance")
+    parser.add_argument("--dir", default="html_snapshots")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("train", help="Train a shared compression dictionary from stored snapshots")
+    subparsers.add_parser("gc", help="Apply the retention policy and delete unreferenced snapshots")
+    subparsers.add_parser("stats", help="Show capture counts and disk usage")
+    import_parser = subparsers.add_parser("import-legacy", help="Import page_html_*.html files")
+    import_parser.add_argument("--remove", action="store_true", help="Delete the files after importing them")
+    args = parser.parse_args()
+
+    store = HtmlSnapshotStore(Path(args.dir))
+    if args.command == "train":
+        print(f"Trained dictionary {store.train_dictionary()}")
+    elif args.command == "gc":
+        print(f"Removed {store.gc()} unreferenced snapshots")
+    elif args.command == "import-legacy":
+        print(f"Imported {import_legacy(store, Path(args.dir), args.remove)} snapshots")
+    else:
+        for name, value in store.stats().items():
+            print(f"{name:>18}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+VIN and registration number indexes over the in-memory car records.
+
+Both identifiers are normalized (upper case, no spaces or dashes; the letters
+I, O and Q, which VINs never contain, read as 1, 0 and 0). Placeholders are
+ignored: masked values (WDBXXXXXXXXXXXXXX, "WX XXX"), dummies such as
+12345678987655659, and North American or Chinese VINs with a wrong check
+digit. A vehicle listed again under a new car ID shares its VIN or plate with
+the earlier listing, so the indexes give a car's listing history with one dict
+lookup. They are kept
+up to date on every save, like CarViews.
+"""
+import re
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+VIN_PATTERN = re.compile(r'^[A-HJ-NPR-Z0-9]{17}$')
+PLATE_PATTERN = re.compile(r'^[A-Z0-9]{4,8}$')
+VIN_LOOKALIKES = str.maketrans({"I": "1", "O": "0", "Q": "0"})
+SEPARATORS = re.compile(r'[\s\-_.]+')
+MASK_RUN = re.compile(r'X{3,}')
+# Ford and VW pad the vehicle descriptor (positions 4-9) with XXX / ZZZ
+VIN_FILLER = range(3, 9)
+DUMMY_RUN = re.compile(r'(.)\1{5,}')
+SEQUENCE_LENGTH = 5
+ASCENDING = "0123456789"
+DESCENDING = ASCENDING[::-1]
+# ISO 3779 check digit, required in VINs from North America (1-5) and China (L)
+CHECK_DIGIT_REGIONS = "12345L"
+VIN_VALUES = dict(zip("0123456789ABCDEFGHJKLMNPRSTUVWXYZ", map(int, "012345678912345678123457923456789")))
+VIN_WEIGHTS = [8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2]
+
+
+def is_placeholder(value: str) -> bool:
+    """Masked or dummy values: one repeated character (XXXX…, 0000…) or a counting sequence (12345)"""
+    if len(set(value)) <= 1:
+        return True
+    return any(ASCENDING[i:i + SEQUENCE_LENGTH] in value or DESCENDING[i:i + SEQUENCE_LENGTH] in value
+               for i in range(len(ASCENDING) - SEQUENCE_LENGTH + 1))
+
+
+def is_masked_vin(vin: str) -> bool:
+    """XXX… standing in for hidden characters, beyond the filler some makers use"""
+    for match in MASK_RUN.finditer(vin):
+        run = range(match.start(), match.end())
+        if len(run) > 3 or run[0] not in VIN_FILLER or run[-1] not in VIN_FILLER:
+            return True
+    return bool(DUMMY_RUN.search(vin))
+
+
+def vin_check_digit(vin: str) -> str:
+    total = sum(VIN_VALUES[c] * weight for c, weight in zip(vin, VIN_WEIGHTS))
+    remainder = total % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def normalize_vin(vin: Any) -> Optional[str]:
+    """Canonical 17-character VIN, or None for placeholders and malformed values"""
+    if not isinstance(vin, str):
+        return None
+    value = SEPARATORS.sub('', vin).upper().translate(VIN_LOOKALIKES)
+    if not VIN_PATTERN.match(value) or value.isdigit() or is_placeholder(value) or is_masked_vin(value):
+        return None
+    if value[0] in CHECK_DIGIT_REGIONS and value[8] != vin_check_digit(value):
+        return None
+    return value
+
+
+def normalize_plate(plate: Any) -> Optional[str]:
+    """Canonical registration number, or None for placeholders and malformed values"""
+    if not isinstance(plate, str):
+        return None
+    value = SEPARATORS.sub('', plate).upper()
+    if not PLATE_PATTERN.match(value) or is_placeholder(value) or value.isdigit() or MASK_RUN.search(value):
+        return None
+    return value
+
+
+def identifiers(record: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    return normalize_vin(record.get('vin')), normalize_plate(record.get('registration_number'))
+
+
+class IdentifierIndex:
+    """Car IDs by normalized VIN and by normalized registration number"""
+
+    def __init__(self):
+        self.by_vin: Dict[str, Set[str]] = {}
+        self.by_plate: Dict[str, Set[str]] = {}
+        self._keys: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._lock = threading.Lock()
+        # Bumped on every change, so pages showing listing history can be revalidated
+        self.generation = 0
+
+    def set(self, car_id: str, record: Dict[str, Any]):
+        keys = identifiers(record)
+        with self._lock:
+            if self._keys.get(car_id) == keys:
+                return
+            self._discard(car_id)
+            vin, plate = keys
+            if vin is not None:
+                self.by_vin.setdefault(vin, set()).add(car_id)
+            if plate is not None:
+                self.by_plate.setdefault(plate, set()).add(car_id)
+            self._keys[car_id] = keys
+            self.generation += 1
+
+    def remove(self, car_id: str):
+        with self._lock:
+            if car_id in self._keys:
+                self._discard(car_id)
+                self.generation += 1
+
+    def clear(self):
+        with self._lock:
+            self.by_vin.clear()
+            self.by_plate.clear()
+            self._keys.clear()
+            self.generation += 1
+
+    def _discard(self, car_id: str):
+        vin, plate = self._keys.pop(car_id, (None, None))
+        for index, key in ((self.by_vin, vin), (self.by_plate, plate)):
+            if key is not None and key in index:
+                index[key].discard(car_id)
+                if not index[key]:
+                    del index[key]
+
+    def cars_with_vin(self, vin: str) -> List[str]:
+        value = normalize_vin(vin)
+        with self._lock:
+            return sorted(self.by_vin.get(value, ())) if value else []
+
+    def cars_with_plate(self, plate: str) -> List[str]:
+        value = normalize_plate(plate)
+        with self._lock:
+            return sorted(self.by_plate.get(value, ())) if value else []
+
+    def other_listings(self, car_id: str) -> List[str]:
+        """Other car IDs with the same VIN or registration number"""
+        with self._lock:
+            vin, plate = self._keys.get(car_id, (None, None))
+            others = set(self.by_vin.get(vin, ())) | set(self.by_plate.get(plate, ()))
+        others.discard(car_id)
+        return sorted(others)
+
+    def relisted(self, car_id: str) -> bool:
+        with self._lock:
+            vin, plate = self._keys.get(car_id, (None, None))
+            return len(self.by_vin.get(vin, ())) > 1 or len(self.by_plate.get(plate, ())) > 1
@@ -0,0 +1,299 @@
+"""
+Local mirror of the car images hotlinked from the listing CDN.
+
+Images are downloaded in the background and stored once per distinct content
+under objects/{hash[:2]}/{hash} (sha256 of the bytes), so they survive expired
+listings and shared photos take no extra space. urls.log maps each source URL
+to its hash, one "hash url" line per image, appended as images arrive. Only
+URLs on IMAGE_HOSTS (the listing CDN) are downloaded, redirects included.
+
+With the optional Pillow package, WebP thumbnails are generated for each of
+IMAGE_THUMBNAIL_SIZES (bounding box in pixels) into thumbs/; without it, every
+size is served from the original.
+
+    uv run python image_store.py stats
+"""
+import argparse
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from functools import partial
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is an optional speedup
+    Image = None
+
+from html_store import write_atomic
+
+IMAGE_THUMBNAIL_SIZES = tuple(int(size) for size in os.getenv("IMAGE_THUMBNAIL_SIZES", "160,480,1024").split(","))
+IMAGE_FETCH_WORKERS = int(os.getenv("IMAGE_FETCH_WORKERS", "4"))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "20"))
+# Seconds before a failed download is tried again
+IMAGE_RETRY_SECONDS = float(os.getenv("IMAGE_RETRY_SECONDS", "3600"))
+# Hosts (and their subdomains) images may be downloaded from
+IMAGE_HOSTS = tuple(host.strip().lower() for host in os.getenv("IMAGE_HOSTS", "olxcdn.com,otomoto.pl").split(",")
+                    if host.strip())
+IMAGE_MAX_BYTES = 20 * 1024 * 1024
+WEBP_QUALITY = 80
+ORIGINAL = "orig"
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+MEDIA_TYPES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+]
+
+
+def media_type(head: bytes) -> str:
+    """Content type of an image from its first bytes"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, content_type in MEDIA_TYPES:
+        if head.startswith(magic):
+            return content_type
+    return "application/octet-stream"
+
+
+class StoredImage(NamedTuple):
+    path: Path
+    media_type: str
+    # False when a thumbnail was asked for but the original is served instead (no Pillow)
+    final: bool
+
+
+def allowed_url(url: str, hosts: Tuple[str, ...] = IMAGE_HOSTS) -> bool:
+    """Whether an http(s) URL points at one of the hosts or their subdomains"""
+    parsed = urllib.parse.urlsplit(url)
+    host = (parsed.hostname or "").lower()
+    return parsed.scheme in ("http", "https") and any(
+        host == allowed or host.endswith("." + allowed) for allowed in hosts)
+
+
+class HostRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follows redirects only within the allowed hosts"""
+
+    def __init__(self, hosts: Tuple[str, ...]):
+        self.hosts = hosts
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not allowed_url(newurl, self.hosts):
+            raise urllib.error.HTTPError(newurl, code, "Redirect to a host that is not allowed", headers, fp)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def fetch_url(url: str, hosts: Tuple[str, ...] = IMAGE_HOSTS) -> bytes:
+    """Download an image from one of the allowed hosts (blocking)"""
+    if not allowed_url(url, hosts):
+        raise ValueError(f"Not an image host: {url}")
+    opener = urllib.request.build_opener(HostRedirectHandler(hosts))
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, "Accept": "image/*"})
+    with opener.open(request, timeout=IMAGE_FETCH_TIMEOUT) as response:
+        content = response.read(IMAGE_MAX_BYTES + 1)
+    if len(content) > IMAGE_MAX_BYTES:
+        raise ValueError(f"Image larger than {IMAGE_MAX_BYTES} bytes")
+    return content
+
+
+class ImageStore:
+    def __init__(self, directory: Path, sizes: Tuple[int, ...] = IMAGE_THUMBNAIL_SIZES):
+        self.directory = Path(directory)
+        self.objects_dir = self.directory / "objects"
+        self.thumbs_dir = self.directory / "thumbs"
+        for directory in (self.objects_dir, self.thumbs_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        self.sizes = tuple(sizes)
+        self.log_path = self.directory / "urls.log"
+        self._lock = threading.Lock()
+        self.hashes: Dict[str, str] = self._read_log()
+        # Bumped whenever an image is added, so pages linking images can be revalidated
+        self.generation = 0
+
+    def _read_log(self) -> Dict[str, str]:
+        hashes = {}
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    image_hash, _, url = line.rstrip("\n").partition(" ")
+                    if HASH_PATTERN.match(image_hash) and url:
+                        hashes[url] = image_hash
+        except FileNotFoundError:
+            pass
+        return hashes
+
+    def object_path(self, image_hash: str) -> Path:
+        return self.objects_dir / image_hash[:2] / image_hash
+
+    def thumbnail_path(self, image_hash: str, size: int) -> Path:
+        return self.thumbs_dir / image_hash[:2] / f"{image_hash}-{size}.webp"
+
+    def hash_of(self, url: str) -> Optional[str]:
+        return self.hashes.get(url)
+
+    def add(self, url: str, content: bytes) -> str:
+        """Store downloaded image bytes for a URL and return their hash"""
+        image_hash = hashlib.sha256(content).hexdigest()
+        path = self.object_path(image_hash)
+        if not path.exists():
+            write_atomic(path, content)
+        for size in self.sizes:
+            self.thumbnail(image_hash, size)
+        with self._lock:
+            if self.hashes.get(url) != image_hash:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(f"{image_hash} {url}\n")
+                self.hashes[url] = image_hash
+                self.generation += 1
+        return image_hash
+
+    def thumbnail(self, image_hash: str, size: int) -> Optional[Path]:
+        """WebP thumbnail fitting size x size, generated on first use (None without Pillow)"""
+        if Image is None:
+            return None
+        path = self.thumbnail_path(image_hash, size)
+        if path.exists():
+            return path
+        try:
+            with Image.open(self.object_path(image_hash)) as image:
+                image.thumbnail((size, size))
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+                output = io.BytesIO()
+                image.save(output, "WEBP", quality=WEBP_QUALITY)
+        except Exception as e:
+            print(f"Failed to make a {size}px thumbnail of {image_hash[:12]}: {e}")
+            return None
+        write_atomic(path, output.getvalue())
+        return path
+
+    def image(self, image_hash: str, size: str) -> Optional[StoredImage]:
+        """An image at a size in pixels or "orig", or None if unknown"""
+        if not HASH_PATTERN.match(image_hash):
+            return None
+        original = self.object_path(image_hash)
+        if not original.exists():
+            return None
+        if size != ORIGINAL:
+            if not size.isdigit():
+                return None
+            # Sizes that are not configured get the next larger thumbnail (or the original)
+            fitting = [configured for configured in sorted(self.sizes) if configured >= int(size)]
+            path = self.thumbnail(image_hash, fitting[0]) if fitting else None
+            if path is not None:
+                return StoredImage(path, "image/webp", True)
+            final = not fitting
+        else:
+            final = True
+        with open(original, 'rb') as f:
+            return StoredImage(original, media_type(f.read(16)), final)
+
+    def stats(self) -> Dict[str, int]:
+        objects = [path for path in self.objects_dir.glob("*/*") if path.is_file()]
+        thumbs = [path for path in self.thumbs_dir.glob("*/*.webp")]
+        return {
+            "urls": len(self.hashes),
+            "objects": len(objects),
+            "object_bytes": sum(path.stat().st_size for path in objects),
+            "thumbnails": len(thumbs),
+            "thumbnail_bytes": sum(path.stat().st_size for path in thumbs),
+        }
+
+
+class ImageFetcher:
+    """Downloads images into an ImageStore on background threads"""
+
+    def __init__(self, store: ImageStore, workers: int = IMAGE_FETCH_WORKERS,
+                 fetch: Optional[Callable[[str], bytes]] = None, retry_seconds: float = IMAGE_RETRY_SECONDS,
+                 on_added: Optional[Callable[[str, str], None]] = None, hosts: Tuple[str, ...] = IMAGE_HOSTS):
+        self.store = store
+        self.hosts = hosts
+        self.fetch = fetch or partial(fetch_url, hosts=hosts)
+        # Called with (url, image hash) after each download
+        self.on_added = on_added
+        self.retry_seconds = retry_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-fetch")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        # url -> monotonic time of the last failed download
+        self._failed: Dict[str, float] = {}
+
+    def enqueue(self, urls: Iterable[str]) -> int:
+        """Schedule downloads of the URLs not mirrored, queued or recently failed yet"""
+        queued = 0
+        now = time.monotonic()
+        with self._lock:
+            for url in urls:
+                if not url or not allowed_url(url, self.hosts):
+                    continue
+                if url in self.store.hashes or url in self._pending:
+                    continue
+                if now - self._failed.get(url, -self.retry_seconds) < self.retry_seconds:
+                    continue
+                try:
+                    self._pending[url] = self._executor.submit(self._download, url)
+                except RuntimeError:
+                    # Shut down
+                    break
+                queued += 1
+        return queued
+
+    def _download(self, url: str):
+        try:
+            try:
+                image_hash = self.store.add(url, self.fetch(url))
+            except Exception as e:
+                print(f"Failed to mirror image {url}: {e}")
+                with self._lock:
+                    self._failed[url] = time.monotonic()
+                return
+            with self._lock:
+                self._failed.pop(url, None)
+            if self.on_added is not None:
+                self.on_added(url, image_hash)
+        finally:
+            with self._lock:
+                self._pending.pop(url, None)
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until the queued downloads (and their on_added calls) are done"""
+        with self._lock:
+            futures = list(self._pending.values())
+        wait(futures, timeout=timeout)
+
+    def stop(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def car_image_urls(record: Dict, main_only: bool = False) -> List[str]:
+    urls = [record.get('image_main') or '']
+    if not main_only:
+        urls.extend(url for url in record.get('images') or [] if isinstance(url, str))
+    return [url for url in urls if url]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local car image mirror")
+    parser.add_argument("--dir", default="images")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show mirrored image counts and disk usage")
+    args = parser.parse_args()
+
+    store = ImageStore(Path(args.dir))
+    if args.command == "stats":
+        for key, value in store.stats().items():
+            print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
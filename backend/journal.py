@@ -0,0 +1,127 @@
+"""
+Append-only journal of car saves with group commit.
+
+Each save is appended as one JSON line and fsynced before the car file is
+replaced, so the last acknowledged save of every car survives a crash and is
+replayed at the next start. Concurrent saves share fsyncs: the first thread to
+reach the disk flushes everything appended so far while the others wait for it
+(group commit), so a burst of saves costs a handful of fsyncs instead of one
+per file. Car files themselves are then written without fsync; a checkpoint
+syncs them and truncates the journal.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+
+def read_journal(path: Path) -> List[Dict[str, Any]]:
+    """Entries of a journal file, ignoring a torn last line"""
+    entries = []
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class Journal:
+    """Durable log of saves; append() returns once the entry is on disk"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, 'ab')
+        self._cond = threading.Condition()
+        self._appended = 0
+        self._durable = 0
+        self._syncing = False
+        # Entries appended but not yet applied to their car file
+        self._applying = 0
+        self._checkpointing = False
+        self.size = self._file.tell()
+        self.fsyncs = 0
+
+    def append(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, ensure_ascii=False).encode('utf-8') + b"\n"
+        with self._cond:
+            while self._checkpointing:
+                self._cond.wait()
+            self._file.write(line)
+            self.size += len(line)
+            self._appended += 1
+            self._applying += 1
+            seq = self._appended
+            try:
+                while self._durable < seq:
+                    if self._syncing:
+                        self._cond.wait()
+                    else:
+                        self._sync()
+            except BaseException:
+                self._applying -= 1
+                self._cond.notify_all()
+                raise
+
+    def _sync(self):
+        """Flush and fsync everything appended so far (called with the lock held)"""
+        self._syncing = True
+        target = self._appended
+        try:
+            self._file.flush()
+            fd = self._file.fileno()
+            # Other threads keep appending while this one waits for the disk
+            self._cond.release()
+            try:
+                os.fsync(fd)
+            finally:
+                self._cond.acquire()
+            self._durable = target
+            self.fsyncs += 1
+        finally:
+            self._syncing = False
+            self._cond.notify_all()
+
+    def _applied(self):
+        with self._cond:
+            self._applying -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def record(self, entry: Dict[str, Any]) -> Iterator[None]:
+        """Make the entry durable, then let the caller apply it to the car file"""
+        self.append(entry)
+        try:
+            yield
+        finally:
+            self._applied()
+
+    def checkpoint(self, sync_files: Callable[[], None]):
+        """Sync the car files with sync_files() and empty the journal.
+
+        New saves wait until the checkpoint is done; saves already in the journal
+        are applied first so nothing is dropped before its file is written.
+        """
+        with self._cond:
+            self._checkpointing = True
+            try:
+                while self._applying or self._syncing:
+                    self._cond.wait()
+                sync_files()
+                self._file.truncate(0)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self.size = 0
+            finally:
+                self._checkpointing = False
+                self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._file.close()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Load test the backend with concurrent userscript-like clients.
+
+Starts the app with uvicorn in a separate process on synthetic car files (or
+targets a running server with --url) and has N clients send a mix of listing
+lookups, delta syncs, detail reads, saves and HTML snapshots as fast as they
+can. Prints p50/p99 latency per endpoint and overall. Needs httpx (test extra).
+
+    uv run python load_test.py --clients 50 --requests 5000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import shutil
+import socket
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmark_index import generate
+
+# (name, weight) of the request mix, roughly what open listing and offer tabs send
+REQUEST_MIX = [
+    ("known-cars since", 25),
+    ("cars lookup", 20),
+    ("existing data", 20),
+    ("save data", 20),
+    ("car detail", 10),
+    ("save html", 5),
+]
+HTML_SNAPSHOT = "<html><body>" + "<div class='offer'>Kamper Ford Transit 2013</div>" * 4000 + "</body></html>"
+
+
+def serve(directory: str, port: int):
+    """Run the app on synthetic data (in a child process)"""
+    import uvicorn
+    import main
+    from html_store import HtmlSnapshotStore
+    from storage import JsonFileStorage
+
+    main.STORAGE = JsonFileStorage(Path(directory) / "extracted_data")
+    main.HTML_STORE = HtmlSnapshotStore(Path(directory) / "html_snapshots")
+    main.SNAPSHOT_PATH = ""
+    main.WATCH_FILES = "off"
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/message")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Backend did not start")
+
+
+async def send(client: httpx.AsyncClient, kind: str, car_ids: List[str], rng: random.Random, state: dict):
+    car_id = rng.choice(car_ids)
+    url = f"https://www.otomoto.pl/dostawcze/oferta/ford-transit-{car_id}.html"
+    if kind == "known-cars since":
+        # Like the userscript, each client syncs from the version of its last response
+        response = await client.get("/api/known-cars", params={"since": state["version"]})
+        if response.status_code == 200:
+            state["version"] = response.json()["version"]
+        return response
+    if kind == "cars lookup":
+        return await client.post("/api/cars/lookup", json={"car_ids": rng.sample(car_ids, 32)})
+    if kind == "existing data":
+        return await client.get(f"/get-existing-data/{car_id}")
+    if kind == "save data":
+        return await client.post("/save-extracted-data", json={"url": url, "data": {
+            "car_name": "Ford Transit", "price": f"{rng.randint(20, 250)} 000", "user_grade": rng.randint(0, 5)}})
+    if kind == "car detail":
+        return await client.get(f"/car/{car_id}")
+    return await client.post("/save-html", json={"url": url, "html_content": HTML_SNAPSHOT})
+
+
+async def run_load(base_url: str, clients: int, total: int, car_ids: List[str]) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = {name: [] for name, _ in REQUEST_MIX}
+    names = [name for name, _ in REQUEST_MIX]
+    weights = [weight for _, weight in REQUEST_MIX]
+    remaining = total
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_until_up(client)
+        version = (await client.get("/api/known-cars")).json()["version"]
+
+        async def worker(seed: int):
+            nonlocal remaining
+            rng = random.Random(seed)
+            state = {"version": version}
+            while remaining > 0:
+                remaining -= 1
+                kind = rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    response = await send(client, kind, car_ids, rng, state)
+                except httpx.TransportError as e:
+                    print(f"{kind}: {e!r}")
+                    continue
+                latencies[kind].append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    print(f"{kind}: HTTP {response.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(seed) for seed in range(clients)))
+        elapsed = time.perf_counter() - started
+    print(f"{total} requests from {clients} clients in {elapsed:.1f}s ({total / elapsed:.0f} req/s)")
+    return latencies
+
+
+def percentile(values: List[float], q: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+def report(latencies: Dict[str, List[float]]):
+    print(f"{'endpoint':<18} {'count':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    everything = [value for values in latencies.values() for value in values]
+    for name, values in [*latencies.items(), ("all", everything)]:
+        if values:
+            print(f"{name:<18} {len(values):>6} {percentile(values, 50) * 1000:>8.1f} "
+                  f"{percentile(values, 99) * 1000:>8.1f}")
+
+
+def main_load_test():
+    parser = argparse.ArgumentParser(description="Load test the backend with concurrent clients")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--cars", type=int, default=2000, help="Synthetic cars to start the backend with")
+    parser.add_argument("--url", help="Test a running backend instead (its cars must include the synthetic IDs)")
+    args = parser.parse_args()
+
+    car_ids = [f"ID6B{i:07d}" for i in range(args.cars)]
+    if args.url:
+        latencies = asyncio.run(run_load(args.url, args.clients, args.requests, car_ids))
+        report(latencies)
+        return
+
+    directory = Path(tempfile.mkdtemp(prefix="otomoto-load-"))
+    server = None
+    try:
+        (directory / "extracted_data").mkdir()
+        generate(directory / "extracted_data", args.cars)
+        port = free_port()
+        server = multiprocessing.Process(target=serve, args=(str(directory), port), daemon=True)
+        server.start()
+        latencies = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.clients, args.requests, car_ids))
+        report(latencies)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main_load_test()
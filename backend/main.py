@@ -1,15 +1,36 @@
+import asyncio
 import datetime
+import hashlib
 import json
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Set
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, HTMLResponse
+from fastapi.responses import FileResponse, Response, HTMLResponse
 from fastapi.responses import RedirectResponse
 
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from compression import CompressionMiddleware, strip_encoding_suffix
+from duplicates import DuplicateIndex
+from facets import BOOLEAN_FACETS, FACET_FIELDS, FacetIndex, parse_selection
+from features import features_car_id, load_features, read_features, stat_files as stat_features_files
+from html_store import HtmlSnapshotStore
+from identifiers import IdentifierIndex, normalize_vin
+from image_store import ORIGINAL, ImageFetcher, ImageStore, car_image_urls
+from journal import Journal, read_journal
+from queries import MAX_PAGE_SIZE, CarQuery, CarViews, parse_query
+from search import SearchIndex
+from snapshot import load_snapshot, snapshot_entry, write_snapshot
+from storage import CarStorage, JsonFileStorage, create_storage, numeric_fields, parse_grade
+from watcher import create_watcher
 
 app = FastAPI(title="Otomoto Script Backend", version="1.0.0")
 
@@ -19,12 +40,100 @@ HTML_DIR = Path("html_snapshots")
 STORAGE_DIR.mkdir(exist_ok=True)
 HTML_DIR.mkdir(exist_ok=True)
 
+# Storage engine for car records: "json" (one file per car) or "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_PATH = Path(os.getenv("SQLITE_PATH", "cars.db"))
+STORAGE: CarStorage = create_storage(STORAGE_BACKEND, STORAGE_DIR, SQLITE_PATH)
+
+# Camper features written by the extractor (accessories are searchable)
+FEATURES_DIR = Path("parsed_data")
+FEATURES_DIR.mkdir(exist_ok=True)
+
+# Content-addressed, compressed store of the offer pages posted to /save-html
+HTML_STORE = HtmlSnapshotStore(HTML_DIR)
+
+# Local mirror of the car images, downloaded in the background ("off" disables fetching)
+IMAGE_DIR = Path("images")
+IMAGE_MIRROR = os.getenv("IMAGE_MIRROR", "on")
+IMAGE_STORE = ImageStore(IMAGE_DIR)
+IMAGE_FETCHER: Optional[ImageFetcher] = None
+# Perceptual hashes of the mirrored images, linking cars reposted under a new ID
+DUPLICATES = DuplicateIndex(IMAGE_STORE)
+# Image URL -> cars showing it, to link each image to its cars once it is mirrored
+IMAGE_URL_CARS: Dict[str, Set[str]] = {}
+# Mirrored images never change under their hash
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Originals standing in for a thumbnail that could not be made yet (e.g. without Pillow)
+IMAGE_FALLBACK_CACHE_CONTROL = "public, max-age=3600"
+
 # Jinja2 templates
 templates = Jinja2Templates(directory="templates")
 
+def image_src(url: str, size: str = ORIGINAL) -> str:
+    """Local /img URL of a mirrored image, or the CDN URL until it is mirrored"""
+    image_hash = IMAGE_STORE.hash_of(url) if url else None
+    return f"/img/{image_hash}/{size}" if image_hash else url
+
+templates.env.globals["image_src"] = image_src
+
 # In-memory index for fast car data lookup: car_id -> filename
 CAR_INDEX: Dict[str, str] = {}
 
+# Resident store of parsed car records served by the read endpoints: car_id -> car data
+CAR_RECORDS: Dict[str, Dict[str, Any]] = {}
+# Precomputed sort keys and sorted car ID lists over CAR_RECORDS for /cars
+CAR_VIEWS = CarViews()
+# Car IDs by normalized VIN and registration number, for listing history and relists
+IDENTIFIERS = IdentifierIndex()
+# Features of each car from parsed_data/: car_id -> features
+CAR_FEATURES: Dict[str, Dict[str, Any]] = {}
+# Inverted index over names, descriptions, notes and accessories for /api/search
+SEARCH = SearchIndex()
+# Bitmaps of the cars per CamperFeatures value, for feature filters on /cars and /api/facets
+FACETS = FacetIndex()
+
+# Seconds spent in each phase of the last rebuild_index() (scan, parse, index, total)
+INDEX_TIMINGS: Dict[str, float] = {}
+
+# Index snapshot for fast restarts of the JSON engine (empty INDEX_SNAPSHOT disables it)
+SNAPSHOT_PATH = os.getenv("INDEX_SNAPSHOT", "index_snapshot.json")
+SNAPSHOT_INTERVAL = float(os.getenv("INDEX_SNAPSHOT_INTERVAL", "300"))
+SNAPSHOT_STOP = threading.Event()
+SNAPSHOT_DIRTY = False
+# (mtime_ns, size) of the file each indexed car was loaded from or saved to
+FILE_STATS: Dict[str, tuple] = {}
+# Cars restored from the snapshot whose record only holds the summary fields
+PARTIAL_RECORDS: set = set()
+
+# Watch the JSON data directory for files changed outside the API: auto, watchdog, poll or off
+WATCH_FILES = os.getenv("WATCH_FILES", "auto")
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "2"))
+FILE_WATCHER = None
+FEATURES_WATCHER = None
+
+# Optional journal of saves with group commit for the JSON engine (empty SAVE_JOURNAL disables it)
+JOURNAL_PATH = os.getenv("SAVE_JOURNAL", "")
+JOURNAL_CHECKPOINT_BYTES = int(os.getenv("SAVE_JOURNAL_CHECKPOINT_BYTES", str(16 * 1024 * 1024)))
+JOURNAL: Optional[Journal] = None
+
+# Blocking file and database I/O of the async handlers runs here, off the event loop
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+# Saves and reloads of one car are serialized: car_id -> lock
+CAR_LOCKS: Dict[str, threading.Lock] = {}
+CAR_LOCKS_GUARD = threading.Lock()
+
+# Change tracking for delta sync: every save is stamped with a monotonically increasing version
+VERSION_LOCK = threading.Lock()
+STORE_VERSION = 0
+# Deletions are only tracked since startup, older clients get a full resync
+SYNC_FLOOR = 0
+# Versions handed out to saves that have not reached the in-memory store yet
+PENDING_VERSIONS: set = set()
+CAR_VERSIONS: Dict[str, int] = {}
+DELETED_CARS: Dict[str, int] = {}
+
 # Pydantic models
 class ExtractedData(BaseModel):
     url: str
@@ -34,107 +143,512 @@ class HTMLData(BaseModel):
     url: str
     html_content: str
 
+class CarLookup(BaseModel):
+    car_ids: List[str] = Field(max_length=500)
+
 # Index management functions
 def extract_car_id_from_url(url: str) -> str:
     """Extract car ID from otomoto URL (format: ...ID6HvgDG.html)"""
     match = re.search(r'ID([A-Za-z0-9]+)', url)
     return f"ID{match.group(1)}" if match else ""
 
+def build_car_record(car_id: str, file_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the in-memory car record from the contents of a car data file"""
+    car_data = dict(file_data.get('data', {}))
+
+    # Add metadata
+    car_data['car_id'] = car_id
+    car_data['url'] = file_data.get('url', '')
+
+    # Ensure numeric rating
+    car_data['user_grade'] = parse_grade(car_data.get('user_grade', 0))
+
+    # Integer price/mileage/cubic_capacity/year, derived here for files saved without them
+    if not isinstance(car_data.get('numeric'), dict):
+        car_data['numeric'] = numeric_fields(car_data)
+
+    # Add disabled field with default false for existing records
+    car_data['disabled'] = car_data.get('disabled', False)
+
+    return car_data
+
+def begin_change() -> int:
+    """Allocate a new store version (millisecond clock, strictly increasing across restarts)"""
+    global STORE_VERSION
+    with VERSION_LOCK:
+        STORE_VERSION = max(STORE_VERSION + 1, int(time.time() * 1000))
+        PENDING_VERSIONS.add(STORE_VERSION)
+        return STORE_VERSION
+
+def end_change(version: int):
+    """Mark a version as visible in the in-memory store"""
+    with VERSION_LOCK:
+        PENDING_VERSIONS.discard(version)
+
+def committed_version() -> int:
+    """Highest version for which every change is visible to readers"""
+    with VERSION_LOCK:
+        return min(PENDING_VERSIONS) - 1 if PENDING_VERSIONS else STORE_VERSION
+
+def set_record(car_id: str, record: Dict[str, Any]):
+    """Store a car record and refresh its sort keys"""
+    CAR_RECORDS[car_id] = record
+    CAR_VIEWS.set(car_id, record)
+    IDENTIFIERS.set(car_id, record)
+
+async def run_io(func, *args):
+    """Run a blocking function on the I/O executor"""
+    return await asyncio.get_running_loop().run_in_executor(IO_EXECUTOR, func, *args)
+
+def car_lock(car_id: str) -> threading.Lock:
+    with CAR_LOCKS_GUARD:
+        return CAR_LOCKS.setdefault(car_id, threading.Lock())
+
+def journal_enabled() -> bool:
+    return bool(JOURNAL_PATH) and isinstance(STORAGE, JsonFileStorage)
+
+def open_journal():
+    """Replay saves that may not have reached their car files, then start a new journal"""
+    global JOURNAL
+    if not journal_enabled():
+        return
+    replayed = 0
+    latest = {entry["car_id"]: entry["payload"] for entry in read_journal(Path(JOURNAL_PATH))}
+    for car_id, payload in latest.items():
+        stored = STORAGE.read(car_id)
+        if stored is None or stored.get('version', 0) < payload.get('version', 0):
+            STORAGE.write(car_id, payload)
+            replayed += 1
+    if replayed:
+        print(f"Replayed {replayed} saves from the journal")
+    # The journal makes saves durable, so car files skip their own fsync
+    STORAGE.fsync = False
+    JOURNAL = Journal(Path(JOURNAL_PATH))
+    JOURNAL.checkpoint(STORAGE.sync)
+
+def close_journal():
+    global JOURNAL
+    if JOURNAL is not None:
+        JOURNAL.checkpoint(STORAGE.sync)
+        JOURNAL.close()
+        JOURNAL = None
+
+def journaled(car_id: str, payload: Dict[str, Any]):
+    """Context in which a save is applied to storage once it is durable in the journal"""
+    if JOURNAL is None:
+        return nullcontext()
+    return JOURNAL.record({"car_id": car_id, "payload": payload})
+
+def snapshot_enabled() -> bool:
+    return bool(SNAPSHOT_PATH) and isinstance(STORAGE, JsonFileStorage)
+
+def restore_from_snapshot() -> tuple:
+    """Restore unchanged cars from the index snapshot.
+
+    Returns the stored cars parsed from new or changed files and the current
+    (mtime_ns, size) of every data file.
+    """
+    global SNAPSHOT_DIRTY
+    started = time.perf_counter()
+    entries = load_snapshot(Path(SNAPSHOT_PATH), STORAGE.directory)
+    loaded = time.perf_counter()
+    stats = STORAGE.stat_files()
+    statted = time.perf_counter()
+    
+    restored_files = set()
+    for car_id, entry in entries.items():
+        stat = stats.get(entry["file"])
+        if stat is None or list(stat) != [entry["mtime_ns"], entry["size"]]:
+            continue
+        CAR_INDEX[car_id] = entry["file"]
+        FILE_STATS[car_id] = stat
+        if entry["record"] is not None:
+            set_record(car_id, dict(entry["record"]))
+            CAR_VERSIONS[car_id] = entry["version"]
+            PARTIAL_RECORDS.add(car_id)
+        restored_files.add(entry["file"])
+    restored = time.perf_counter()
+    
+    changed_files = [name for name in stats if name not in restored_files]
+    cars = list(STORAGE.load_files(changed_files))
+    # Anything parsed or gone since the snapshot means it needs rewriting
+    SNAPSHOT_DIRTY = bool(changed_files) or len(restored_files) != len(entries)
+    
+    INDEX_TIMINGS.update({
+        "snapshot": loaded - started,
+        "stat": statted - loaded,
+        "restore": restored - statted,
+        "parse": time.perf_counter() - restored,
+    })
+    print(f"Restored {len(restored_files)} cars from the index snapshot, {len(changed_files)} files changed")
+    return cars, stats
+
 def rebuild_index():
-    """Rebuild the car index by scanning all existing JSON files"""
-    global CAR_INDEX
+    """Rebuild the car index and the in-memory car records from the storage engine"""
+    global CAR_INDEX, STORE_VERSION, SYNC_FLOOR
     CAR_INDEX.clear()
+    CAR_RECORDS.clear()
+    CAR_VIEWS.clear()
+    IDENTIFIERS.clear()
+    SEARCH.clear()
+    FACETS.clear()
+    CAR_VERSIONS.clear()
+    DELETED_CARS.clear()
+    FILE_STATS.clear()
+    PARTIAL_RECORDS.clear()
+    INDEX_TIMINGS.clear()
     
     try:
-        # Look for both old and new format files
-        old_files = list(STORAGE_DIR.glob("extracted_data_*.json"))
-        new_files = list(STORAGE_DIR.glob("car_data_*_latest.json"))
-        json_files = old_files + new_files
-        
-        print(f"Rebuilding index from {len(json_files)} files ({len(old_files)} old format, {len(new_files)} new format)...")
+        print(f"Rebuilding index from {STORAGE.name} storage...")
+        started = time.perf_counter()
+        if snapshot_enabled():
+            cars, stats = restore_from_snapshot()
+        else:
+            cars, stats = list(STORAGE.load_all()), {}
+            INDEX_TIMINGS.update(getattr(STORAGE, "timings", {}))
+        loaded = time.perf_counter()
         
-        for json_file in json_files:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Extract car ID from filename or URL
-                if json_file.name.startswith("car_data_"):
-                    # New format: car_data_ID6HvgDG_latest.json
-                    car_id_match = re.search(r'car_data_(ID[A-Za-z0-9]+)_latest\.json', json_file.name)
-                    car_id = car_id_match.group(1) if car_id_match else ""
-                else:
-                    # Old format: extract from URL
-                    url = data.get('url', '')
-                    car_id = extract_car_id_from_url(url)
-
-                if car_id:
-                    # For new format, we can directly use the file since it's already "latest"
-                    # For old format, keep only the latest file for each car_id
-                    if car_id not in CAR_INDEX:
-                        CAR_INDEX[car_id] = (json_file.name)
-                        
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"Skipping corrupted file {json_file}: {e}")
-                continue
+        for car in cars:
+            # For new format, we can directly use the file since it's already "latest"
+            # For old format, keep only the latest file for each car_id
+            if car.car_id not in CAR_INDEX:
+                CAR_INDEX[car.car_id] = car.location
+                if car.location in stats:
+                    FILE_STATS[car.car_id] = stats[car.location]
+
+            # Legacy files are only reachable through the index
+            if not car.legacy:
+                set_record(car.car_id, build_car_record(car.car_id, car.payload))
+                CAR_VERSIONS[car.car_id] = car.payload.get('version', 0)
+                PARTIAL_RECORDS.discard(car.car_id)
         
-        print(f"Index rebuilt with {len(CAR_INDEX)} car entries")
+        if not INDEX_TIMINGS:
+            INDEX_TIMINGS["load"] = loaded - started
+        INDEX_TIMINGS["index"] = time.perf_counter() - loaded
+        INDEX_TIMINGS["total"] = time.perf_counter() - started
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in INDEX_TIMINGS.items())
+        print(f"Index rebuilt with {len(CAR_INDEX)} car entries ({len(CAR_RECORDS)} records loaded): {phases}")
         
     except Exception as e:
         print(f"Failed to rebuild index: {e}")
         CAR_INDEX.clear()
+        CAR_RECORDS.clear()
+        CAR_VIEWS.clear()
+        IDENTIFIERS.clear()
+        SEARCH.clear()
+        FACETS.clear()
+        CAR_VERSIONS.clear()
+        FILE_STATS.clear()
+        PARTIAL_RECORDS.clear()
 
-def update_index(car_id: str, filename: str):
-    """Update the index with new car data"""
-    global CAR_INDEX
+    with VERSION_LOCK:
+        STORE_VERSION = max([STORE_VERSION, int(time.time() * 1000), *CAR_VERSIONS.values()])
+        SYNC_FLOOR = STORE_VERSION
+
+def update_index(car_id: str, filename: str, payload: Dict[str, Any]):
+    """Update the index and the in-memory record with new car data"""
+    global CAR_INDEX, SNAPSHOT_DIRTY
     if car_id:
         CAR_INDEX[car_id] = filename
+        set_record(car_id, build_car_record(car_id, payload))
+        CAR_VERSIONS[car_id] = payload.get('version', 0)
+        PARTIAL_RECORDS.discard(car_id)
+        DELETED_CARS.pop(car_id, None)
+        SEARCH.set(car_id, search_fields(car_id, CAR_RECORDS[car_id]))
+        if car_id in CAR_FEATURES:
+            FACETS.set(car_id, CAR_FEATURES[car_id])
+        # Stat after the record is in place so a snapshot never pairs an old record with a new stat
+        if isinstance(STORAGE, JsonFileStorage):
+            FILE_STATS[car_id] = STORAGE.file_stat(filename)
+        SNAPSHOT_DIRTY = True
 
-def load_all_cars() -> List[Dict[str, Any]]:
-    """Load all car data from JSON files"""
-    cars = []
-    
+def remove_from_index(car_id: str):
+    """Drop a car from the index and leave a tombstone for delta sync clients"""
+    global SNAPSHOT_DIRTY
+    version = begin_change()
     try:
-        # Get all car data files
-        json_files = list(STORAGE_DIR.glob("car_data_*_latest.json"))
-        
-        for json_file in json_files:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    file_data = json.load(f)
-                
-                car_data = file_data.get('data', {})
-                
-                # Extract car ID from filename
-                car_id_match = re.search(r'car_data_(ID[A-Za-z0-9]+)_latest\.json', json_file.name)
-                car_id = car_id_match.group(1) if car_id_match else ""
-                
-                # Add metadata
-                car_data['car_id'] = car_id
-                car_data['url'] = file_data.get('url', '')
-                
-                # Ensure numeric rating
-                user_grade = car_data.get('user_grade', 0)
-                if isinstance(user_grade, str):
-                    try:
-                        user_grade = int(user_grade)
-                    except (ValueError, TypeError):
-                        user_grade = 0
-                car_data['user_grade'] = user_grade
-                
-                # Add disabled field with default false for existing records
-                car_data['disabled'] = car_data.get('disabled', False)
-                
-                cars.append(car_data)
-                
-            except (json.JSONDecodeError, Exception) as e:
-                print(f"Error loading car data from {json_file}: {e}")
+        CAR_INDEX.pop(car_id, None)
+        CAR_RECORDS.pop(car_id, None)
+        CAR_VIEWS.remove(car_id)
+        IDENTIFIERS.remove(car_id)
+        SEARCH.remove(car_id)
+        FACETS.remove(car_id)
+        CAR_VERSIONS.pop(car_id, None)
+        FILE_STATS.pop(car_id, None)
+        DUPLICATES.remove_car(car_id)
+        PARTIAL_RECORDS.discard(car_id)
+        DELETED_CARS[car_id] = version
+        SNAPSHOT_DIRTY = True
+    finally:
+        end_change(version)
+
+def reload_car_file(filename: str):
+    """Pick up a car file created or modified outside the API"""
+    if STORAGE.is_legacy_file(filename):
+        for car in STORAGE.load_files([filename]):
+            CAR_INDEX.setdefault(car.car_id, filename)
+        return
+    car_id = STORAGE.car_id_from_filename(filename)
+    if not car_id:
+        return
+    with car_lock(car_id):
+        # Saves through the API record the stat of the file they wrote
+        if CAR_INDEX.get(car_id) == filename and FILE_STATS.get(car_id) == STORAGE.file_stat(filename):
+            return
+        cars = list(STORAGE.load_files([filename]))
+        if not cars:
+            # Unreadable, e.g. still being written: the next event retries
+            return
+        # Hand edits may change a display string without its numeric value
+        data = cars[0].payload.get('data')
+        if isinstance(data, dict):
+            data['numeric'] = numeric_fields(data)
+        # Stamp a fresh version so delta sync clients see the edit
+        version = begin_change()
+        try:
+            update_index(car_id, filename, {**cars[0].payload, "version": version})
+        finally:
+            end_change(version)
+    print(f"Reloaded {filename} after an external change")
+
+def forget_car_file(filename: str):
+    """Drop a car whose file was deleted outside the API"""
+    for car_id in [car_id for car_id, location in list(CAR_INDEX.items()) if location == filename]:
+        # Serialized with saves, which may have written the file again since the event
+        with car_lock(car_id):
+            if CAR_INDEX.get(car_id) != filename or STORAGE.file_stat(filename) is not None:
                 continue
-    
-    except Exception as e:
-        print(f"Error loading car data: {e}")
-    
-    return cars
+            remove_from_index(car_id)
+        print(f"Removed {car_id} after {filename} was deleted")
+
+def start_file_watcher():
+    global FILE_WATCHER
+    if not isinstance(STORAGE, JsonFileStorage):
+        return
+    accepts = lambda name: STORAGE.is_car_file(name) or STORAGE.is_legacy_file(name)
+    FILE_WATCHER = create_watcher(WATCH_FILES, STORAGE.directory, STORAGE.stat_files, accepts,
+                                  reload_car_file, forget_car_file, WATCH_POLL_INTERVAL)
+    if FILE_WATCHER is not None:
+        FILE_WATCHER.start()
+        print(f"Watching {STORAGE.directory} for changes ({FILE_WATCHER.name})")
+
+def search_fields(car_id: str, record: Dict[str, Any]) -> Dict[str, str]:
+    accessories = CAR_FEATURES.get(car_id, {}).get('accessories') or []
+    return {
+        "car_name": record.get('car_name') or '',
+        "description": record.get('description') or '',
+        "user_notes": record.get('user_notes') or '',
+        "accessories": "\n".join(item for item in accessories if isinstance(item, str)),
+    }
+
+def rebuild_feature_index():
+    """Load the extracted features and build the facet bitmaps of the known cars"""
+    started = time.perf_counter()
+    CAR_FEATURES.clear()
+    CAR_FEATURES.update(load_features(FEATURES_DIR))
+    FACETS.clear()
+    for car_id, features in list(CAR_FEATURES.items()):
+        if car_id in CAR_RECORDS:
+            FACETS.set(car_id, features)
+    print(f"Loaded features of {len(CAR_FEATURES)} cars in {time.perf_counter() - started:.2f}s")
+
+def rebuild_search_index():
+    """Index every car for search (slow; runs on a background thread at startup)"""
+    started = time.perf_counter()
+    for car_id in list(CAR_RECORDS):
+        record = CAR_RECORDS.get(car_id)
+        if car_id in PARTIAL_RECORDS:
+            # Summaries from the index snapshot lack the description
+            payload = STORAGE.read(car_id)
+            record = build_car_record(car_id, payload) if payload is not None else None
+        if record is not None:
+            # Saves made meanwhile already indexed a newer version
+            SEARCH.set(car_id, search_fields(car_id, record), replace=False)
+    SEARCH.ready.set()
+    print(f"Search index built with {len(SEARCH)} cars in {time.perf_counter() - started:.2f}s")
+
+def reload_features_file(filename: str):
+    """Pick up features the extractor wrote for a car"""
+    car_id = features_car_id(filename)
+    features = read_features(FEATURES_DIR / filename) if car_id else None
+    if features is None:
+        return
+    CAR_FEATURES[car_id] = features
+    record = full_record(car_id)
+    if record is not None:
+        FACETS.set(car_id, features)
+        SEARCH.set(car_id, search_fields(car_id, record))
+
+def forget_features_file(filename: str):
+    car_id = features_car_id(filename)
+    if car_id and CAR_FEATURES.pop(car_id, None) is not None:
+        FACETS.remove(car_id)
+        record = full_record(car_id)
+        if record is not None:
+            SEARCH.set(car_id, search_fields(car_id, record))
+
+def start_features_watcher():
+    global FEATURES_WATCHER
+    FEATURES_WATCHER = create_watcher(WATCH_FILES, FEATURES_DIR, lambda: stat_features_files(FEATURES_DIR),
+                                      lambda name: features_car_id(name) is not None,
+                                      reload_features_file, forget_features_file, WATCH_POLL_INTERVAL)
+    if FEATURES_WATCHER is not None:
+        FEATURES_WATCHER.start()
+
+def full_record(car_id: str) -> Optional[Dict[str, Any]]:
+    """The complete record of a car, reading it from storage if only its summary is in memory"""
+    if car_id in PARTIAL_RECORDS:
+        payload = STORAGE.read(car_id)
+        if payload is not None:
+            set_record(car_id, build_car_record(car_id, payload))
+        PARTIAL_RECORDS.discard(car_id)
+    return CAR_RECORDS.get(car_id)
+
+def write_index_snapshot() -> bool:
+    """Persist the index snapshot if anything changed since the last one"""
+    global SNAPSHOT_DIRTY
+    if not snapshot_enabled() or not SNAPSHOT_DIRTY:
+        return False
+    # Cleared first so changes made while writing mark the snapshot dirty again
+    SNAPSHOT_DIRTY = False
+    entries = {}
+    for car_id, location in list(CAR_INDEX.items()):
+        stat = FILE_STATS.get(car_id)
+        if stat is not None:
+            entries[car_id] = snapshot_entry(location, stat, CAR_VERSIONS.get(car_id, 0), CAR_RECORDS.get(car_id))
+    try:
+        write_snapshot(Path(SNAPSHOT_PATH), STORAGE.directory, entries)
+    except OSError as e:
+        SNAPSHOT_DIRTY = True
+        print(f"Failed to write index snapshot: {e}")
+        return False
+    return True
+
+def snapshot_loop():
+    """Write the index snapshot periodically until shutdown"""
+    while not SNAPSHOT_STOP.wait(SNAPSHOT_INTERVAL):
+        write_index_snapshot()
+
+def load_all_cars() -> List[Dict[str, Any]]:
+    """Return all car records from the in-memory store"""
+    return list(CAR_RECORDS.values())
+
+def query_cars(query: CarQuery) -> tuple:
+    """Return one page of cars matching the query and the total number of matches"""
+    if STORAGE.indexed and not query.features:
+        # Let the database walk the sort column's index
+        filters = dict(min_grade=query.min_grade, disabled=query.disabled, brand=query.brand,
+                       min_price=query.min_price, max_price=query.max_price)
+        order_by = "user_grade" if query.sort == "grade" else query.sort
+        car_ids = STORAGE.query_car_ids(order_by=order_by, descending=query.descending,
+                                        limit=query.page_size, offset=query.offset, **filters)
+        total = STORAGE.count_cars(**filters)
+    else:
+        allowed = set(FACETS.select(query.features)) if query.features else None
+        car_ids, total = CAR_VIEWS.query(query, allowed)
+    return [CAR_RECORDS[car_id] for car_id in car_ids if car_id in CAR_RECORDS], total
+
+def rating_stats() -> Dict[str, Any]:
+    """Count rated cars and compute their average rating"""
+    if STORAGE.indexed:
+        return STORAGE.rating_stats()
+    return CAR_VIEWS.rating_stats()
+
+def listing_entry(car_id: str) -> Dict[str, Any]:
+    """Summary of one listing in a car's history"""
+    car = CAR_RECORDS[car_id]
+    return {
+        'car_id': car_id,
+        'url': car.get('url', ''),
+        'car_name': car.get('car_name', ''),
+        'price': car.get('price', ''),
+        'vin': car.get('vin', ''),
+        'registration_number': car.get('registration_number', ''),
+        'user_grade': car.get('user_grade', 0),
+        'disabled': car.get('disabled', False),
+        'version': CAR_VERSIONS.get(car_id, 0),
+    }
+
+def listing_history(car_ids: List[str]) -> List[Dict[str, Any]]:
+    """Listings oldest save first"""
+    entries = [listing_entry(car_id) for car_id in car_ids if car_id in CAR_RECORDS]
+    return sorted(entries, key=lambda entry: (entry['version'], entry['car_id']))
+
+def other_listings(car_id: str, car_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """History of the car under other IDs, noting whether the VIN or only the plate matched"""
+    vin = normalize_vin(car_data.get('vin'))
+    listings = listing_history(IDENTIFIERS.other_listings(car_id))
+    for listing in listings:
+        listing['same_vin'] = vin is not None and normalize_vin(listing['vin']) == vin
+    return listings
+
+def start_image_mirror():
+    """Mirror the images of all known cars and index them for reposts in the background"""
+    global IMAGE_FETCHER
+    if IMAGE_MIRROR != "off":
+        IMAGE_FETCHER = ImageFetcher(IMAGE_STORE, on_added=image_mirrored)
+    threading.Thread(target=mirror_all_images, name="image-mirror", daemon=True).start()
+
+def mirror_all_images():
+    # Records restored from the index snapshot only carry the main image until they are read
+    for car_id, record in list(CAR_RECORDS.items()):
+        mirror_images(car_id, record, main_only=car_id in PARTIAL_RECORDS)
+
+def stop_image_fetcher():
+    global IMAGE_FETCHER
+    if IMAGE_FETCHER is not None:
+        IMAGE_FETCHER.stop()
+        IMAGE_FETCHER = None
+
+def mirror_images(car_id: str, record: Dict[str, Any], main_only: bool = False) -> int:
+    """Index the car's mirrored images for reposts and queue downloads of the others; returns downloads queued"""
+    urls = car_image_urls(record, main_only)
+    for url in urls:
+        IMAGE_URL_CARS.setdefault(url, set()).add(car_id)
+        image_hash = IMAGE_STORE.hash_of(url)
+        if image_hash is not None:
+            DUPLICATES.add(car_id, image_hash)
+    return IMAGE_FETCHER.enqueue(urls) if IMAGE_FETCHER is not None else 0
+
+def image_mirrored(url: str, image_hash: str):
+    """Link a freshly downloaded image to the cars showing it (runs on a fetcher thread)
+
+    This is where reposts under new CDN URLs are found; the generation bump
+    revalidates the detail pages that list them.
+    """
+    for car_id in list(IMAGE_URL_CARS.get(url, ())):
+        if car_id in CAR_RECORDS:
+            DUPLICATES.add(car_id, image_hash)
+
+def duplicate_cars(car_id: str) -> Optional[List[Dict[str, Any]]]:
+    """Known cars that look like reposts of this one, most shared photos first (None if too few photos are hashed)"""
+    shared = DUPLICATES.duplicates(car_id)
+    if shared is None:
+        return None
+    return [{
+        'car_id': other,
+        'car_name': CAR_RECORDS[other].get('car_name', ''),
+        'price': CAR_RECORDS[other].get('price', ''),
+        'user_grade': CAR_RECORDS[other].get('user_grade', 0),
+        'shared_images': count,
+    } for other, count in sorted(shared.items(), key=lambda item: (-item[1], item[0])) if other in CAR_RECORDS]
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check the request's If-None-Match header against a strong ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [strip_encoding_suffix(tag.strip()) for tag in header.split(",")]
+    return etag in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    # no-cache: the browser may store the response but must revalidate it with the ETag
+    return {"ETag": etag, "Cache-Control": "no-cache"}
 
 app.add_middleware(
     CORSMiddleware,
@@ -143,216 +657,370 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
 @app.get("/favicon.ico")
-def favicon():
+async def favicon():
     return Response(status_code=204)
 
 @app.get("/")
-def read_root():
+async def read_root():
     return RedirectResponse("/cars")
 
 @app.get("/message")
-def get_message():
+async def get_message():
     return {"message": f"Hello from the backend! {datetime.datetime.now()}"}
 
 @app.get("/cars", response_class=HTMLResponse)
-def get_cars_table(request: Request):
-    """Display all cars in a neat HTML table sorted by rating"""
+async def get_cars_table(request: Request):
+    """Display one page of cars, sorted and filtered by the query parameters (best rated first by default)"""
     try:
-        # Load all car data
-        cars = load_all_cars()
+        query = parse_query(request.query_params)
+        # The page only changes when the store version or the query does
+        query_hash = hashlib.sha1(repr(tuple(query)).encode()).hexdigest()[:12]
+        # Image links switch to the local mirror as images arrive; new extractions change feature filters
+        etag = f'"cars-{committed_version()}-{IMAGE_STORE.generation}.{FACETS.generation}-{query_hash}"'
+        if etag_matches(request, etag):
+            return not_modified(etag)
         
-        # Sort by rating (highest first)
-        cars.sort(key=lambda x: (x.get('user_grade', 0)), reverse=True)
-        
-        # Calculate statistics
-        rated_cars = [car for car in cars if car.get('user_grade', 0) > 0]
-        rated_cars_count = len(rated_cars)
-        average_rating = sum(car.get('user_grade', 0) for car in rated_cars) / rated_cars_count if rated_cars_count > 0 else 0
+        if STORAGE.indexed:
+            cars, total = await run_io(query_cars, query)
+            stats = await run_io(rating_stats)
+        else:
+            cars, total = query_cars(query)
+            stats = rating_stats()
         
         return templates.TemplateResponse("cars_table.html", {
             "request": request,
             "cars": cars,
-            "rated_cars_count": rated_cars_count,
-            "average_rating": average_rating,
-        })
+            "query": query,
+            "total_cars": total,
+            "page_count": max((total + query.page_size - 1) // query.page_size, 1),
+            "brands": CAR_VIEWS.brands(),
+            "relisted": {car['car_id'] for car in cars if IDENTIFIERS.relisted(car['car_id'])},
+            "facet_fields": FACET_FIELDS,
+            "boolean_facets": BOOLEAN_FACETS,
+            "facets": FACETS.counts(query.features),
+            "selected_features": dict(query.features),
+            "rated_cars_count": stats["rated_cars_count"],
+            "average_rating": stats["average_rating"],
+        }, headers=cache_headers(etag))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load cars table: {str(e)}")
 
 @app.get("/car/{car_id}", response_class=HTMLResponse)
-def get_car_detail(request: Request, car_id: str):
+async def get_car_detail(request: Request, car_id: str):
     """Show details of a car and list of images"""
     try:
-        filename = f"car_data_{car_id}_latest.json"
-        filepath = STORAGE_DIR / filename
-        car_data = None
-
-        if filepath.exists():
-            with open(filepath, 'r', encoding='utf-8') as f:
-                file_data = json.load(f)
-            car_data = file_data.get('data', {})
-            car_data['url'] = file_data.get('url', '')
-        else:
+        # Only cars restored from the index snapshot need a read from storage
+        car_data = await run_io(full_record, car_id) if car_id in PARTIAL_RECORDS else CAR_RECORDS.get(car_id)
+        if car_data is None:
             raise HTTPException(status_code=404, detail="Car not found")
 
+        # Unversioned records (saved before versioning) can only change across restarts
+        # Other cars' saves change the reposts and listing history shown here
+        linked = f"{IMAGE_STORE.generation}.{DUPLICATES.generation}.{IDENTIFIERS.generation}"
+        etag = f'"car-{car_id}-{CAR_VERSIONS.get(car_id) or SYNC_FLOOR}-{linked}"'
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        await run_io(mirror_images, car_id, car_data)
+
         return templates.TemplateResponse("car_detail.html", {
             "request": request,
             "car_data": car_data,
-            "car_id": car_id
-        })
+            "car_id": car_id,
+            "duplicates": duplicate_cars(car_id),
+            "other_listings": other_listings(car_id, car_data)
+        }, headers=cache_headers(etag))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load car detail: {str(e)}")
 
+def known_car_entry(car: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact car entry used for listing page highlighting"""
+    user_notes = car.get('user_notes', '').strip().replace('\n', '<br/>')
+    return {
+        'car_id': car.get('car_id', ''),
+        'user_grade': car.get('user_grade', 0),
+        'has_notes': bool(user_notes),
+        'user_notes': user_notes,
+        'car_name': car.get('car_name', ''),
+        'price': car.get('price', ''),
+        'disabled': car.get('disabled', False)
+    }
+
 @app.get("/api/known-cars")
-def get_known_cars():
-    """Get list of known car IDs with metadata for userscript listing page highlighting"""
+async def get_known_cars(request: Request, response: Response, since: Optional[int] = None):
+    """Get list of known car IDs with metadata for userscript listing page highlighting.
+
+    With ?since=<version> only cars changed or deleted after that version are returned,
+    together with the current version to use for the next request. If the changes can't
+    be reconstructed (e.g. the version predates the last restart) "full" is true and the
+    client should replace its cache with the returned list.
+    """
     try:
-        # Load all car data
-        cars = load_all_cars()
+        # Read the version first so changes racing with this request are sent again next time
+        version = committed_version()
         
-        # Extract only the needed fields for listing page
-        known_cars = []
-        for car in cars:
-            car_id = car.get('car_id', '')
-            if car_id:
-                user_notes = car.get('user_notes', '').strip().replace('\n', '<br/>')
-                known_cars.append({
-                    'car_id': car_id,
-                    'user_grade': car.get('user_grade', 0),
-                    'has_notes': bool(user_notes),
-                    'user_notes': user_notes,
-                    'car_name': car.get('car_name', ''),
-                    'price': car.get('price', ''),
-                    'disabled': car.get('disabled', False)
-                })
+        etag = f'"known-{version}"' if since is None else f'"known-{since}-{version}"'
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers.update(cache_headers(etag))
         
-        return {"known_cars": known_cars}
+        if since is None or since < SYNC_FLOOR or since > version:
+            # Load all car data
+            cars = load_all_cars()
+            known_cars = [known_car_entry(car) for car in cars if car.get('car_id')]
+            if since is None:
+                return {"known_cars": known_cars, "version": version}
+            return {"known_cars": known_cars, "deleted": [], "version": version, "full": True}
+        
+        changed_ids = [car_id for car_id, car_version in list(CAR_VERSIONS.items()) if car_version > since]
+        known_cars = [known_car_entry(CAR_RECORDS[car_id]) for car_id in changed_ids if car_id in CAR_RECORDS]
+        deleted = [car_id for car_id, car_version in list(DELETED_CARS.items()) if car_version > since]
+        return {"known_cars": known_cars, "deleted": deleted, "version": version, "full": False}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load known cars: {str(e)}")
 
-@app.post("/save-extracted-data")
-def save_extracted_data(data: ExtractedData):
+@app.post("/api/cars/lookup")
+async def lookup_cars(lookup: CarLookup):
+    """Get compact listing data for the given car IDs only (unknown IDs are left out)"""
     try:
-        # Extract car ID for new naming scheme
-        car_id = extract_car_id_from_url(data.url)
-        if not car_id:
-            raise HTTPException(status_code=400, detail="Could not extract car ID from URL")
+        cars = []
+        for car_id in dict.fromkeys(lookup.car_ids):
+            car = CAR_RECORDS.get(car_id)
+            if car is None:
+                continue
+            entry = known_car_entry(car)
+            cars.append({
+                'car_id': car_id,
+                'user_grade': entry['user_grade'],
+                'has_notes': entry['has_notes'],
+                'user_notes': entry['user_notes'],
+                'disabled': entry['disabled']
+            })
+        
+        return {"cars": cars}
         
-        # New filename format: car_data_{car_id}_latest.json
-        filename = f"car_data_{car_id}_latest.json"
-        filepath = STORAGE_DIR / filename
-                
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to look up cars: {str(e)}")
+
+def store_extracted_data(car_id: str, data: ExtractedData) -> Dict[str, Any]:
+    """Merge, persist and index a save (blocking; runs on the I/O executor)"""
+    # Incoming data is written through the configured storage engine
+    filepath = STORAGE.path_of(car_id)
+    
+    # One save per car at a time, so a disable never merges a half-applied save
+    with car_lock(car_id):
         # Check if car_name is empty in the incoming data
         incoming_car_name = data.data.get('car_name', '').strip()
         
         if not incoming_car_name:
             # Load existing data if file exists
             final_data = {}
-            if filepath.exists():
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        final_data = json.load(f).get('data', {})
-                except (json.JSONDecodeError, KeyError):
-                    pass  # If file is corrupted, start fresh
+            existing = full_record(car_id)
+            if existing is not None:
+                final_data = {k: v for k, v in existing.items() if k not in ('car_id', 'url')}
             final_data['disabled'] = True
         else:
             # If car_name has content, use new data and set disabled to false
             final_data = data.data.copy()
             final_data['disabled'] = False
         
-        # Create the final payload
-        final_payload = {
-            "url": data.url,
-            "data": final_data
-        }
-        
-        # Save the extracted data
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(final_payload, f, ensure_ascii=False, indent=2)
+        # Parse the display strings once, here, so reads sort and filter on integers
+        final_data['numeric'] = numeric_fields(final_data)
         
-        # Update index with new data
-        update_index(car_id, filename)
-        
-        return {
-            "status": "success",
-            "message": f"Data saved to {filename}",
-            "filepath": str(filepath),
-            "car_id": car_id,
-            "filename": filename
-        }
+        # Stamp the save with a new store version for delta sync
+        version = begin_change()
+        try:
+            # Create the final payload
+            final_payload = {
+                "url": data.url,
+                "data": final_data,
+                "version": version
+            }
+            
+            # Save the extracted data (after it is in the journal, when enabled)
+            with journaled(car_id, final_payload):
+                filename = STORAGE.write(car_id, final_payload)
+            
+            # Update index and in-memory record with new data
+            update_index(car_id, filename, final_payload)
+        finally:
+            end_change(version)
+    
+    # Reposts are linked as the photos are hashed, after the response (image_mirrored)
+    DUPLICATES.remove_car(car_id)
+    images_pending = mirror_images(car_id, final_data)
+    
+    if JOURNAL is not None and JOURNAL.size > JOURNAL_CHECKPOINT_BYTES:
+        JOURNAL.checkpoint(STORAGE.sync)
+    
+    return {
+        "status": "success",
+        "message": f"Data saved to {filename}",
+        "filepath": str(filepath),
+        "car_id": car_id,
+        "filename": filename,
+        "version": version,
+        "images_pending": images_pending
+    }
+
+@app.post("/save-extracted-data")
+async def save_extracted_data(data: ExtractedData):
+    try:
+        # Extract car ID for new naming scheme
+        car_id = extract_car_id_from_url(data.url)
+        if not car_id:
+            raise HTTPException(status_code=400, detail="Could not extract car ID from URL")
+        return await run_io(store_extracted_data, car_id, data)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save data: {str(e)}")
 
 @app.post("/save-html")
-def save_html(data: HTMLData):
+async def save_html(data: HTMLData):
     try:
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"page_html_{timestamp}.html"
-        filepath = HTML_DIR / filename
         
-        # Save the HTML content
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(data.html_content)
+        # Stored once per distinct page content, compressed
+        saved = await run_io(HTML_STORE.save, extract_car_id_from_url(data.url), data.url, data.html_content)
+        filepath = HTML_STORE.object_path(saved.hash)
         
         return {
             "status": "success",
-            "message": f"HTML saved to {filename}",
+            "message": f"HTML {'already stored' if saved.deduplicated else 'saved'} as {saved.hash[:12]}",
             "filepath": str(filepath),
-            "timestamp": timestamp
+            "timestamp": timestamp,
+            "car_id": saved.car_id,
+            "hash": saved.hash,
+            "deduplicated": saved.deduplicated,
+            "stored_bytes": saved.stored_size
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save HTML: {str(e)}")
 
+@app.get("/api/search")
+async def search_cars(q: str, limit: int = 20, offset: int = 0):
+    """Cars whose name, description, notes or accessories match the query, best first"""
+    started = time.perf_counter()
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    ranked = SEARCH.search(q)
+    results = []
+    for car_id, score in ranked[max(offset, 0):max(offset, 0) + limit]:
+        car = CAR_RECORDS.get(car_id)
+        if car is None:
+            continue
+        results.append({
+            'car_id': car_id,
+            'url': car.get('url', ''),
+            'car_name': car.get('car_name', ''),
+            'price': car.get('price', ''),
+            'user_grade': car.get('user_grade', 0),
+            'disabled': car.get('disabled', False),
+            'score': round(score, 4),
+            'highlights': SEARCH.highlights(car_id, q),
+        })
+    return {
+        "query": q,
+        "total": len(ranked),
+        "results": results,
+        # Results may be incomplete while the index is built after startup
+        "complete": SEARCH.ready.is_set(),
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+@app.get("/api/facets")
+async def get_facets(request: Request, limit: int = 100):
+    """Cars matching CamperFeatures filters (has_webasto=true&kitchen_location=inside,outside) with facet counts"""
+    started = time.perf_counter()
+    selection = parse_selection(request.query_params)
+    car_ids = FACETS.select(selection)
+    return {
+        "selection": {field: list(values) for field, values in selection},
+        "total": len(car_ids),
+        "facets": FACETS.counts(selection),
+        "car_ids": car_ids[:min(max(limit, 0), MAX_PAGE_SIZE)],
+        "took_us": round((time.perf_counter() - started) * 1e6),
+    }
+
+@app.get("/api/cars/by-vin/{vin}")
+async def get_cars_by_vin(vin: str):
+    """All listings of a vehicle by VIN, oldest save first"""
+    normalized = normalize_vin(vin)
+    if normalized is None:
+        raise HTTPException(status_code=400, detail="Not a valid VIN")
+    return {"vin": normalized, "cars": listing_history(IDENTIFIERS.cars_with_vin(normalized))}
+
+@app.get("/api/cars/{car_id}/duplicates")
+async def get_duplicates(car_id: str):
+    """Cars sharing photos with this one, likely the same vehicle listed again"""
+    if car_id not in CAR_RECORDS:
+        raise HTTPException(status_code=404, detail="Car not found")
+    duplicates = duplicate_cars(car_id)
+    return {"car_id": car_id, "status": "unknown" if duplicates is None else "checked",
+            "duplicates": duplicates or []}
+
+@app.get("/img/{image_hash}/{size}")
+async def get_image(image_hash: str, size: str):
+    """Serve a mirrored image, as a WebP thumbnail of the given size or the original ("orig")"""
+    image = await run_io(IMAGE_STORE.image, image_hash, size)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    cache_control = IMAGE_CACHE_CONTROL if image.final else IMAGE_FALLBACK_CACHE_CONTROL
+    return FileResponse(image.path, media_type=image.media_type, headers={"Cache-Control": cache_control})
+
+def read_legacy_user_data(car_id: str) -> Optional[Dict[str, Any]]:
+    """Notes and grade from a legacy file in the index (blocking; runs on the I/O executor)"""
+    filename = CAR_INDEX.get(car_id)
+    if filename is None:
+        return None
+    file_path = STORAGE_DIR / filename
+    
+    # Verify file still exists
+    if file_path.exists():
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            user_data = data.get('data', {})
+            return {
+                "status": "found",
+                "user_notes": user_data.get('user_notes', ''),
+                "user_grade": user_data.get('user_grade', 0),
+                "filename": filename
+            }
+        except (json.JSONDecodeError, KeyError):
+            # File is corrupted, remove from index
+            CAR_INDEX.pop(car_id, None)
+    else:
+        # File was deleted, remove from index
+        CAR_INDEX.pop(car_id, None)
+    return None
+
 @app.get("/get-existing-data/{car_id}")
-def get_existing_data(car_id: str):
-    """Get existing notes and grade for a car ID if they exist (super fast direct access)"""
+async def get_existing_data(car_id: str):
+    """Get existing notes and grade for a car ID if they exist (served from the in-memory store)"""
     try:
-        # First try direct file access with new naming scheme
-        direct_filename = f"car_data_{car_id}_latest.json"
-        direct_path = STORAGE_DIR / direct_filename
-        
-        if direct_path.exists():
-            try:
-                with open(direct_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                user_data = data.get('data', {})
-                return {
-                    "status": "found",
-                    "user_notes": user_data.get('user_notes', ''),
-                    "user_grade": user_data.get('user_grade', 0),
-                    "filename": direct_filename
-                }
-            except (json.JSONDecodeError, KeyError):
-                print(f"Corrupted file: {direct_filename}")
+        # First try the in-memory record
+        car_data = CAR_RECORDS.get(car_id)
+        if car_data is not None:
+            return {
+                "status": "found",
+                "user_notes": car_data.get('user_notes', ''),
+                "user_grade": car_data.get('user_grade', 0),
+                "filename": CAR_INDEX.get(car_id, "")
+            }
         
         # Fallback to index lookup for legacy files
         if car_id in CAR_INDEX:
-            filename, _ = CAR_INDEX[car_id]
-            file_path = STORAGE_DIR / filename
-            
-            # Verify file still exists
-            if file_path.exists():
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    user_data = data.get('data', {})
-                    return {
-                        "status": "found",
-                        "user_notes": user_data.get('user_notes', ''),
-                        "user_grade": user_data.get('user_grade', 0),
-                        "filename": filename
-                    }
-                except (json.JSONDecodeError, KeyError):
-                    # File is corrupted, remove from index
-                    del CAR_INDEX[car_id]
-            else:
-                # File was deleted, remove from index
-                del CAR_INDEX[car_id]
+            legacy = await run_io(read_legacy_user_data, car_id)
+            if legacy is not None:
+                return legacy
         
         return {
             "status": "not_found",
@@ -369,9 +1037,33 @@ def get_existing_data(car_id: str):
 async def startup_event():
     """Initialize the car index on startup"""
     print("Starting Otomoto Backend...")
+    if isinstance(STORAGE, JsonFileStorage):
+        STORAGE.remove_temp_files()
+    open_journal()
     rebuild_index()
+    rebuild_feature_index()
+    write_index_snapshot()
+    if snapshot_enabled() and SNAPSHOT_INTERVAL > 0:
+        SNAPSHOT_STOP.clear()
+        threading.Thread(target=snapshot_loop, name="index-snapshot", daemon=True).start()
+    start_file_watcher()
+    start_features_watcher()
+    threading.Thread(target=rebuild_search_index, name="search-index", daemon=True).start()
+    start_image_mirror()
     print(f"Backend ready with {len(CAR_INDEX)} cars indexed")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Persist the index snapshot so the next start only re-reads changed files"""
+    SNAPSHOT_STOP.set()
+    if FILE_WATCHER is not None:
+        FILE_WATCHER.stop()
+    if FEATURES_WATCHER is not None:
+        FEATURES_WATCHER.stop()
+    stop_image_fetcher()
+    close_journal()
+    write_index_snapshot()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
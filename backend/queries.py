@@ -0,0 +1,166 @@
+"""
+Sorting, filtering and pagination of the in-memory car records for /cars.
+
+Sort keys (grade, the integer price/year/mileage parsed at ingest, brand) are
+computed once when a record enters the store. Sorted car ID lists are built lazily per sort order
+and reused until the next change, so a request only filters one pre-sorted
+list and renders a single page.
+"""
+import threading
+from typing import AbstractSet, Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from facets import Selection, parse_selection
+from storage import numeric_fields, parse_grade
+
+SORT_FIELDS = ("grade", "price", "year", "mileage")
+# Best first: highest grade and newest year, cheapest price and lowest mileage
+DEFAULT_DESCENDING = {"grade": True, "price": False, "year": True, "mileage": False}
+MAX_PAGE_SIZE = 500
+
+
+class CarQuery(NamedTuple):
+    sort: str = "grade"
+    descending: bool = True
+    min_grade: Optional[int] = None
+    brand: Optional[str] = None
+    disabled: Optional[bool] = None
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    # CamperFeatures facet filters, evaluated on the FacetIndex bitmaps
+    features: Selection = ()
+    page: int = 1
+    page_size: int = 100
+
+    @property
+    def offset(self) -> int:
+        return (self.page - 1) * self.page_size
+
+
+def _int_param(params: Mapping[str, str], name: str) -> Optional[int]:
+    try:
+        return int(params[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def parse_query(params: Mapping[str, str]) -> CarQuery:
+    """Build a CarQuery from /cars query parameters, ignoring empty or invalid values"""
+    sort = params.get('sort')
+    if sort not in SORT_FIELDS:
+        sort = "grade"
+    order = params.get('order')
+    descending = order == "desc" if order in ("asc", "desc") else DEFAULT_DESCENDING[sort]
+    disabled = params.get('disabled')
+    page_size = _int_param(params, 'page_size') or 100
+    return CarQuery(
+        sort=sort,
+        descending=descending,
+        min_grade=_int_param(params, 'min_grade'),
+        brand=(params.get('brand') or '').strip() or None,
+        disabled={"true": True, "false": False}.get((disabled or '').lower()),
+        min_price=_int_param(params, 'min_price'),
+        max_price=_int_param(params, 'max_price'),
+        features=parse_selection(params),
+        page=max(_int_param(params, 'page') or 1, 1),
+        page_size=min(max(page_size, 1), MAX_PAGE_SIZE),
+    )
+
+
+class SortKeys(NamedTuple):
+    grade: int
+    price: Optional[int]
+    year: Optional[int]
+    mileage: Optional[int]
+    brand: str
+    disabled: bool
+
+
+def sort_keys(record: Dict[str, Any]) -> SortKeys:
+    numeric = record.get('numeric') or numeric_fields(record)
+    return SortKeys(
+        grade=parse_grade(record.get('user_grade', 0)),
+        price=numeric.get('price'),
+        year=numeric.get('year'),
+        mileage=numeric.get('mileage'),
+        brand=str(record.get('brand') or '').strip(),
+        disabled=bool(record.get('disabled', False)),
+    )
+
+
+def matches(keys: SortKeys, query: CarQuery) -> bool:
+    if query.min_grade is not None and keys.grade < query.min_grade:
+        return False
+    if query.brand is not None and keys.brand.casefold() != query.brand.casefold():
+        return False
+    if query.disabled is not None and keys.disabled != query.disabled:
+        return False
+    if query.min_price is not None and (keys.price is None or keys.price < query.min_price):
+        return False
+    if query.max_price is not None and (keys.price is None or keys.price > query.max_price):
+        return False
+    return True
+
+
+class CarViews:
+    """Precomputed sort keys and lazily sorted car ID lists"""
+
+    def __init__(self):
+        self.keys: Dict[str, SortKeys] = {}
+        self._views: Dict[Tuple[str, bool], List[str]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def set(self, car_id: str, record: Dict[str, Any]):
+        self.keys[car_id] = sort_keys(record)
+        self._invalidate()
+
+    def remove(self, car_id: str):
+        if self.keys.pop(car_id, None) is not None:
+            self._invalidate()
+
+    def clear(self):
+        self.keys.clear()
+        self._invalidate()
+
+    def _invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._views.clear()
+
+    def sorted_ids(self, sort: str, descending: bool) -> List[str]:
+        """Car IDs ordered by the sort field (cars without a value last, ties by car ID)"""
+        with self._lock:
+            view = self._views.get((sort, descending))
+            generation = self._generation
+        if view is not None:
+            return view
+
+        keys = list(self.keys.items())
+        sign = -1 if descending else 1
+        valued = [(sign * getattr(k, sort), car_id) for car_id, k in keys if getattr(k, sort) is not None]
+        missing = [car_id for car_id, k in keys if getattr(k, sort) is None]
+        view = [car_id for _, car_id in sorted(valued)] + sorted(missing)
+
+        with self._lock:
+            # Only cache the view if nothing changed while it was being built
+            if generation == self._generation:
+                self._views[(sort, descending)] = view
+        return view
+
+    def query(self, query: CarQuery, allowed: Optional[AbstractSet[str]] = None) -> Tuple[List[str], int]:
+        """One page of matching car IDs (among the allowed ones, if given) and the total number of matches"""
+        keys = self.keys
+        matching = [car_id for car_id in self.sorted_ids(query.sort, query.descending)
+                    if (allowed is None or car_id in allowed)
+                    and (k := keys.get(car_id)) is not None and matches(k, query)]
+        return matching[query.offset:query.offset + query.page_size], len(matching)
+
+    def brands(self) -> List[str]:
+        return sorted({k.brand for k in self.keys.values() if k.brand}, key=str.casefold)
+
+    def rating_stats(self) -> Dict[str, Any]:
+        grades = [k.grade for k in self.keys.values() if k.grade > 0]
+        return {
+            "rated_cars_count": len(grades),
+            "average_rating": sum(grades) / len(grades) if grades else 0,
+        }
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Offline re-extraction of car data from stored offer page HTML.
+
+Mirrors extractPageData() / getValueByLabel() of frontend/simple.user.js so a
+fixed selector can be applied to every saved car without visiting the
+listings again: the newest capture of each car in the HTML snapshot store is
+parsed on a process pool and the extracted fields are merged into its record.
+User fields (notes, grade, disabled) are never touched, and fields the page
+no longer yields (e.g. a phone number that was not revealed in the capture)
+keep their saved value.
+
+Pages are parsed with selectolax when the optional package is installed, and
+otherwise with a small html.parser-based DOM that supports the selectors used
+here (tag, .class, [attr], [attr=v], [attr*=v], [attr^=v] and descendants).
+
+    uv run python reparse.py --dry-run
+    uv run python reparse.py --car ID6HvgDG --workers 8
+"""
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+except ImportError:  # selectolax is an optional speedup
+    SelectolaxParser = None
+
+from html_store import HtmlSnapshotStore
+from storage import CarStorage, create_storage, numeric_fields
+
+REPARSE_WORKERS = int(os.getenv("REPARSE_WORKERS", str(os.cpu_count() or 1)))
+# Cars per task handed to a worker process
+REPARSE_CHUNK_SIZE = 64
+
+# Same selectors as extractionConfig in simple.user.js
+EXTRACTION_CONFIG = {
+    "car_name": "h1.offer-title",
+    "car_type_status": "p.e1kkw2jt0",
+    "year": "p.eur4qwl9",
+    "price": "span.offer-price__number",
+    "phone": "span.n-button-text-wrapper",
+    "location": "p.ef0vquw1",
+    "parameters": "p.ez0zock2",
+    "description": "div.ooa-unlmzs.e11t9j224",
+    "brand": "p.eur4qwl9",
+    "images": "div.embla-thumbs__container img",
+}
+PHONE_SELECTORS = [
+    EXTRACTION_CONFIG["phone"],
+    '[data-testid*="phone"]',
+    ".n-button-text-wrapper",
+    'a[href^="tel:"]',
+    ".phone-number",
+    ".contact-phone",
+]
+PHONE_PATTERN = re.compile(r'\b[\d\s\-\+\(\)]{9,}\b')
+BRAND_PATTERN = re.compile(r'mercedes|bmw|audi|volkswagen|ford|opel|citroen|renault|peugeot|fiat|iveco|man|volvo|scania|daf',
+                           re.IGNORECASE)
+MONTHS = ['stycznia', 'lutego', 'marca', 'kwietnia', 'maja', 'czerwca',
+          'lipca', 'sierpnia', 'września', 'października', 'listopada', 'grudnia']
+# Fields derived from the page; everything else in a record is left alone
+EXTRACTED_FIELDS = (
+    "car_name", "price", "location", "description", "phone", "vin", "car_type", "negotiable", "mileage",
+    "fuel", "transmission", "vehicle_type", "cubic_capacity", "brand", "model", "registration_number",
+    "first_registration_date", "images", "image_main", "year",
+)
+
+
+# Built-in DOM for when selectolax is not installed
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+SELECTOR_TOKEN = re.compile(r'([a-zA-Z][\w-]*|\*)|\.([\w-]+)|\[([\w-]+)(?:([*^]?=)["\']?([^"\'\]]*)["\']?)?\]')
+
+
+class Element:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["Element"]):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List[Any] = []
+        self.parent = parent
+
+    def text(self) -> str:
+        """Concatenated descendant text, like jQuery's .text()"""
+        parts, stack = [], [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return "".join(parts)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self.attrs.get(name)
+
+    @property
+    def next_element(self) -> Optional["Element"]:
+        if self.parent is None:
+            return None
+        siblings = self.parent.children
+        for node in siblings[siblings.index(self) + 1:]:
+            if isinstance(node, Element):
+                return node
+        return None
+
+    def iter(self) -> Iterator["Element"]:
+        """Descendant elements in document order"""
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Element):
+                yield node
+                stack.extend(reversed(node.children))
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("#document", {}, None)
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(element)
+        if tag not in VOID_TAGS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Element(tag, {name: value or "" for name, value in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open element; stray end tags are ignored
+        node = self.current
+        while node is not None and node.tag != tag:
+            node = node.parent
+        if node is not None and node.parent is not None:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_selector(selector: str) -> List[Tuple[Optional[str], List[str], List[Tuple[str, str, str]]]]:
+    """Descendant-combined compound selectors: [(tag, classes, [(attr, op, value)])]"""
+    compounds = []
+    for part in selector.split():
+        tag, classes, conditions, position = None, [], [], 0
+        for match in SELECTOR_TOKEN.finditer(part):
+            if match.start() != position:
+                break
+            position = match.end()
+            name, class_name, attr, op, value = match.groups()
+            if name:
+                tag = None if name == "*" else name.lower()
+            elif class_name:
+                classes.append(class_name)
+            else:
+                conditions.append((attr, op or "", value or ""))
+        if position != len(part):
+            raise ValueError(f"Unsupported selector: {selector}")
+        compounds.append((tag, classes, conditions))
+    return compounds
+
+
+def _matches(element: Element, compound) -> bool:
+    tag, classes, conditions = compound
+    if tag is not None and element.tag != tag:
+        return False
+    if classes:
+        element_classes = element.attrs.get("class", "").split()
+        if any(name not in element_classes for name in classes):
+            return False
+    for attr, op, value in conditions:
+        actual = element.attrs.get(attr)
+        if actual is None:
+            return False
+        if (op == "=" and actual != value) or (op == "*=" and value not in actual) or \
+                (op == "^=" and not actual.startswith(value)):
+            return False
+    return True
+
+
+class BuiltinDocument:
+    def __init__(self, html: str):
+        builder = _TreeBuilder()
+        builder.feed(html)
+        builder.close()
+        self.root = builder.root
+
+    def select(self, selector: str) -> List[Element]:
+        compounds = parse_selector(selector)
+        found = []
+        for element in self.root.iter():
+            if not _matches(element, compounds[-1]):
+                continue
+            # Match the remaining compounds against ancestors, right to left
+            remaining, ancestor = len(compounds) - 2, element.parent
+            while remaining >= 0 and ancestor is not None:
+                if _matches(ancestor, compounds[remaining]):
+                    remaining -= 1
+                ancestor = ancestor.parent
+            if remaining < 0:
+                found.append(element)
+        return found
+
+
+class SelectolaxElement:
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def text(self) -> str:
+        return self.node.text(deep=True)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self.node.attributes.get(name)
+
+    @property
+    def parent(self) -> Optional["SelectolaxElement"]:
+        return SelectolaxElement(self.node.parent) if self.node.parent is not None else None
+
+    @property
+    def next_element(self) -> Optional["SelectolaxElement"]:
+        node = self.node.next
+        while node is not None and node.tag.startswith(("-", "_")):
+            node = node.next
+        return SelectolaxElement(node) if node is not None else None
+
+
+class SelectolaxDocument:
+    def __init__(self, html: str):
+        self.tree = SelectolaxParser(html)
+
+    def select(self, selector: str) -> List[SelectolaxElement]:
+        return [SelectolaxElement(node) for node in self.tree.css(selector)]
+
+
+def parse_document(html: str, parser: str = "auto"):
+    """DOM for the page: selectolax when available (or requested), the built-in parser otherwise"""
+    if parser == "selectolax" or (parser == "auto" and SelectolaxParser is not None):
+        if SelectolaxParser is None:
+            raise RuntimeError("selectolax is not installed")
+        return SelectolaxDocument(html)
+    return BuiltinDocument(html)
+
+
+# extractPageData() port
+
+def get_text_content(document, selector: str) -> str:
+    elements = document.select(selector)
+    return elements[0].text().strip() if elements else ''
+
+
+def get_value_by_label(document, label_text: str) -> str:
+    """Text of the element after the parent of the <p> whose text is exactly the label"""
+    for label in document.select("p"):
+        if label.text().strip() != label_text or label.parent is None:
+            continue
+        value_element = label.parent.next_element
+        value = value_element.text().strip() if value_element is not None else ''
+        if value:
+            return value
+    return ''
+
+
+def format_date(date_string: str) -> str:
+    """ "5 marca 2015" -> "05.03.2015" """
+    if not isinstance(date_string, str) or len(date_string) < 10:
+        return date_string
+    parts = date_string.split(' ')
+    if len(parts) < 3 or parts[1].lower() not in MONTHS:
+        return date_string
+    return f"{parts[0].zfill(2)}.{MONTHS.index(parts[1].lower()) + 1:02d}.{parts[2]}"
+
+
+def extract_phone(document) -> str:
+    """The revealed phone number captured with the page, if any"""
+    for selector in PHONE_SELECTORS:
+        phone_text = get_text_content(document, selector)
+        match = PHONE_PATTERN.search(phone_text) if phone_text else None
+        if match:
+            return re.sub(r'\s+', ' ', match.group(0)).strip()
+    return get_text_content(document, EXTRACTION_CONFIG["phone"])
+
+
+def extract_page_data(html: str, parser: str = "auto") -> Dict[str, Any]:
+    """The data fields extractPageData() collects, from saved page HTML (user_notes excluded)"""
+    document = parse_document(html, parser)
+    data: Dict[str, Any] = {
+        "car_name": get_text_content(document, EXTRACTION_CONFIG["car_name"]),
+        "price": get_text_content(document, EXTRACTION_CONFIG["price"]),
+        "location": get_text_content(document, EXTRACTION_CONFIG["location"]),
+        "description": get_text_content(document, EXTRACTION_CONFIG["description"]),
+        "phone": extract_phone(document),
+        "vin": get_value_by_label(document, "VIN"),
+    }
+
+    status_parts = [part.strip() for part in get_text_content(document, EXTRACTION_CONFIG["car_type_status"]).split(' • ')]
+    data["car_type"] = status_parts[0] or ''
+    data["negotiable"] = next((part for part in status_parts if 'negocjacji' in part), '')
+
+    parameters = [element.text().strip() for element in document.select(EXTRACTION_CONFIG["parameters"])]
+
+    def find(predicate) -> str:
+        return next((p for p in parameters if predicate(p)), '')
+
+    data["mileage"] = find(lambda p: 'km' in p or re.search(r'^\d+\s*\d*\s*\d*\s*km?$', p))
+    data["fuel"] = find(lambda p: re.search(r'diesel|benzyna|gaz|elektryczny', p, re.IGNORECASE))
+    data["transmission"] = find(lambda p: re.search(r'automatyczna|manualna|automatyk|manual', p, re.IGNORECASE))
+    data["vehicle_type"] = find(lambda p: re.search(r'kamper|dostawczy|osobowy', p, re.IGNORECASE))
+    data["cubic_capacity"] = find(lambda p: re.search(r'^\d+\s*\d*\s*cm3?$|^\d+\s*\d*$', p) and 'km' not in p)
+
+    data["brand"] = get_value_by_label(document, 'Marka pojazdu')
+    data["model"] = get_value_by_label(document, 'Model pojazdu')
+    data["registration_number"] = get_value_by_label(document, "Numer rejestracyjny pojazdu")
+    data["first_registration_date"] = format_date(
+        get_value_by_label(document, "Data pierwszej rejestracji w historii pojazdu"))
+    data["images"] = [src.split(';')[0] for element in document.select(EXTRACTION_CONFIG["images"])
+                      if (src := element.attr('src'))]
+    if data["images"]:
+        data["image_main"] = data["images"][0]
+
+    data["year"] = get_value_by_label(document, 'Rok produkcji') or get_text_content(document, EXTRACTION_CONFIG["year"])
+
+    if not data["brand"] or not data["model"]:
+        brand_model_texts = [element.text().strip() for element in document.select(EXTRACTION_CONFIG["brand"])]
+        if not data["brand"]:
+            data["brand"] = next((text for text in brand_model_texts if BRAND_PATTERN.search(text)), '')
+        if not data["model"]:
+            data["model"] = next((text for text in brand_model_texts if text != data["brand"] and len(text) > 2), '')
+    return data
+
+
+# Bulk re-extraction
+
+class ReparseResult(NamedTuple):
+    car_id: str
+    data: Optional[Dict[str, Any]]
+    error: Optional[str]
+
+
+_worker_store: Optional[HtmlSnapshotStore] = None
+
+
+def _init_worker(store_dir: str):
+    global _worker_store
+    _worker_store = HtmlSnapshotStore(Path(store_dir), train_samples=0)
+
+
+def reparse_cars(car_ids: List[str], parser: str = "auto") -> List[ReparseResult]:
+    """Extract the newest capture of each car (in a worker process)"""
+    results = []
+    for car_id in car_ids:
+        captures = _worker_store.captures(car_id)
+        if not captures:
+            results.append(ReparseResult(car_id, None, "no snapshot"))
+            continue
+        try:
+            html = _worker_store.read(captures[-1]["hash"])
+            results.append(ReparseResult(car_id, extract_page_data(html, parser), None))
+        except Exception as e:
+            results.append(ReparseResult(car_id, None, str(e)))
+    return results
+
+
+def reparse_all(store_dir: Path, car_ids: List[str], workers: int = REPARSE_WORKERS,
+                parser: str = "auto") -> Iterator[ReparseResult]:
+    """Re-extract the cars on a process pool, in chunks"""
+    chunks = [car_ids[i:i + REPARSE_CHUNK_SIZE] for i in range(0, len(car_ids), REPARSE_CHUNK_SIZE)]
+    if workers <= 1 or len(chunks) <= 1:
+        _init_worker(str(store_dir))
+        for chunk in chunks:
+            yield from reparse_cars(chunk, parser)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(store_dir),)) as pool:
+        for results in pool.map(reparse_cars, chunks, [parser] * len(chunks)):
+            yield from results
+
+
+def merge_extracted(data: Dict[str, Any], extracted: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """The record data with the non-empty extracted fields applied, and the fields that changed"""
+    merged = dict(data)
+    changed = []
+    for field in EXTRACTED_FIELDS:
+        value = extracted.get(field)
+        if value in (None, '', []) or merged.get(field) == value:
+            continue
+        merged[field] = value
+        changed.append(field)
+    if changed:
+        merged['numeric'] = numeric_fields(merged)
+    return merged, changed
+
+
+def apply_results(storage: CarStorage, results: Iterator[ReparseResult], dry_run: bool = False) -> Dict[str, Any]:
+    """Merge re-extracted fields into the stored records"""
+    stats: Dict[str, Any] = {"parsed": 0, "updated": 0, "unchanged": 0, "errors": 0, "fields": {}}
+    for result in results:
+        if result.error is not None:
+            stats["errors"] += 1
+            print(f"{result.car_id}: {result.error}")
+            continue
+        stats["parsed"] += 1
+        payload = storage.read(result.car_id)
+        if payload is None:
+            stats["errors"] += 1
+            print(f"{result.car_id}: no saved record")
+            continue
+        merged, changed = merge_extracted(payload.get('data', {}), result.data)
+        if not changed:
+            stats["unchanged"] += 1
+            continue
+        stats["updated"] += 1
+        for field in changed:
+            stats["fields"][field] = stats["fields"].get(field, 0) + 1
+        if not dry_run:
+            # A fresh version so delta sync clients pick up the change
+            version = max(payload.get('version', 0) + 1, int(time.time() * 1000))
+            storage.write(result.car_id, {**payload, "data": merged, "version": version})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-extract car data from stored offer page HTML")
+    parser.add_argument("--car", action="append", help="Only these car IDs (repeatable); default: all")
+    parser.add_argument("--workers", type=int, default=REPARSE_WORKERS)
+    parser.add_argument("--parser", choices=["auto", "selectolax", "builtin"], default="auto")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    parser.add_argument("--html-dir", default="html_snapshots")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default=os.getenv("STORAGE_BACKEND", "json"))
+    parser.add_argument("--db", default=os.getenv("SQLITE_PATH", "cars.db"))
+    parser.add_argument("--extracted-dir", default="extracted_data")
+    args = parser.parse_args()
+
+    store = HtmlSnapshotStore(Path(args.html_dir))
+    storage = create_storage(args.backend, Path(args.extracted_dir), Path(args.db))
+    car_ids = args.car or [car_id for car_id in store.car_ids() if car_id.startswith("ID")]
+
+    started = time.perf_counter()
+    stats = apply_results(storage, reparse_all(store.directory, car_ids, args.workers, args.parser), args.dry_run)
+    elapsed = time.perf_counter() - started
+    print(f"Re-extracted {stats['parsed']} cars in {elapsed:.1f}s: {stats['updated']} "
+          f"{'would change' if args.dry_run else 'updated'}, {stats['unchanged']} unchanged, {stats['errors']} errors")
+    for field, count in sorted(stats["fields"].items(), key=lambda item: -item[1]):
+        print(f"  {field}: {count}")
+
+
+if __name__ == "__main__":
+    main()
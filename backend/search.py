@@ -0,0 +1,203 @@
+"""
+Full-text search over car names, descriptions, notes and extracted accessories.
+
+Text is split into words, folded (lower case, Polish diacritics removed so
+"lodówka" and "lodowka" match) and stemmed by stripping one common Polish
+inflection suffix ("lodówką", "lodówki" -> "lodowk"). The in-memory inverted
+index maps each term to the cars containing it with a field-weighted term
+frequency (a match in the name counts more than one in the description) and
+is updated incrementally on every save. Queries are ranked with BM25 and
+results carry HTML snippets with the matching words in <mark>.
+"""
+import html
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterator, List, Set, Tuple
+
+# Weight of a term occurrence per field
+FIELD_WEIGHTS = {"car_name": 3.0, "user_notes": 2.0, "accessories": 2.0, "description": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_LENGTH = 200
+
+WORD = re.compile(r'\w+')
+POLISH_FOLDING = str.maketrans("ąćęłńóśźż", "acelnoszz")
+# Longest first; one suffix is stripped when at least MIN_STEM_LENGTH characters remain
+SUFFIXES = sorted([
+    "ami", "ach", "ego", "emu", "ych", "ymi", "ich", "imi", "iem", "iej", "owi",
+    "ow", "om", "em", "ie", "ia", "iu", "ej", "ym", "im",
+    "a", "e", "i", "o", "u", "y",
+], key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+STOPWORDS = {
+    "a", "aby", "ale", "bez", "co", "dla", "do", "i", "jak", "jako", "jest", "lub", "na", "nad",
+    "nie", "o", "od", "oraz", "po", "pod", "przez", "przy", "sa", "sie", "ta", "tak", "te", "ten",
+    "tez", "to", "tylko", "w", "z", "za", "ze",
+}
+
+
+def fold(word: str) -> str:
+    """Lower case without diacritics"""
+    word = word.lower().translate(POLISH_FOLDING)
+    if not word.isascii():
+        word = "".join(c for c in unicodedata.normalize("NFKD", word) if not unicodedata.combining(c))
+    return word
+
+
+def stem(word: str) -> str:
+    if word.isdigit():
+        return word
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[:-len(suffix)]
+    return word
+
+
+# Descriptions reuse a small vocabulary, so most words are folded and stemmed once
+@lru_cache(maxsize=200_000)
+def term(word: str) -> str:
+    """Index term of a word ("" for stopwords)"""
+    folded = fold(word)
+    if folded in STOPWORDS or (len(folded) < 2 and not folded.isdigit()):
+        return ""
+    return stem(folded)
+
+
+def terms(text: str) -> Iterator[str]:
+    for match in WORD.finditer(text):
+        value = term(match.group(0))
+        if value:
+            yield value
+
+
+def query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(terms(query)))
+
+
+def highlight(text: str, wanted: Set[str], length: int = SNIPPET_LENGTH) -> str:
+    """HTML snippet of the text around the first matching word, matches in <mark> ("" if none)"""
+    matches = [(m.start(), m.end()) for m in WORD.finditer(text) if term(m.group(0)) in wanted]
+    if not matches:
+        return ""
+    start = 0
+    if len(text) > length:
+        # Some context before the first match, starting at a word boundary
+        start = max(0, matches[0][0] - length // 4)
+        if start:
+            space = text.find(" ", start)
+            start = space + 1 if 0 <= space < matches[0][0] else start
+    end = min(len(text), start + length)
+    parts = ["…" if start else ""]
+    position = start
+    for match_start, match_end in matches:
+        if match_start < start:
+            continue
+        if match_end > end:
+            break
+        parts.append(html.escape(text[position:match_start]))
+        parts.append(f"<mark>{html.escape(text[match_start:match_end])}</mark>")
+        position = match_end
+    parts.append(html.escape(text[position:end]))
+    if end < len(text):
+        parts.append("…")
+    return "".join(parts).strip()
+
+
+def weighted_terms(fields: Dict[str, str]) -> Tuple[Dict[str, float], float]:
+    """Field-weighted term frequencies and length of a document"""
+    frequencies: Dict[str, float] = defaultdict(float)
+    length = 0.0
+    for field, text in fields.items():
+        weight = FIELD_WEIGHTS.get(field, 1.0)
+        for value in terms(text):
+            frequencies[value] += weight
+            length += weight
+    return frequencies, length
+
+
+class SearchIndex:
+    """Inverted index of the searchable text of each car, ranked with BM25"""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        # term -> car_id -> weighted frequency
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.documents: Dict[str, Dict[str, str]] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+        # Set once every car known at startup is indexed
+        self.ready = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def set(self, car_id: str, fields: Dict[str, str], replace: bool = True):
+        """Index the text fields of a car (replace=False keeps an entry that is already there)"""
+        fields = {field: text for field, text in fields.items() if text}
+        frequencies, length = weighted_terms(fields)
+        with self._lock:
+            if car_id in self.documents and (not replace or self.documents[car_id] == fields):
+                return
+            self._remove(car_id)
+            for value, frequency in frequencies.items():
+                self.postings.setdefault(value, {})[car_id] = frequency
+            self.documents[car_id] = fields
+            self._doc_terms[car_id] = frequencies
+            self._doc_lengths[car_id] = length
+            self._total_length += length
+
+    def remove(self, car_id: str):
+        with self._lock:
+            self._remove(car_id)
+
+    def clear(self):
+        with self._lock:
+            self.postings.clear()
+            self.documents.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0.0
+            self.ready.clear()
+
+    def _remove(self, car_id: str):
+        self.documents.pop(car_id, None)
+        for value in self._doc_terms.pop(car_id, {}):
+            cars = self.postings.get(value)
+            if cars is not None:
+                cars.pop(car_id, None)
+                if not cars:
+                    del self.postings[value]
+        self._total_length -= self._doc_lengths.pop(car_id, 0.0)
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        """(car_id, score) of the cars matching any query term, best first"""
+        wanted = query_terms(query)
+        scores: Dict[str, float] = defaultdict(float)
+        with self._lock:
+            count = len(self.documents)
+            if not count:
+                return []
+            average_length = self._total_length / count or 1.0
+            for value in wanted:
+                cars = self.postings.get(value)
+                if not cars:
+                    continue
+                idf = math.log(1 + (count - len(cars) + 0.5) / (len(cars) + 0.5))
+                for car_id, frequency in cars.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[car_id] / average_length)
+                    scores[car_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def highlights(self, car_id: str, query: str) -> Dict[str, str]:
+        """Snippets of the car's fields that contain query terms"""
+        wanted = set(query_terms(query))
+        fields = self.documents.get(car_id, {})
+        snippets = {field: highlight(text, wanted) for field, text in fields.items()}
+        return {field: snippet for field, snippet in snippets.items() if snippet}
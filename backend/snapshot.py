@@ -0,0 +1,73 @@
+"""
+On-disk snapshot of the car index for fast restarts.
+
+The snapshot maps car_id to the file it was loaded from (name, mtime, size),
+its store version and the summary fields the /cars table and /api/known-cars
+need. At startup only files whose mtime or size differ from the snapshot are
+parsed again; unchanged cars are restored from their summary and their full
+record is read from disk the first time it is needed.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+
+SNAPSHOT_FORMAT = 3
+
+# Record fields kept in the snapshot (everything the list views read)
+SUMMARY_FIELDS = (
+    "car_id", "url", "car_name", "brand", "model", "price", "year", "mileage", "location",
+    "phone", "vin", "registration_number", "image_main", "user_grade", "user_notes", "disabled", "numeric",
+)
+
+
+def summarize(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: record[field] for field in SUMMARY_FIELDS if field in record}
+
+
+def load_snapshot(path: Path, directory: Path) -> Dict[str, Dict[str, Any]]:
+    """Snapshot entries for the directory, or {} if missing, unreadable or stale"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        snapshot = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except (OSError, ValueError):
+        return {}
+    if (not isinstance(snapshot, dict)
+            or snapshot.get("format") != SNAPSHOT_FORMAT
+            or snapshot.get("fields") != list(SUMMARY_FIELDS)
+            or snapshot.get("directory") != str(Path(directory).resolve())):
+        return {}
+    return snapshot.get("entries", {})
+
+
+def write_snapshot(path: Path, directory: Path, entries: Dict[str, Dict[str, Any]]):
+    """Atomically replace the snapshot file"""
+    snapshot = {
+        "format": SNAPSHOT_FORMAT,
+        "fields": list(SUMMARY_FIELDS),
+        "directory": str(Path(directory).resolve()),
+        "entries": entries,
+    }
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, 'wb') as f:
+        if orjson is not None:
+            f.write(orjson.dumps(snapshot))
+        else:
+            f.write(json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    os.replace(tmp_path, path)
+
+
+def snapshot_entry(location: str, stat, version: int, record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "file": location,
+        "mtime_ns": stat[0],
+        "size": stat[1],
+        "version": version,
+        "record": summarize(record) if record is not None else None,
+    }
@@ -0,0 +1,596 @@
+"""
+Pluggable storage engines for car records.
+
+JsonFileStorage keeps the original layout of one car_data_{car_id}_latest.json
+file per car in extracted_data/. SqliteStorage keeps all records in a single
+SQLite database (WAL mode) with indexed columns, so the /cars table can be
+sorted, filtered and counted by the database instead of in Python.
+
+Select the engine with the STORAGE_BACKEND environment variable ("json" or
+"sqlite"). JsonFileStorage parses files on a worker pool (LOAD_WORKERS,
+LOAD_EXECUTOR=thread|process) and uses orjson when it is installed. Existing
+JSON data is imported into SQLite with:
+
+    uv run python storage.py import --db cars.db
+
+Saved records carry integer versions of their numeric display strings in
+data["numeric"] (see numeric_fields). Records saved before that are updated
+in place with:
+
+    uv run python storage.py backfill-numeric [--backend sqlite --db cars.db]
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+LOAD_EXECUTOR = os.getenv("LOAD_EXECUTOR", "thread")
+# Files per task handed to a worker, so scheduling overhead stays small
+LOAD_CHUNK_SIZE = 256
+# fsync car files (and the directory) on every write; off when the save journal provides durability
+FSYNC_WRITES = os.getenv("FSYNC_WRITES", "1") != "0"
+
+
+class StoredCar(NamedTuple):
+    car_id: str
+    location: str
+    payload: Dict[str, Any]
+    legacy: bool = False
+
+
+def parse_int(value: Any) -> Optional[int]:
+    """Parse Polish-formatted numbers like "39 000" or "262 000 km" into an int"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.search(r'\d[\d\s]*', str(value or ''))
+    return int(re.sub(r'\s', '', match.group(0))) if match else None
+
+
+# Display strings normalized to integers at ingest: "39 000" -> 39000, "2 402 cm3" -> 2402
+NUMERIC_FIELDS = ("price", "mileage", "cubic_capacity", "year")
+
+
+def numeric_fields(data: Dict[str, Any]) -> Dict[str, Optional[int]]:
+    """Integer values of the numeric display fields (None when missing or unparseable)"""
+    return {field: parse_int(data.get(field)) for field in NUMERIC_FIELDS}
+
+
+def fsync_directory(directory: Path):
+    """Persist renames in the directory (a no-op where directories can't be opened)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def loads_json(raw: bytes) -> Any:
+    """Parse JSON with orjson when available"""
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def read_json_files(paths: List[str]) -> List[Tuple[str, Optional[Any], Optional[str]]]:
+    """Read and parse a chunk of files, returning (path, data, error) per file.
+
+    Module level so it can run in a process pool.
+    """
+    results = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                results.append((path, loads_json(f.read()), None))
+        except (OSError, ValueError) as e:
+            results.append((path, None, str(e)))
+    return results
+
+
+def parse_grade(value: Any) -> int:
+    """Parse user_grade the same way the read endpoints do"""
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return 0
+    return value or 0
+
+
+class CarStorage:
+    """Base class for car record storage engines"""
+
+    name = "base"
+    # Whether the engine can answer sort/filter/count queries itself
+    indexed = False
+
+    def load_all(self) -> Iterator[StoredCar]:
+        raise NotImplementedError
+
+    def read(self, car_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def write(self, car_id: str, payload: Dict[str, Any]) -> str:
+        """Persist the payload ({"url": ..., "data": {...}}) and return its location"""
+        raise NotImplementedError
+
+    def path_of(self, car_id: str) -> Path:
+        raise NotImplementedError
+
+    def backfill_numeric_fields(self) -> int:
+        """Add data["numeric"] to records saved without it; returns the number updated"""
+        raise NotImplementedError
+
+    def sync(self):
+        """Make writes done without fsync durable"""
+
+
+class JsonFileStorage(CarStorage):
+    """One car_data_{car_id}_latest.json file per car"""
+
+    name = "json"
+
+    def __init__(self, directory: Path, workers: int = LOAD_WORKERS, executor: str = LOAD_EXECUTOR,
+                 fsync: bool = FSYNC_WRITES):
+        self.directory = Path(directory)
+        self.directory.mkdir(exist_ok=True)
+        self.workers = workers
+        self.executor = executor
+        self.fsync = fsync
+        self.timings: Dict[str, float] = {}
+        # Files written without fsync since the last sync()
+        self._unsynced: set = set()
+        self._unsynced_lock = threading.Lock()
+
+    @staticmethod
+    def filename_for(car_id: str) -> str:
+        return f"car_data_{car_id}_latest.json"
+
+    def path_of(self, car_id: str) -> Path:
+        return self.directory / self.filename_for(car_id)
+
+    @staticmethod
+    def is_legacy_file(name: str) -> bool:
+        return name.startswith("extracted_data_") and name.endswith(".json")
+
+    @staticmethod
+    def is_car_file(name: str) -> bool:
+        return name.startswith("car_data_") and name.endswith("_latest.json")
+
+    @staticmethod
+    def car_id_from_filename(name: str) -> str:
+        """car_data_ID6HvgDG_latest.json -> ID6HvgDG"""
+        car_id_match = re.search(r'car_data_(ID[A-Za-z0-9]+)_latest\.json', name)
+        return car_id_match.group(1) if car_id_match else ""
+
+    def scan(self) -> Tuple[List[str], List[str]]:
+        """Old and new format filenames, found in a single directory pass"""
+        old_files, new_files = [], []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if self.is_car_file(entry.name):
+                    new_files.append(entry.name)
+                elif self.is_legacy_file(entry.name):
+                    old_files.append(entry.name)
+        return old_files, new_files
+
+    def stat_files(self) -> Dict[str, Tuple[int, int]]:
+        """(mtime_ns, size) of every old and new format file"""
+        stats = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if self.is_car_file(entry.name) or self.is_legacy_file(entry.name):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def file_stat(self, name: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = (self.directory / name).stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def parse_files(self, names: List[str]) -> Iterator[Tuple[str, Optional[Any], Optional[str]]]:
+        """Parse files on the worker pool, yielding (path, data, error) in order"""
+        paths = [str(self.directory / name) for name in names]
+        chunks = [paths[i:i + LOAD_CHUNK_SIZE] for i in range(0, len(paths), LOAD_CHUNK_SIZE)]
+        if self.workers <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                yield from read_json_files(chunk)
+            return
+        pool_class = ProcessPoolExecutor if self.executor == "process" else ThreadPoolExecutor
+        with pool_class(max_workers=self.workers) as pool:
+            for results in pool.map(read_json_files, chunks):
+                yield from results
+
+    def load_all(self) -> Iterator[StoredCar]:
+        started = time.perf_counter()
+        old_files, new_files = self.scan()
+        scanned = time.perf_counter()
+        yield from self.load_files(old_files + new_files)
+        self.timings = {"scan": scanned - started, "parse": time.perf_counter() - scanned}
+
+    def load_files(self, names: List[str]) -> Iterator[StoredCar]:
+        """Parse the given files (legacy ones first) into stored cars"""
+        old_files = [name for name in names if self.is_legacy_file(name)]
+        new_files = [name for name in names if not self.is_legacy_file(name)]
+        print(f"Loading {len(old_files) + len(new_files)} files ({len(old_files)} old format, {len(new_files)} new format) "
+              f"with {self.workers} {self.executor} workers using {'orjson' if orjson else 'json'}...")
+
+        for path, data, error in self.parse_files(old_files + new_files):
+            name = os.path.basename(path)
+            if error is not None or not isinstance(data, dict):
+                print(f"Skipping corrupted file {name}: {error}")
+                continue
+
+            if name.startswith("car_data_"):
+                # New format: car_data_ID6HvgDG_latest.json
+                car_id = self.car_id_from_filename(name)
+                legacy = False
+            else:
+                # Old format: extract from URL
+                url_match = re.search(r'ID([A-Za-z0-9]+)', data.get('url', ''))
+                car_id = f"ID{url_match.group(1)}" if url_match else ""
+                legacy = True
+
+            if car_id:
+                yield StoredCar(car_id, name, data, legacy)
+
+    def read(self, car_id: str) -> Optional[Dict[str, Any]]:
+        filepath = self.path_of(car_id)
+        if not filepath.exists():
+            return None
+        try:
+            with open(filepath, 'rb') as f:
+                return loads_json(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def write(self, car_id: str, payload: Dict[str, Any]) -> str:
+        """Write to a temporary file and rename it over the car file, so readers and
+        crashes only ever see the old or the new contents"""
+        filename = self.filename_for(car_id)
+        tmp_path = self.directory / f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.directory / filename)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        if self.fsync:
+            fsync_directory(self.directory)
+        else:
+            with self._unsynced_lock:
+                self._unsynced.add(filename)
+        return filename
+
+    def sync(self):
+        """fsync the files written without fsync since the last call"""
+        with self._unsynced_lock:
+            names, self._unsynced = self._unsynced, set()
+        for name in names:
+            try:
+                fd = os.open(self.directory / name, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        fsync_directory(self.directory)
+
+    def remove_temp_files(self) -> int:
+        """Delete temporary files left behind by writes interrupted by a crash"""
+        removed = 0
+        for path in self.directory.glob(".car_data_*.tmp"):
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def backfill_numeric_fields(self) -> int:
+        updated = 0
+        for car in self.load_all():
+            data = car.payload.get('data')
+            if car.legacy or not isinstance(data, dict):
+                continue
+            numeric = numeric_fields(data)
+            if data.get('numeric') != numeric:
+                data['numeric'] = numeric
+                self.write(car.car_id, car.payload)
+                updated += 1
+        return updated
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cars (
+    car_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    user_grade INTEGER NOT NULL DEFAULT 0,
+    price INTEGER,
+    year INTEGER,
+    disabled INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    mileage INTEGER,
+    brand TEXT NOT NULL DEFAULT '',
+    cubic_capacity INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_cars_user_grade ON cars (user_grade);
+CREATE INDEX IF NOT EXISTS idx_cars_price ON cars (price);
+CREATE INDEX IF NOT EXISTS idx_cars_year ON cars (year);
+CREATE INDEX IF NOT EXISTS idx_cars_mileage ON cars (mileage);
+CREATE INDEX IF NOT EXISTS idx_cars_cubic_capacity ON cars (cubic_capacity);
+CREATE INDEX IF NOT EXISTS idx_cars_brand ON cars (brand COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_cars_disabled ON cars (disabled);
+CREATE INDEX IF NOT EXISTS idx_cars_version ON cars (version);
+
+CREATE TABLE IF NOT EXISTS features (
+    car_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    model_used TEXT,
+    extraction_timestamp TEXT
+);
+"""
+
+# Columns that may be used for ORDER BY (never interpolate user input directly)
+SORT_COLUMNS = {"user_grade", "price", "year", "mileage", "cubic_capacity"}
+
+
+class SqliteStorage(CarStorage):
+    """All cars in one SQLite database with indexed query columns"""
+
+    name = "sqlite"
+    indexed = True
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        with self.connection() as conn:
+            self._migrate(conn)
+            conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """Per-thread connection (endpoints run on Starlette's threadpool)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        """Add columns introduced after a database was created"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(cars)")}
+        if columns and "version" not in columns:
+            conn.execute("ALTER TABLE cars ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if columns and "mileage" not in columns:
+            conn.execute("ALTER TABLE cars ADD COLUMN mileage INTEGER")
+            conn.execute("ALTER TABLE cars ADD COLUMN brand TEXT NOT NULL DEFAULT ''")
+            rows = conn.execute("SELECT car_id, data FROM cars").fetchall()
+            for car_id, data in rows:
+                data = json.loads(data)
+                conn.execute("UPDATE cars SET mileage = ?, brand = ? WHERE car_id = ?",
+                             (parse_int(data.get('mileage')), str(data.get('brand') or '').strip(), car_id))
+        if columns and "cubic_capacity" not in columns:
+            conn.execute("ALTER TABLE cars ADD COLUMN cubic_capacity INTEGER")
+            rows = conn.execute("SELECT car_id, data FROM cars").fetchall()
+            for car_id, data in rows:
+                conn.execute("UPDATE cars SET cubic_capacity = ? WHERE car_id = ?",
+                             (parse_int(json.loads(data).get('cubic_capacity')), car_id))
+
+    def path_of(self, car_id: str) -> Path:
+        return self.db_path
+
+    def load_all(self) -> Iterator[StoredCar]:
+        rows = self.connection().execute("SELECT car_id, url, data, version FROM cars").fetchall()
+        print(f"Loading {len(rows)} cars from {self.db_path}...")
+        for car_id, url, data, version in rows:
+            payload = {"url": url, "data": json.loads(data), "version": version}
+            yield StoredCar(car_id, self._location(car_id), payload)
+
+    def read(self, car_id: str) -> Optional[Dict[str, Any]]:
+        row = self.connection().execute(
+            "SELECT url, data, version FROM cars WHERE car_id = ?", (car_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"url": row[0], "data": json.loads(row[1]), "version": row[2]}
+
+    def write(self, car_id: str, payload: Dict[str, Any]) -> str:
+        with self.connection() as conn:
+            self._upsert(conn, car_id, payload)
+        return self._location(car_id)
+
+    def _location(self, car_id: str) -> str:
+        return f"{self.db_path.name}#{car_id}"
+
+    def backfill_numeric_fields(self) -> int:
+        updated = 0
+        with self.connection() as conn:
+            rows = conn.execute("SELECT car_id, url, data, version FROM cars").fetchall()
+            for car_id, url, data, version in rows:
+                data = json.loads(data)
+                numeric = numeric_fields(data)
+                if data.get('numeric') != numeric:
+                    data['numeric'] = numeric
+                    self._upsert(conn, car_id, {"url": url, "data": data, "version": version})
+                    updated += 1
+        return updated
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, car_id: str, payload: Dict[str, Any]):
+        data = payload.get('data', {})
+        numeric = data.get('numeric') or numeric_fields(data)
+        conn.execute(
+            """
+            INSERT INTO cars (car_id, url, data, user_grade, price, year, disabled, version, mileage, brand,
+                              cubic_capacity)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(car_id) DO UPDATE SET
+                url = excluded.url,
+                data = excluded.data,
+                user_grade = excluded.user_grade,
+                price = excluded.price,
+                year = excluded.year,
+                disabled = excluded.disabled,
+                version = excluded.version,
+                mileage = excluded.mileage,
+                brand = excluded.brand,
+                cubic_capacity = excluded.cubic_capacity
+            """,
+            (
+                car_id,
+                payload.get('url', ''),
+                json.dumps(data, ensure_ascii=False),
+                parse_grade(data.get('user_grade', 0)),
+                numeric.get('price'),
+                numeric.get('year'),
+                int(bool(data.get('disabled', False))),
+                payload.get('version', 0),
+                numeric.get('mileage'),
+                str(data.get('brand') or '').strip(),
+                numeric.get('cubic_capacity'),
+            ),
+        )
+
+    def _where(self, min_grade: Optional[int], disabled: Optional[bool], brand: Optional[str] = None,
+               min_price: Optional[int] = None, max_price: Optional[int] = None):
+        clauses, params = [], []
+        if min_grade is not None:
+            clauses.append("user_grade >= ?")
+            params.append(min_grade)
+        if disabled is not None:
+            clauses.append("disabled = ?")
+            params.append(int(disabled))
+        if brand is not None:
+            clauses.append("brand = ? COLLATE NOCASE")
+            params.append(brand)
+        if min_price is not None:
+            clauses.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            clauses.append("price <= ?")
+            params.append(max_price)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def query_car_ids(self, order_by: str = "user_grade", descending: bool = True,
+                      min_grade: Optional[int] = None, disabled: Optional[bool] = None,
+                      limit: Optional[int] = None, offset: int = 0, brand: Optional[str] = None,
+                      min_price: Optional[int] = None, max_price: Optional[int] = None) -> List[str]:
+        """Return car IDs matching the filters, ordered by an indexed column"""
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort column: {order_by}")
+        where, params = self._where(min_grade, disabled, brand, min_price, max_price)
+        direction = "DESC" if descending else "ASC"
+        # NULLs (unparseable prices/years) always go last
+        sql = f"SELECT car_id FROM cars {where} ORDER BY {order_by} IS NULL, {order_by} {direction}, car_id"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        return [row[0] for row in self.connection().execute(sql, params)]
+
+    def count_cars(self, min_grade: Optional[int] = None, disabled: Optional[bool] = None,
+                   brand: Optional[str] = None, min_price: Optional[int] = None,
+                   max_price: Optional[int] = None) -> int:
+        where, params = self._where(min_grade, disabled, brand, min_price, max_price)
+        return self.connection().execute(f"SELECT COUNT(*) FROM cars {where}", params).fetchone()[0]
+
+    def rating_stats(self) -> Dict[str, Any]:
+        """Number of rated cars and their average rating"""
+        count, average = self.connection().execute(
+            "SELECT COUNT(*), AVG(user_grade) FROM cars WHERE user_grade > 0"
+        ).fetchone()
+        return {"rated_cars_count": count, "average_rating": average or 0}
+
+    def import_directories(self, extracted_dir: Path, parsed_dir: Optional[Path] = None) -> Dict[str, int]:
+        """One-shot import of extracted_data/ (and optionally parsed_data/) into the database"""
+        imported = {"cars": 0, "features": 0}
+        source = JsonFileStorage(extracted_dir)
+        with self.connection() as conn:
+            for car in source.load_all():
+                if car.legacy:
+                    continue
+                self._upsert(conn, car.car_id, car.payload)
+                imported["cars"] += 1
+
+            if parsed_dir is not None and Path(parsed_dir).exists():
+                for features_file in Path(parsed_dir).glob("features_*_latest.json"):
+                    try:
+                        with open(features_file, 'r', encoding='utf-8') as f:
+                            result = json.load(f)
+                    except json.JSONDecodeError as e:
+                        print(f"Skipping corrupted file {features_file}: {e}")
+                        continue
+                    conn.execute(
+                        "INSERT OR REPLACE INTO features (car_id, data, model_used, extraction_timestamp) VALUES (?, ?, ?, ?)",
+                        (
+                            result.get('car_id', ''),
+                            json.dumps(result.get('features', {}), ensure_ascii=False),
+                            result.get('model_used'),
+                            result.get('extraction_timestamp'),
+                        ),
+                    )
+                    imported["features"] += 1
+        return imported
+
+
+def create_storage(backend: str, storage_dir: Path, db_path: Path) -> CarStorage:
+    """Create the storage engine selected by STORAGE_BACKEND"""
+    if backend == "sqlite":
+        return SqliteStorage(db_path)
+    if backend == "json":
+        return JsonFileStorage(storage_dir)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Car storage maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import extracted_data/ and parsed_data/ into SQLite")
+    import_parser.add_argument("--db", default=os.getenv("SQLITE_PATH", "cars.db"))
+    import_parser.add_argument("--extracted-dir", default="extracted_data")
+    import_parser.add_argument("--parsed-dir", default="parsed_data")
+    backfill_parser = subparsers.add_parser("backfill-numeric",
+                                            help="Add integer price/mileage/cubic_capacity/year to existing records")
+    backfill_parser.add_argument("--backend", choices=["json", "sqlite"], default=os.getenv("STORAGE_BACKEND", "json"))
+    backfill_parser.add_argument("--db", default=os.getenv("SQLITE_PATH", "cars.db"))
+    backfill_parser.add_argument("--extracted-dir", default="extracted_data")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        storage = SqliteStorage(Path(args.db))
+        imported = storage.import_directories(Path(args.extracted_dir), Path(args.parsed_dir))
+        print(f"Imported {imported['cars']} cars and {imported['features']} feature sets into {args.db}")
+    elif args.command == "backfill-numeric":
+        storage = create_storage(args.backend, Path(args.extracted_dir), Path(args.db))
+        updated = storage.backfill_numeric_fields()
+        print(f"Added numeric fields to {updated} {storage.name} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Filesystem watchers that report car files changed outside the API.
+
+WatchdogWatcher uses inotify (or the platform equivalent) through the optional
+"watchdog" package; PollingWatcher is the fallback and diffs (mtime, size) of
+the directory every few seconds. Both call on_change(filename) for created,
+modified or renamed-into-place files and on_delete(filename) for removed ones,
+from a background thread.
+"""
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is an optional speedup
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class PollingWatcher:
+    """Detects changes by comparing directory stats on an interval"""
+
+    name = "polling"
+
+    def __init__(self, stat_files: Callable[[], Dict[str, Tuple[int, int]]],
+                 on_change: Callable[[str], None], on_delete: Callable[[str], None], interval: float = 2.0):
+        self.stat_files = stat_files
+        self.on_change = on_change
+        self.on_delete = on_delete
+        self.interval = interval
+        self.known = stat_files()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self):
+        """Compare the directory with the last poll and report the differences"""
+        current = self.stat_files()
+        for name, stat in current.items():
+            if self.known.get(name) != stat:
+                self._report(name, self.on_change)
+        for name in self.known.keys() - current.keys():
+            self._report(name, self.on_delete)
+        self.known = current
+
+    @staticmethod
+    def _report(name: str, callback: Callable[[str], None]):
+        try:
+            callback(name)
+        except Exception as e:
+            print(f"File watcher failed to handle {name}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"File watcher poll failed: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, accepts: Callable[[str], bool], on_change: Callable[[str], None],
+                 on_delete: Callable[[str], None]):
+        self.accepts = accepts
+        self.on_change = on_change
+        self.on_delete = on_delete
+
+    def _report(self, path: str, callback: Callable[[str], None]):
+        name = Path(path).name
+        if self.accepts(name):
+            try:
+                callback(name)
+            except Exception as e:
+                print(f"File watcher failed to handle {name}: {e}")
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._report(event.src_path, self.on_change)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._report(event.src_path, self.on_change)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self._report(event.src_path, self.on_delete)
+
+    def on_moved(self, event):
+        # Atomic writes show up as a temp file renamed over the car file
+        if not event.is_directory:
+            self._report(event.src_path, self.on_delete)
+            self._report(event.dest_path, self.on_change)
+
+
+class WatchdogWatcher:
+    """Event-driven watcher backed by inotify/FSEvents/ReadDirectoryChangesW"""
+
+    name = "watchdog"
+
+    def __init__(self, directory: Path, accepts: Callable[[str], bool],
+                 on_change: Callable[[str], None], on_delete: Callable[[str], None]):
+        self.observer = Observer()
+        self.observer.schedule(_EventHandler(accepts, on_change, on_delete), str(directory), recursive=False)
+
+    def start(self):
+        self.observer.start()
+
+    def stop(self):
+        self.observer.stop()
+        self.observer.join(timeout=5)
+
+
+def create_watcher(mode: str, directory: Path, stat_files: Callable[[], Dict[str, Tuple[int, int]]],
+                   accepts: Callable[[str], bool], on_change: Callable[[str], None],
+                   on_delete: Callable[[str], None], interval: float = 2.0):
+    """Watcher for WATCH_FILES mode "auto", "watchdog", "poll" or "off" (None)"""
+    if mode == "off":
+        return None
+    if mode in ("auto", "watchdog") and Observer is not None:
+        return WatchdogWatcher(directory, accepts, on_change, on_delete)
+    if mode == "watchdog":
+        print("watchdog is not installed, falling back to polling")
+    return PollingWatcher(stat_files, on_change, on_delete, interval)
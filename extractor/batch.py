@@ -0,0 +1,133 @@
+"""
+OpenAI Batch API support for bulk offline feature extraction.
+
+Pending listings are written to a JSONL batch request file (one chat completion
+per car, constrained to the CamperFeatures JSON schema), uploaded and submitted
+as a batch. Once the batch completes its output is downloaded and every line is
+validated against CamperFeatures before being fanned out to features files.
+"""
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Type
+
+from openai import OpenAI
+from pydantic import BaseModel, ValidationError
+
+from models import CamperFeatures
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchRequest(NamedTuple):
+    custom_id: str
+    messages: List[Dict]
+    response_model: Type[BaseModel] = CamperFeatures
+
+
+class BatchResult(NamedTuple):
+    custom_id: str
+    features: Optional[CamperFeatures]
+    error: Optional[str]
+
+
+def response_format(response_model: Type[BaseModel] = CamperFeatures) -> Dict:
+    """Structured output format equivalent to an Instructor response model"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_model.__name__,
+            "schema": response_model.model_json_schema(),
+            "strict": False,
+        },
+    }
+
+
+def validate_features(custom_id: str, content: str) -> CamperFeatures:
+    return CamperFeatures.model_validate_json(content)
+
+
+def write_batch_file(requests: Iterable[BatchRequest], path: Path, model: str) -> int:
+    """Write the JSONL batch input file and return the number of requests"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            line = {
+                "custom_id": request.custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": request.messages,
+                    "temperature": 0.1,
+                    "response_format": response_format(request.response_model),
+                },
+            }
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def submit_batch(client: OpenAI, path: Path) -> str:
+    """Upload the batch input file, create the batch and return its ID"""
+    with open(path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    logger.info(f"Submitted batch {batch.id} ({path.name})")
+    return batch.id
+
+
+def wait_for_batch(client: OpenAI, batch_id: str, poll_interval: float = 30.0, timeout: Optional[float] = None):
+    """Poll the batch until it reaches a terminal status and return it"""
+    started = time.monotonic()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        progress = f"{counts.completed}/{counts.total}" if counts else "?"
+        logger.info(f"Batch {batch_id}: {batch.status} ({progress} completed)")
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"Batch {batch_id} did not finish within {timeout}s")
+        time.sleep(poll_interval)
+
+
+def parse_output_line(line: str,
+                      validate: Callable[[str, str], CamperFeatures] = validate_features) -> BatchResult:
+    """Validate one line of the batch output file"""
+    record = json.loads(line)
+    custom_id = record.get("custom_id", "")
+    if record.get("error"):
+        return BatchResult(custom_id, None, str(record["error"]))
+
+    response = record.get("response") or {}
+    if response.get("status_code") != 200:
+        return BatchResult(custom_id, None, f"HTTP {response.get('status_code')}: {response.get('body')}")
+
+    try:
+        content = response["body"]["choices"][0]["message"]["content"]
+        return BatchResult(custom_id, validate(custom_id, content), None)
+    except (KeyError, IndexError, TypeError, ValidationError) as e:
+        return BatchResult(custom_id, None, f"Invalid output: {e}")
+
+
+def download_results(client: OpenAI, batch,
+                     validate: Callable[[str, str], CamperFeatures] = validate_features) -> List[BatchResult]:
+    """Download and validate the output (and error) files of a finished batch"""
+    results = []
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        content = client.files.content(file_id).text
+        for line in content.splitlines():
+            if line.strip():
+                results.append(parse_output_line(line, validate))
+    return results
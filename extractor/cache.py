@@ -0,0 +1,91 @@
+"""
+Persistent content-hash cache for LLM feature extractions.
+
+Entries are keyed on a hash of the normalized description, the extraction
+prompt, the CamperFeatures JSON schema and the model name, so the same text
+is never sent to the model twice (also when a listing is reposted under a new
+car ID), while a change to the prompt, schema or model invalidates everything.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_description(description: str) -> str:
+    """Normalize unicode and whitespace so cosmetic edits don't miss the cache"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize("NFC", description)).strip()
+
+
+def cache_key(description: str, prompt: str, schema: Dict, model: str) -> str:
+    """Hash of everything that determines the model's answer"""
+    digest = hashlib.sha256()
+    for part in (normalize_description(description), prompt, json.dumps(schema, sort_keys=True), model):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Directory of {key}.json feature files with least-recently-used eviction"""
+
+    def __init__(self, directory: Path, max_entries: int = 50000):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._entries = sum(1 for _ in self.directory.glob("*/*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                features = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.stats["misses"] += 1
+            return None
+        # Mark as recently used for eviction
+        os.utime(path)
+        self.stats["hits"] += 1
+        return features
+
+    def put(self, key: str, features: Dict):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        existed = path.exists()
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(features, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.stats["stores"] += 1
+        if not existed:
+            self._entries += 1
+            if self._entries > self.max_entries:
+                self.evict()
+
+    def evict(self):
+        """Drop the least recently used entries, leaving 10% headroom below max_entries"""
+        files = sorted(self.directory.glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        target = int(self.max_entries * 0.9)
+        for path in files[:max(0, len(files) - target)]:
+            try:
+                path.unlink()
+                self.stats["evictions"] += 1
+            except OSError:
+                pass
+        self._entries = min(len(files), target)
+
+    def summary(self) -> str:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups * 100 if lookups else 0.0
+        return (f"cache: {self.stats['hits']} hits, {self.stats['misses']} misses ({hit_rate:.0f}% hit rate), "
+                f"{self.stats['stores']} stored, {self.stats['evictions']} evicted, {self._entries} entries")
@@ -4,12 +4,28 @@ CSV Export Script
 
 Reads all parsed JSON files from backend/parsed_data/ and exports them
 to a single CSV file for easy analysis and filtering.
+
+Both directories are loaded in one bulk pass and joined on car_id column by
+column. With pyarrow installed the same table can also be written as Parquet
+or Arrow with typed columns (booleans, categoricals, floats).
 """
+import argparse
 import csv
 import json
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, get_args
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from models import CamperFeatures
 
 # Configure logging
 logging.basicConfig(
@@ -20,7 +36,9 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 INPUT_DIR = Path("../backend/parsed_data")
+ORIGINAL_DIR = Path("../backend/extracted_data")
 OUTPUT_FILE = Path("../backend/camper_features.csv")
+LOAD_WORKERS = min(32, (os.cpu_count() or 1) * 4)
 
 # Define CSV columns (URL first, then grade, then features, excluding accessories)
 CSV_COLUMNS = [
@@ -43,6 +61,13 @@ CSV_COLUMNS = [
     "confidence_score"
 ]
 
+# Column types for Parquet/Arrow output
+BOOL_COLUMNS = [column for column in CSV_COLUMNS
+                if CamperFeatures.model_fields.get(column) and CamperFeatures.model_fields[column].annotation is bool]
+CATEGORY_COLUMNS = [column for column in CSV_COLUMNS
+                    if CamperFeatures.model_fields.get(column) and get_args(CamperFeatures.model_fields[column].annotation)
+                    and all(isinstance(arg, str) for arg in get_args(CamperFeatures.model_fields[column].annotation))]
+
 
 def should_empty_value(value: Any) -> bool:
     """Check if a value should be represented as empty in CSV"""
@@ -64,143 +89,142 @@ def transform_value(value: Any) -> str:
     return str(value)
 
 
-def load_json_file(file_path: Path) -> Dict:
-    """Load and parse a JSON file"""
+def load_json_file(file_path: Path) -> Optional[Dict]:
+    """Load and parse a JSON file, returning None if it is unreadable"""
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception as e:
         logger.error(f"Error loading {file_path}: {e}")
-        raise
+        return None
+
 
+def car_id_from_name(file_path: Path) -> str:
+    """features_ID6XXX_latest.json / car_data_ID6XXX_latest.json -> ID6XXX"""
+    return file_path.name.rsplit("_", 2)[-2]
 
-def load_original_data(car_id: str) -> Dict:
-    """Load original car data to get user_grade"""
-    original_file = Path("../backend/extracted_data") / f"car_data_{car_id}_latest.json"
+
+def load_directory(directory: Path, pattern: str) -> Dict[str, Dict]:
+    """Load every matching JSON file of a directory concurrently, keyed by car_id"""
+    files = sorted(directory.glob(pattern)) if directory.exists() else []
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as pool:
+        loaded = pool.map(load_json_file, files)
+        return {car_id_from_name(path): data for path, data in zip(files, loaded) if data is not None}
+
+
+def parse_grade(value: Any) -> Optional[int]:
     try:
-        with open(original_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.warning(f"Could not load original data for {car_id}: {e}")
-        return {}
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
 
 
-def extract_csv_row(json_data: Dict) -> Dict[str, str]:
-    """Extract a CSV row from JSON data"""
-    row = {}
-    
-    # Get URL from top level
-    row["url"] = json_data.get("url", "")
+def build_columns(features_data: Dict[str, Dict], original_data: Dict[str, Dict]) -> Dict[str, List]:
+    """Join features with user grades on car_id into typed columns"""
+    car_ids = list(features_data)
+    features = [features_data[car_id].get("features", {}) for car_id in car_ids]
+    grades = {car_id: data.get("data", {}).get("user_grade") for car_id, data in original_data.items()}
     
-    # Get car_id to load original data for user_grade
-    car_id = json_data.get("car_id", "")
-    if car_id:
-        original_data = load_original_data(car_id)
-        user_grade = original_data.get("data", {}).get("user_grade")
-        row["user_grade"] = transform_value(user_grade)
-    else:
-        row["user_grade"] = ""
-    
-    # Get features from nested features object
-    features = json_data.get("features", {})
-    
-    # Extract each column (excluding url and user_grade which we already handled)
+    columns = {
+        "car_id": car_ids,
+        "url": [features_data[car_id].get("url", "") for car_id in car_ids],
+        "user_grade": [parse_grade(grades.get(car_id)) for car_id in car_ids],
+    }
     for column in CSV_COLUMNS[2:]:  # Skip 'url' and 'user_grade'
-        value = features.get(column)
-        row[column] = transform_value(value)
-    
-    return row
-
-
-def export_to_csv():
-    """Export all JSON files to CSV"""
+        values = [f.get(column) for f in features]
+        if column in BOOL_COLUMNS:
+            values = [value if isinstance(value, bool) else None for value in values]
+        elif column == "confidence_score":
+            values = [float(value) if isinstance(value, (int, float)) else None for value in values]
+        columns[column] = values
+    return columns
+
+
+def write_csv(columns: Dict[str, List], output_file: Path):
+    """Write the CSV columns, transforming whole columns at a time"""
+    transformed = [[transform_value(value) for value in columns[column]] for column in CSV_COLUMNS]
+    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(zip(*transformed))
+
+
+def to_arrow_table(columns: Dict[str, List]):
+    """Typed Arrow table: booleans, dictionary-encoded categoricals, floats"""
+    arrays = {}
+    for name, values in columns.items():
+        if name in BOOL_COLUMNS:
+            arrays[name] = pyarrow.array(values, type=pyarrow.bool_())
+        elif name in CATEGORY_COLUMNS:
+            arrays[name] = pyarrow.array(values, type=pyarrow.string()).dictionary_encode()
+        elif name == "user_grade":
+            arrays[name] = pyarrow.array(values, type=pyarrow.int8())
+        elif name == "confidence_score":
+            arrays[name] = pyarrow.array(values, type=pyarrow.float32())
+        else:
+            arrays[name] = pyarrow.array(values, type=pyarrow.string())
+    return pyarrow.table(arrays)
+
+
+def export_to_csv(parquet_file: Optional[Path] = None, arrow_file: Optional[Path] = None) -> int:
+    """Export all features files to CSV (and optionally Parquet/Arrow), returning the row count"""
     logger.info("Starting CSV export process")
     logger.info(f"Input directory: {INPUT_DIR.absolute()}")
     logger.info(f"Output file: {OUTPUT_FILE.absolute()}")
     
+    if (parquet_file or arrow_file) and pyarrow is None:
+        raise SystemExit("Parquet/Arrow export requires pyarrow: pip install 'camper-extractor[export]'")
+    
     # Check input directory exists
     if not INPUT_DIR.exists():
         logger.error(f"Input directory {INPUT_DIR} does not exist")
-        return
+        return 0
     
-    # Find all JSON files
-    json_files = list(INPUT_DIR.glob("features_*_latest.json"))
-    logger.info(f"Found {len(json_files)} JSON files to process")
-    
-    if not json_files:
+    # Load both directories in one bulk pass
+    features_data = load_directory(INPUT_DIR, "features_*_latest.json")
+    logger.info(f"Loaded {len(features_data)} features files")
+    if not features_data:
         logger.warning("No JSON files found to export")
-        return
+        return 0
+    original_data = load_directory(ORIGINAL_DIR, "car_data_*_latest.json")
+    missing = len(set(features_data) - set(original_data))
+    if missing:
+        logger.warning(f"{missing} cars have no original data - their user_grade is empty")
     
-    # Prepare CSV data
-    csv_rows = []
-    processed = 0
-    errors = 0
+    columns = build_columns(features_data, original_data)
+    rows = len(columns["car_id"])
     
-    for json_file in json_files:
-        try:
-            logger.debug(f"Processing {json_file.name}")
-            
-            # Load JSON data
-            json_data = load_json_file(json_file)
-            
-            # Extract CSV row
-            csv_row = extract_csv_row(json_data)
-            csv_rows.append(csv_row)
-            
-            processed += 1
-            
-        except Exception as e:
-            logger.error(f"Failed to process {json_file.name}: {e}")
-            errors += 1
-            continue
+    write_csv(columns, OUTPUT_FILE)
+    logger.info(f"✅ CSV export successful!")
+    logger.info(f"📄 File: {OUTPUT_FILE}")
+    logger.info(f"📊 Rows: {rows} (plus header)")
+    logger.info(f"📋 Columns: {len(CSV_COLUMNS)}")
     
-    if not csv_rows:
-        logger.error("No valid data to export")
-        return
+    if parquet_file or arrow_file:
+        table = to_arrow_table(columns)
+        if parquet_file:
+            pyarrow.parquet.write_table(table, parquet_file, compression="zstd")
+            logger.info(f"📄 Parquet: {parquet_file}")
+        if arrow_file:
+            pyarrow.feather.write_feather(table, arrow_file)
+            logger.info(f"📄 Arrow: {arrow_file}")
     
-    # Write CSV file
-    try:
-        logger.info(f"Writing CSV file with {len(csv_rows)} rows")
-        
-        with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=CSV_COLUMNS)
-            
-            # Write header
-            writer.writeheader()
-            
-            # Write data rows
-            writer.writerows(csv_rows)
-        
-        logger.info(f"✅ CSV export successful!")
-        logger.info(f"📄 File: {OUTPUT_FILE}")
-        logger.info(f"📊 Rows: {len(csv_rows)} (plus header)")
-        logger.info(f"📋 Columns: {len(CSV_COLUMNS)}")
-        logger.info(f"✅ Processed: {processed} files")
-        
-        if errors > 0:
-            logger.warning(f"⚠️  Errors: {errors} files failed to process")
-        
-        # Show sample of data
-        if csv_rows:
-            logger.info("📋 Sample data:")
-            sample_row = csv_rows[0]
-            for key, value in list(sample_row.items())[:5]:  # Show first 5 columns
-                display_value = value if value else "(empty)"
-                logger.info(f"  {key}: {display_value}")
-            if len(sample_row) > 5:
-                logger.info(f"  ... and {len(sample_row) - 5} more columns")
-        
-    except Exception as e:
-        logger.error(f"Failed to write CSV file: {e}")
-        raise
+    return rows
 
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Export extracted camper features")
+    parser.add_argument("--parquet", type=Path, nargs="?", const=OUTPUT_FILE.with_suffix(".parquet"),
+                        help="also write a typed Parquet file (requires pyarrow)")
+    parser.add_argument("--arrow", type=Path, nargs="?", const=OUTPUT_FILE.with_suffix(".arrow"),
+                        help="also write a typed Arrow IPC file (requires pyarrow)")
+    args = parser.parse_args()
+    
     logger.info("🚀 Starting camper features CSV export")
     
     try:
-        export_to_csv()
+        export_to_csv(args.parquet, args.arrow)
     except Exception as e:
         logger.error(f"❌ CSV export failed: {e}")
         raise
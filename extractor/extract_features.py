@@ -4,20 +4,32 @@ Camper/Van Feature Extraction Script
 
 Reads JSON files from backend/extracted_data/ and extracts structured features
 using OpenAI and Instructor, saving results to backend/parsed_data/.
+
+Run with --async to extract many listings concurrently with rate limiting, or
+with --batch to submit all pending listings to the OpenAI Batch API.
 """
+import argparse
+import asyncio
 import json
 import logging
 import os
 import re
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, NamedTuple, Tuple, Type
 
 import instructor
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
+from pydantic import BaseModel
 
+import batch
+import rules
+from cache import ExtractionCache, cache_key
+from manifest import ExtractionManifest, description_hash
 from models import CamperFeatures, ExtractionResult
+from rate_limit import RateLimiter, backoff_delay, estimate_tokens, is_retryable, retry_after
 
 # Load environment variables
 load_dotenv()
@@ -35,8 +47,32 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 INPUT_DIR = Path("../backend/extracted_data")
 OUTPUT_DIR = Path("../backend/parsed_data")
 
+# Async pipeline configuration (defaults fit a tier 1 gpt-4o-mini account)
+CONCURRENCY = int(os.getenv("CONCURRENCY", "8"))
+REQUESTS_PER_MINUTE = float(os.getenv("REQUESTS_PER_MINUTE", "450"))
+TOKENS_PER_MINUTE = float(os.getenv("TOKENS_PER_MINUTE", "180000"))
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", "6"))
+
+# Decide keyword-driven fields (webasto, klima, ...) locally and only ask the model for the rest
+USE_RULES = os.getenv("USE_RULES", "true").lower() not in ("0", "false", "no")
+
+# Content-hash cache of extractions shared across car IDs
+CACHE_DIR = Path(os.getenv("EXTRACTION_CACHE_DIR", ".cache/extractions"))
+CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "50000"))
+
+# Manifest of input stats and description hashes for incremental runs
+MANIFEST_FILE = Path(os.getenv("EXTRACTION_MANIFEST", ".cache/manifest.json"))
+
+# Batch API mode: request files and state of submitted batches
+BATCH_DIR = Path(os.getenv("BATCH_DIR", ".cache/batches"))
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "60"))
+
 # Initialize OpenAI client with Instructor
-client = instructor.from_openai(OpenAI(api_key=OPENAI_API_KEY))
+openai_client = OpenAI(api_key=OPENAI_API_KEY)
+client = instructor.from_openai(openai_client)
+# Retries are handled by the pipeline (jittered backoff shared with the rate limiter)
+async_client = instructor.from_openai(AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0))
 
 EXTRACTION_PROMPT = """
 Jesteś ekspertem od analizy opisów kamperów i vanów. Przeanalizuj poniższy polski opis kampera używając DWUETAPOWEGO PODEJŚCIA:
@@ -80,39 +116,204 @@ def load_car_data(file_path: Path) -> Dict:
         raise
 
 
+class ExtractionJob(NamedTuple):
+    car_id: str
+    url: str
+    description: str
+    output_file: Path
+    input_stat: os.stat_result
+    description_hash: str
+
+
+def features_file_for(car_id: str) -> Path:
+    return OUTPUT_DIR / f"features_{car_id}_latest.json"
+
+
+def extracted_description_hash(output_file: Path) -> str:
+    """Hash of the description an existing features file was extracted from"""
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            return description_hash(json.load(f).get('source_description', ''))
+    except (OSError, json.JSONDecodeError):
+        return ""
+
+
+def iter_pending_jobs(json_files: List[Path], manifest: ExtractionManifest, rescan: bool = False) -> Iterator[ExtractionJob]:
+    """Yield extraction jobs for new listings and listings whose description changed"""
+    unchanged = 0
+    for json_file in json_files:
+        # Extract car ID and prepare output filename
+        car_id = extract_car_id(json_file.name)
+        output_file = features_file_for(car_id)
+        
+        # Skip without parsing if the input file wasn't touched since the last run
+        try:
+            stat = json_file.stat()
+        except OSError:
+            continue
+        if not rescan and manifest.is_unchanged(car_id, stat) and output_file.exists():
+            unchanged += 1
+            continue
+        
+        try:
+            car_data = load_car_data(json_file)
+        except Exception:
+            continue
+        
+        # Extract description and URL
+        description = car_data.get('data', {}).get('description', '')
+        url = car_data.get('url', '')
+        
+        if not description:
+            logger.warning(f"No description found for {car_id}")
+            continue
+        
+        current_hash = description_hash(description)
+        if output_file.exists():
+            # Files extracted before the manifest existed are compared with their source description
+            previous_hash = manifest.description_hash(car_id) or extracted_description_hash(output_file)
+            if previous_hash == current_hash:
+                manifest.record(car_id, stat, current_hash)
+                unchanged += 1
+                continue
+            logger.info(f"Description of {car_id} changed - re-extracting")
+        
+        yield ExtractionJob(car_id, url, description, output_file, stat, current_hash)
+    
+    logger.info(f"Skipped {unchanged} unchanged listings")
+
+
+def remove_orphaned_features(json_files: List[Path], manifest: ExtractionManifest) -> int:
+    """Delete features (and manifest entries) of cars whose input file is gone"""
+    if not json_files:
+        # Never wipe all features because of an empty or misconfigured input directory
+        return 0
+    input_ids = {extract_car_id(json_file.name) for json_file in json_files}
+    removed = 0
+    for features_file in OUTPUT_DIR.glob("features_*_latest.json"):
+        car_id = features_file.name[len("features_"):-len("_latest.json")]
+        if car_id not in input_ids:
+            features_file.unlink()
+            removed += 1
+            logger.info(f"Removed orphaned features for {car_id}")
+    for car_id in [car_id for car_id in manifest.entries if car_id not in input_ids]:
+        manifest.remove(car_id)
+    return removed
+
+
+_cache = None
+_manifest = None
+
+
+def get_cache() -> ExtractionCache:
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache(CACHE_DIR, CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def get_manifest() -> ExtractionManifest:
+    global _manifest
+    if _manifest is None:
+        _manifest = ExtractionManifest(MANIFEST_FILE)
+    return _manifest
+
+
+def description_cache_key(description: str, model: str = None, use_rules: bool = None,
+                          rules_version: str = None) -> str:
+    use_rules = USE_RULES if use_rules is None else use_rules
+    prompt = EXTRACTION_PROMPT + (f"\nrules:{rules_version or rules.RULES_VERSION}" if use_rules else "")
+    return cache_key(description, prompt, CamperFeatures.model_json_schema(), model or OPENAI_MODEL)
+
+
+def plan_extraction(description: str, use_rules: bool = None) -> Tuple[Dict[str, bool], Type[BaseModel]]:
+    """Fields decided by the keyword rules and the response model for the remaining ones"""
+    use_rules = USE_RULES if use_rules is None else use_rules
+    decided = rules.decide_fields(description) if use_rules else {}
+    return decided, rules.reduced_model(frozenset(decided))
+
+
+def build_messages(description: str) -> List[Dict]:
+    return [
+        {
+            "role": "user", 
+            "content": EXTRACTION_PROMPT.format(description=description)
+        }
+    ]
+
+
+def build_result(features: CamperFeatures, description: str, car_id: str, url: str) -> ExtractionResult:
+    """Create complete extraction result"""
+    return ExtractionResult(
+        car_id=car_id,
+        url=url,
+        features=features,
+        source_description=description,
+        extraction_timestamp=datetime.now().isoformat(),
+        model_used=OPENAI_MODEL
+    )
+
+
 def extract_features_from_description(description: str, car_id: str, url: str) -> ExtractionResult:
     """Extract camper features from description using OpenAI + Instructor"""
     try:
-        # Extract features using structured output
-        features = client.chat.completions.create(
+        # Unchanged descriptions (also reposts under a new car ID) are served from the cache
+        key = description_cache_key(description)
+        cached = get_cache().get(key)
+        if cached is not None:
+            logger.info(f"Cache hit for {car_id}")
+            return build_result(CamperFeatures.model_validate(cached), description, car_id, url)
+        
+        # Extract the fields the keyword rules couldn't decide using structured output
+        decided, response_model = plan_extraction(description)
+        partial = client.chat.completions.create(
             model=OPENAI_MODEL,
-            response_model=CamperFeatures,
-            messages=[
-                {
-                    "role": "user", 
-                    "content": EXTRACTION_PROMPT.format(description=description)
-                }
-            ],
+            response_model=response_model,
+            messages=build_messages(description),
             temperature=0.1,  # Low temperature for consistent results
         )
+        features = rules.merge_features(partial, decided)
+        get_cache().put(key, features.model_dump())
         
-        # Create complete extraction result
-        result = ExtractionResult(
-            car_id=car_id,
-            url=url,
-            features=features,
-            source_description=description,
-            extraction_timestamp=datetime.now().isoformat(),
-            model_used=OPENAI_MODEL
-        )
-        
-        return result
+        return build_result(features, description, car_id, url)
         
     except Exception as e:
         logger.error(f"Error extracting features for {car_id}: {e}")
         raise
 
 
+async def extract_features_async(description: str, car_id: str, url: str, limiter: RateLimiter) -> ExtractionResult:
+    """Extract camper features with the async client, retrying 429/5xx with jittered backoff"""
+    key = description_cache_key(description)
+    cached = get_cache().get(key)
+    if cached is not None:
+        return build_result(CamperFeatures.model_validate(cached), description, car_id, url)
+    
+    decided, response_model = plan_extraction(description)
+    messages = build_messages(description)
+    estimated_tokens = estimate_tokens(messages[0]["content"])
+    
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.acquire(estimated_tokens)
+        try:
+            partial = await async_client.chat.completions.create(
+                model=OPENAI_MODEL,
+                response_model=response_model,
+                messages=messages,
+                temperature=0.1,  # Low temperature for consistent results
+            )
+            features = rules.merge_features(partial, decided)
+            get_cache().put(key, features.model_dump())
+            return build_result(features, description, car_id, url)
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_retryable(e):
+                logger.error(f"Error extracting features for {car_id}: {e}")
+                raise
+            delay = max(backoff_delay(attempt), retry_after(e))
+            logger.warning(f"Retrying {car_id} in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES}): {e}")
+            await asyncio.sleep(delay)
+
+
 def save_extraction_result(result: ExtractionResult, output_file: Path):
     """Save extraction result to JSON file"""
     try:
@@ -149,8 +350,8 @@ def test_openai_connection():
         raise SystemExit(f"OpenAI API connection error: {e}")
 
 
-def process_all_files():
-    """Process all JSON files in the input directory"""
+def process_all_files(rescan: bool = False):
+    """Process new and changed JSON files in the input directory"""
     # Test OpenAI connection first
     test_openai_connection()
     
@@ -167,47 +368,32 @@ def process_all_files():
     json_files = list(INPUT_DIR.glob("car_data_*_latest.json"))
     logger.info(f"Found {len(json_files)} JSON files to process")
     
+    manifest = get_manifest()
+    remove_orphaned_features(json_files, manifest)
+    
     processed = 0
     errors = 0
     
-    for json_file in json_files:
+    for job in iter_pending_jobs(json_files, manifest, rescan):
         try:
-            logger.info(f"Processing {json_file.name}")
-            
-            # Extract car ID and prepare output filename
-            car_id = extract_car_id(json_file.name)
-            output_file = OUTPUT_DIR / f"features_{car_id}_latest.json"
-            
-            # Skip if already processed
-            if output_file.exists():
-                logger.info(f"Skipping {car_id} - already processed")
-                continue
-            
-            # Load car data
-            car_data = load_car_data(json_file)
-            
-            # Extract description and URL
-            description = car_data.get('data', {}).get('description', '')
-            url = car_data.get('url', '')
-            
-            if not description:
-                logger.warning(f"No description found for {car_id}")
-                continue
+            logger.info(f"Processing {job.car_id}")
             
             # Extract features
-            result = extract_features_from_description(description, car_id, url)
+            result = extract_features_from_description(job.description, job.car_id, job.url)
             
             # Save result
-            save_extraction_result(result, output_file)
+            save_extraction_result(result, job.output_file)
+            manifest.record(job.car_id, job.input_stat, job.description_hash)
             
             processed += 1
-            logger.info(f"Successfully processed {car_id} ({processed}/{len(json_files)})")
+            logger.info(f"Successfully processed {job.car_id} ({processed}/{len(json_files)})")
             
         except Exception as e:
-            logger.error(f"Failed to process {json_file.name}: {e}")
+            logger.error(f"Failed to process {job.car_id}: {e}")
             
             # Check if it's an OpenAI API error and stop processing
             if "openai" in str(e).lower() or "api" in str(e).lower():
+                manifest.save()
                 logger.error("❌ OpenAI API error detected. Stopping processing.")
                 logger.error("Please check your API key, quota, and internet connection")
                 raise SystemExit(f"OpenAI API error: {e}")
@@ -215,17 +401,254 @@ def process_all_files():
             errors += 1
             continue
     
+    manifest.save()
     logger.info(f"Processing complete: {processed} successful, {errors} errors")
+    logger.info(get_cache().summary())
+
+
+async def process_all_files_async(concurrency: int = CONCURRENCY,
+                                  requests_per_minute: float = REQUESTS_PER_MINUTE,
+                                  tokens_per_minute: float = TOKENS_PER_MINUTE,
+                                  rescan: bool = False) -> Dict[str, int]:
+    """Process new and changed JSON files with a bounded pool of concurrent workers"""
+    # Test OpenAI connection first
+    test_openai_connection()
+    
+    # Ensure input directory exists
+    if not INPUT_DIR.exists():
+        logger.error(f"Input directory {INPUT_DIR} does not exist")
+        return {"processed": 0, "errors": 0}
+    
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    
+    json_files = list(INPUT_DIR.glob("car_data_*_latest.json"))
+    manifest = get_manifest()
+    remove_orphaned_features(json_files, manifest)
+    jobs = list(iter_pending_jobs(json_files, manifest, rescan))
+    logger.info(f"Found {len(json_files)} JSON files, {len(jobs)} to extract with concurrency {concurrency}")
+    
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    queue: asyncio.Queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    
+    stats = {"processed": 0, "errors": 0}
+    started = time.monotonic()
+    
+    def report_progress(job: ExtractionJob, status: str):
+        done = stats["processed"] + stats["errors"]
+        elapsed = time.monotonic() - started
+        rate = done / elapsed * 60 if elapsed > 0 else 0.0
+        eta = (len(jobs) - done) / (done / elapsed) if done else 0.0
+        logger.info(f"[{done}/{len(jobs)}] {job.car_id} {status} ({rate:.1f}/min, ETA {eta:.0f}s)")
+    
+    async def worker():
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result = await extract_features_async(job.description, job.car_id, job.url, limiter)
+                await asyncio.to_thread(save_extraction_result, result, job.output_file)
+                manifest.record(job.car_id, job.input_stat, job.description_hash)
+                stats["processed"] += 1
+                report_progress(job, "done")
+            except Exception as e:
+                stats["errors"] += 1
+                report_progress(job, f"failed: {e}")
+    
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    manifest.save()
+    
+    logger.info(f"Processing complete: {stats['processed']} successful, {stats['errors']} errors "
+                f"in {time.monotonic() - started:.1f}s")
+    logger.info(get_cache().summary())
+    return stats
+
+
+def load_batch_states() -> Dict[str, Dict]:
+    """State files of submitted batches that have not been collected yet"""
+    states = {}
+    for state_file in sorted(BATCH_DIR.glob("batch_*.json")):
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        states[state["batch_id"]] = state
+    return states
+
+
+def submit_pending_batches(jobs: List[ExtractionJob]) -> List[Dict]:
+    """Write batch request files for the jobs, submit them and persist their state"""
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    states = []
+    for start in range(0, len(jobs), BATCH_MAX_REQUESTS):
+        chunk = jobs[start:start + BATCH_MAX_REQUESTS]
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        request_file = BATCH_DIR / f"requests_{stamp}_{start // BATCH_MAX_REQUESTS}.jsonl"
+        plans = {job.car_id: plan_extraction(job.description) for job in chunk}
+        batch.write_batch_file(
+            (batch.BatchRequest(job.car_id, build_messages(job.description), plans[job.car_id][1])
+             for job in chunk),
+            request_file, OPENAI_MODEL)
+        batch_id = batch.submit_batch(openai_client, request_file)
+        state = {
+            "batch_id": batch_id,
+            "request_file": str(request_file),
+            "model": OPENAI_MODEL,
+            "use_rules": USE_RULES,
+            "rules_version": rules.RULES_VERSION,
+            "jobs": {
+                job.car_id: {
+                    "url": job.url,
+                    "description": job.description,
+                    "description_hash": job.description_hash,
+                    "mtime_ns": job.input_stat.st_mtime_ns,
+                    "size": job.input_stat.st_size,
+                    # The answers only cover the fields left open by the rules in force now
+                    "decided": plans[job.car_id][0],
+                }
+                for job in chunk
+            },
+        }
+        with open(BATCH_DIR / f"batch_{batch_id}.json", 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        states.append(state)
+    return states
+
+
+def collect_batch(state: Dict, poll_interval: float = BATCH_POLL_INTERVAL) -> Dict[str, int]:
+    """Wait for a submitted batch, then validate and save its results"""
+    manifest = get_manifest()
+    stats = {"processed": 0, "errors": 0}
+    use_rules = state.get("use_rules", False)
+    rules_version = state.get("rules_version")
+    finished = batch.wait_for_batch(openai_client, state["batch_id"], poll_interval)
+    if finished.status != "completed":
+        logger.error(f"Batch {state['batch_id']} ended as {finished.status} - its cars stay pending")
+    
+    jobs = state["jobs"]
+    
+    def validate(car_id: str, content: str) -> CamperFeatures:
+        # Answers only cover the fields the rules left open when the batch was submitted,
+        # even if the rules changed since (state files from before "decided" re-run them)
+        decided = jobs[car_id].get("decided")
+        if decided is None:
+            decided = plan_extraction(jobs[car_id]["description"], use_rules)[0]
+        response_model = rules.reduced_model(frozenset(decided))
+        return rules.merge_features(response_model.model_validate_json(content), decided)
+    
+    for result in batch.download_results(openai_client, finished, validate):
+        job = jobs.get(result.custom_id)
+        if job is None:
+            logger.warning(f"Ignoring result for unknown car {result.custom_id}")
+            continue
+        if result.error:
+            stats["errors"] += 1
+            logger.error(f"Batch extraction failed for {result.custom_id}: {result.error}")
+            continue
+        
+        car_id = result.custom_id
+        extraction = build_result(result.features, job["description"], car_id, job["url"])
+        extraction.model_used = state["model"]
+        save_extraction_result(extraction, features_file_for(car_id))
+        get_cache().put(description_cache_key(job["description"], state["model"], use_rules, rules_version),
+                        result.features.model_dump())
+        
+        # Only trust the manifest if the input wasn't edited while the batch was running
+        input_file = INPUT_DIR / f"car_data_{car_id}_latest.json"
+        try:
+            stat = input_file.stat()
+        except OSError:
+            stat = None
+        if stat and stat.st_mtime_ns == job["mtime_ns"] and stat.st_size == job["size"]:
+            manifest.record(car_id, stat, job["description_hash"])
+        stats["processed"] += 1
+    
+    manifest.save()
+    # Cars without a result are picked up again by the next run
+    (BATCH_DIR / f"batch_{state['batch_id']}.json").unlink(missing_ok=True)
+    Path(state["request_file"]).unlink(missing_ok=True)
+    return stats
+
+
+def process_all_files_batch(wait: bool = True, poll_interval: float = BATCH_POLL_INTERVAL,
+                            rescan: bool = False) -> Dict[str, int]:
+    """Submit all pending listings to the Batch API and fan the results out to features files"""
+    if not OPENAI_API_KEY:
+        raise SystemExit("Missing OPENAI_API_KEY environment variable")
+    if not INPUT_DIR.exists():
+        logger.error(f"Input directory {INPUT_DIR} does not exist")
+        return {"submitted": 0, "cached": 0, "processed": 0, "errors": 0}
+    
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    json_files = list(INPUT_DIR.glob("car_data_*_latest.json"))
+    manifest = get_manifest()
+    remove_orphaned_features(json_files, manifest)
+    
+    # Cars already waiting in a submitted batch are not submitted again
+    outstanding = load_batch_states()
+    in_flight = {car_id for state in outstanding.values() for car_id in state["jobs"]}
+    
+    stats = {"submitted": 0, "cached": 0, "processed": 0, "errors": 0}
+    jobs = []
+    for job in iter_pending_jobs(json_files, manifest, rescan):
+        if job.car_id in in_flight:
+            continue
+        cached = get_cache().get(description_cache_key(job.description))
+        if cached is not None:
+            result = build_result(CamperFeatures.model_validate(cached), job.description, job.car_id, job.url)
+            save_extraction_result(result, job.output_file)
+            manifest.record(job.car_id, job.input_stat, job.description_hash)
+            stats["cached"] += 1
+            continue
+        jobs.append(job)
+    manifest.save()
+    
+    if jobs:
+        for state in submit_pending_batches(jobs):
+            outstanding[state["batch_id"]] = state
+        stats["submitted"] = len(jobs)
+    logger.info(f"{stats['submitted']} cars submitted, {stats['cached']} served from cache, "
+                f"{len(outstanding)} batches outstanding")
+    
+    if wait:
+        for state in outstanding.values():
+            collected = collect_batch(state, poll_interval)
+            stats["processed"] += collected["processed"]
+            stats["errors"] += collected["errors"]
+        logger.info(f"Batch processing complete: {stats['processed']} successful, {stats['errors']} errors")
+    return stats
 
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Extract camper features from listing descriptions")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="extract listings concurrently with rate limiting")
+    parser.add_argument("--batch", action="store_true",
+                        help="submit pending listings to the OpenAI Batch API and wait for the results")
+    parser.add_argument("--no-wait", action="store_true",
+                        help="with --batch: submit and exit, collect the results in a later --batch run")
+    parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL,
+                        help="seconds between batch status checks")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MINUTE, help="requests per minute limit")
+    parser.add_argument("--tpm", type=float, default=TOKENS_PER_MINUTE, help="tokens per minute limit")
+    parser.add_argument("--rescan", action="store_true",
+                        help="re-check every description instead of trusting unchanged file stats")
+    args = parser.parse_args()
+    
     logger.info("Starting camper feature extraction")
     logger.info(f"Input directory: {INPUT_DIR.absolute()}")
     logger.info(f"Output directory: {OUTPUT_DIR.absolute()}")
     logger.info(f"Using OpenAI model: {OPENAI_MODEL}")
     
-    process_all_files()
+    if args.batch:
+        process_all_files_batch(not args.no_wait, args.poll_interval, args.rescan)
+    elif args.use_async:
+        asyncio.run(process_all_files_async(args.concurrency, args.rpm, args.tpm, args.rescan))
+    else:
+        process_all_files(args.rescan)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+"""
+Extraction manifest for incremental runs.
+
+Records, for every car, the size and mtime of its input file and a hash of the
+description its features were extracted from. A run only parses input files
+whose stat changed since the last run and only re-extracts those whose
+description actually changed.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from cache import normalize_description
+
+logger = logging.getLogger(__name__)
+
+
+def description_hash(description: str) -> str:
+    return hashlib.sha256(normalize_description(description).encode("utf-8")).hexdigest()
+
+
+class ExtractionManifest:
+    """car_id -> {"mtime_ns", "size", "description_hash"} persisted as JSON"""
+
+    def __init__(self, path: Path, save_every: int = 50):
+        self.path = Path(path)
+        self.save_every = save_every
+        self._dirty = 0
+        self.entries: Dict[str, Dict] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable manifest {self.path}: {e}")
+
+    def is_unchanged(self, car_id: str, stat: os.stat_result) -> bool:
+        """True if the input file has the same size and mtime as when it was last checked"""
+        entry = self.entries.get(car_id)
+        return entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+
+    def description_hash(self, car_id: str) -> Optional[str]:
+        entry = self.entries.get(car_id)
+        return entry["description_hash"] if entry else None
+
+    def record(self, car_id: str, stat: os.stat_result, description_hash: str):
+        self.entries[car_id] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "description_hash": description_hash,
+        }
+        self._mark_dirty()
+
+    def remove(self, car_id: str):
+        if self.entries.pop(car_id, None) is not None:
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        self._dirty += 1
+        # Save periodically so an interrupted run keeps its progress
+        if self._dirty >= self.save_every:
+            self.save()
+
+    def save(self):
+        if not self._dirty and self.path.exists():
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = 0
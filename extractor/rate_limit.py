@@ -0,0 +1,98 @@
+"""
+Rate limiting and retry helpers for concurrent OpenAI requests.
+
+TokenBucket/RateLimiter keep the extractor under the account's requests per
+minute (RPM) and tokens per minute (TPM) limits; backoff_delay() and
+is_retryable() implement retry with jittered exponential backoff on 429 and
+5xx responses.
+"""
+import asyncio
+import random
+import time
+from typing import Optional
+
+import openai
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """Wait until `amount` tokens are available and take them (waiters are served in order)"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits applied together"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    async def acquire(self, estimated_tokens: int):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+
+
+def estimate_tokens(text: str, completion_tokens: int = 1000) -> int:
+    """Rough token estimate for a request (Polish text averages ~3 characters per token)"""
+    return len(text) // 3 + completion_tokens
+
+
+def _api_error(exc: BaseException) -> Optional[BaseException]:
+    """Find the OpenAI error behind an exception (Instructor wraps them in its own errors)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, (openai.APIStatusError, openai.APIConnectionError)):
+            return exc
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for rate limits, server errors, timeouts and connection errors"""
+    api_error = _api_error(exc)
+    if isinstance(api_error, openai.APIConnectionError):
+        return True
+    if isinstance(api_error, openai.APIStatusError):
+        return api_error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after(exc: BaseException) -> float:
+    """Seconds requested by the server's Retry-After header, 0 if absent"""
+    api_error = _api_error(exc)
+    response = getattr(api_error, "response", None)
+    if response is None:
+        return 0.0
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Full-jitter exponential backoff for the given attempt (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
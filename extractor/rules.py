@@ -0,0 +1,131 @@
+"""
+Rule-based pre-extraction of the keyword-driven CamperFeatures booleans.
+
+Fields like has_webasto or has_air_conditioning come down to whether the
+description mentions a handful of Polish keywords. All rules are compiled into
+a single regex that scans the diacritic-folded description once:
+
+- a plain mention ("webasto", "klimatyzacja") decides the field as True
+- only negated mentions ("brak klimatyzacji", "bez webasto", "webasto: brak")
+  decide it as False
+- no mention and no related hint decides it as False (the prompt's default)
+- anything else (hints like "ogrzewanie", "Truma", "AC", any "okno" or "dach",
+  "możliwość montażu", "klimatyzacja nie działa", mentions continuing a negated
+  list like "brak klimy, webasto, paneli", or mixed positive and negated
+  mentions) is left to the LLM
+
+Only the undecided fields are sent to the model, through a reduced copy of
+CamperFeatures.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, FrozenSet, Type
+
+from pydantic import BaseModel, create_model
+
+from models import CamperFeatures
+
+# Bump when the rules change so cached extractions are recomputed
+RULES_VERSION = "3"
+
+# Patterns are written against lowercase text without Polish diacritics
+RULES = {
+    "has_webasto": {
+        "positive": r"webast\w*|eberspa\w*|autoterm\w*|planar\w*|ogrzewani\w*\s+postojow\w*|"
+                    r"ogrzewani\w*\s+(?:na\s+)?(?:diesel|olej\w*)|piecyk\w*\s+diesel",
+        # Truma and other gas heaters are not a Webasto-style diesel heater, the model tells them apart
+        "hint": r"ogrzewani\w*|grzejni\w*|piecyk\w*|nagrzewnic\w*|truma\w*",
+    },
+    "has_air_conditioning": {
+        "positive": r"klimatyzac\w*|klima\b|klimy\b|klime\b|klimatronik\w*|climatronic\w*|air\s*con\w*",
+        # Also inside run-together words ("osobowyklima")
+        "hint": r"\ba/?c\b|chlodzeni\w*\s+kabin\w*|klim\w*",
+    },
+    "has_solar_panels": {
+        "positive": r"panel\w*\s+(?:\w+\s+)?(?:sloneczn|solarn|fotowoltaiczn|pv)\w*|solar\w*|fotowolt\w*|\bpv\b",
+        "hint": r"panel\w*|ladowani\w*\s+ze\s+slonca|sloneczn\w*",
+    },
+    "has_roof_window": {
+        "positive": r"okn\w*\s+dachow\w*|swietlik\w*|szyberdach\w*|\bheki\b|midi\s*heki|wywietrznik\w*\s+dachow\w*|"
+                    r"maxx\s*fan|fan\s*tastic|okn\w*\s+w\s+dachu",
+        # Any window or roof mention ("okno kamperowe", "otwierany dach", typos) is left to the model
+        "hint": r"wywietrznik\w*|wentylator\w*\s+dachow\w*|\bokn\w*|\bonk\w*|dach\w*",
+    },
+}
+
+# A mention preceded by one of these within the same phrase (no punctuation
+# in between) is negated or uncertain
+NEGATION = re.compile(r"\b(?:brak|bez|nie\s+ma|nie\s+posiada\w*|nie\s+jest\s+wyposazon\w*)(?:[ \t]+\w+){0,2}[ \t]*$")
+UNCERTAIN = re.compile(r"\b(?:mozliwosc\w*|przygotowan\w*|opcjonaln\w*|do\s+montazu|do\s+zamontowania|zamontowac|"
+                       r"nie\s+dziala\w*|uszkodzon\w*|niesprawn\w*)(?:[ \t]+\w+){0,3}[ \t]*$")
+# The same after a mention, up to the end of its phrase: "webasto: brak", "klimatyzacja - nie"
+NEGATION_AFTER = re.compile(r"^[^,;.!?\n]{0,20}?\b(?:brak|nie)\b(?![ \t]+dziala)")
+UNCERTAIN_AFTER = re.compile(r"^[^,;.!?\n]{0,20}?\b(?:niesprawn\w*|uszkodzon\w*|do\s+naprawy|nie\s+dziala\w*)")
+# An item of a list opened by a negation ("brak klimy, webasto, paneli") ...
+NEGATED_LIST = re.compile(r"\b(?:brak|bez)\b[^.;:!?\n]*,[ \t]*$")
+# ... when the list goes on after it (not "bez wypadków, webasto sprawne")
+LIST_CONTINUES = re.compile(r"^[ \t]*(?:,|i\b|ani\b|[.;\n]|$)")
+LOOKBEHIND_CHARS = 60
+LOOKAHEAD_CHARS = 30
+
+MASTER_PATTERN = re.compile("|".join(
+    f"(?P<{kind}__{field}>{rule[kind]})"
+    for field, rule in RULES.items()
+    for kind in ("positive", "hint")
+))
+
+
+def fold_text(text: str) -> str:
+    """Lowercase and strip Polish diacritics (ł has no decomposition)"""
+    text = text.lower().replace("ł", "l")
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def decide_fields(description: str) -> Dict[str, bool]:
+    """Fields that can be decided from keywords alone, with their values"""
+    text = fold_text(description)
+    positive, negated, uncertain, hinted = set(), set(), set(), set()
+
+    for match in MASTER_PATTERN.finditer(text):
+        kind, field = match.lastgroup.split("__", 1)
+        if kind == "hint":
+            hinted.add(field)
+            continue
+        before = text[max(0, match.start() - LOOKBEHIND_CHARS):match.start()]
+        after = text[match.end():match.end() + LOOKAHEAD_CHARS]
+        if (UNCERTAIN.search(before) or UNCERTAIN_AFTER.match(after)
+                or (NEGATED_LIST.search(before) and LIST_CONTINUES.match(after))):
+            uncertain.add(field)
+        elif NEGATION.search(before) or NEGATION_AFTER.match(after):
+            negated.add(field)
+        else:
+            positive.add(field)
+
+    decided = {}
+    for field in RULES:
+        if field in uncertain or (field in positive and field in negated):
+            continue
+        if field in positive:
+            decided[field] = True
+        elif field not in hinted:
+            decided[field] = False
+    return decided
+
+
+@lru_cache(maxsize=None)
+def reduced_model(decided_fields: FrozenSet[str]) -> Type[BaseModel]:
+    """Copy of CamperFeatures without the already decided fields"""
+    if not decided_fields:
+        return CamperFeatures
+    fields = {
+        name: (info.annotation, info)
+        for name, info in CamperFeatures.model_fields.items()
+        if name not in decided_fields
+    }
+    return create_model("CamperFeatures", __doc__=CamperFeatures.__doc__, **fields)
+
+
+def merge_features(partial: BaseModel, decided: Dict[str, bool]) -> CamperFeatures:
+    """Combine the LLM's answer for the ambiguous fields with the rule decisions"""
+    return CamperFeatures(**{**partial.model_dump(), **decided})
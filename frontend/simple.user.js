@@ -916,8 +916,14 @@
         // Wait for articles to load
         await waitForListingPageReady();
         
-        // Fetch known cars from backend
-        const knownCars = await fetchKnownCars();
+        // Look up only the cars visible on this page, fall back to the full known cars list
+        const carIds = findListingArticles().map(function() {
+            return extractCarIdFromArticle(this);
+        }).get().filter(Boolean);
+        let knownCars = await lookupCars(carIds);
+        if (knownCars === null) {
+            knownCars = await fetchKnownCars();
+        }
         
         // Process and highlight cars
         await processListingPage(knownCars);
@@ -946,23 +952,97 @@
         await new Promise(resolve => setTimeout(resolve, 2000));
     }
     
+    // Find listing articles (the ones that contain a <section> tag)
+    function findListingArticles() {
+        return $('article').filter(function() {
+            return $(this).find('section').length > 0;
+        });
+    }
+    
+    // Look up the given car IDs in the backend, returns null if the lookup failed
+    async function lookupCars(carIds) {
+        if (carIds.length === 0) {
+            return [];
+        }
+        try {
+            console.log(`Otomoto: Looking up ${carIds.length} cars in backend...`);
+            const response = await fetch(`${API_BASE_URL}/api/cars/lookup`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ car_ids: carIds })
+            });
+            
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+            
+            const data = await response.json();
+            console.log(`Otomoto: ${data.cars.length} of ${carIds.length} cars are known`);
+            return data.cars;
+            
+        } catch (error) {
+            console.error('Otomoto: Failed to look up cars:', error);
+            return null;
+        }
+    }
+    
+    // Local cache of known cars, refreshed with delta sync (?since=<version>)
+    const KNOWN_CARS_CACHE_KEY = 'otomoto_known_cars_cache';
+    
+    function loadKnownCarsCache() {
+        try {
+            const cached = JSON.parse(localStorage.getItem(KNOWN_CARS_CACHE_KEY));
+            return cached && cached.version !== undefined && cached.cars ? cached : null;
+        } catch (error) {
+            return null;
+        }
+    }
+    
+    function saveKnownCarsCache(cache) {
+        try {
+            localStorage.setItem(KNOWN_CARS_CACHE_KEY, JSON.stringify(cache));
+        } catch (error) {
+            console.warn('Otomoto: Could not store known cars cache:', error);
+        }
+    }
+    
     // Fetch known cars from backend
     async function fetchKnownCars() {
         try {
-            console.log('Otomoto: Fetching known cars from backend...');
-            const response = await fetch(`${API_BASE_URL}/api/known-cars`);
+            const cache = loadKnownCarsCache();
+            const url = cache
+                ? `${API_BASE_URL}/api/known-cars?since=${cache.version}`
+                : `${API_BASE_URL}/api/known-cars`;
+            console.log(`Otomoto: Fetching known cars from backend (${cache ? 'delta since ' + cache.version : 'full'})...`);
+            const response = await fetch(url);
             
             if (!response.ok) {
                 throw new Error(`HTTP ${response.status}: ${response.statusText}`);
             }
             
             const data = await response.json();
-            console.log(`Otomoto: Retrieved ${data.known_cars.length} known cars`);
-            return data.known_cars;
+            console.log(`Otomoto: Retrieved ${data.known_cars.length} changed known cars`);
+            
+            // Apply the delta on top of the cache unless the backend asked for a full resync
+            const carsById = (cache && data.full === false) ? cache.cars : {};
+            (data.deleted || []).forEach(carId => {
+                delete carsById[carId];
+            });
+            data.known_cars.forEach(car => {
+                carsById[car.car_id] = car;
+            });
+            
+            if (data.version !== undefined) {
+                saveKnownCarsCache({ version: data.version, cars: carsById });
+            }
+            return Object.values(carsById);
             
         } catch (error) {
             console.error('Otomoto: Failed to fetch known cars:', error);
-            return [];
+            const cache = loadKnownCarsCache();
+            return cache ? Object.values(cache.cars) : [];
         }
     }
     
@@ -977,11 +1057,8 @@
                 knownCarMap[car.car_id] = car;
             });
             
-            // Find all articles
             // Find all articles that contain a <section> tag
-            const $articles = $('article').filter(function() {
-                return $(this).find('section').length > 0;
-            });
+            const $articles = findListingArticles();
             console.log(`Otomoto: Processing ${$articles.length} articles`);
             
             if ($articles.length === 0) {
@@ -0,0 +1,219 @@
+"""
+Local stand-in for the OpenAI API used by the extractor tests.
+
+Answers chat completions with a fixed CamperFeatures tool call and can be told
+to fail the first N requests with a given status code (e.g. 429) to exercise
+retry handling. BatchOpenAIStub adds a fake of the files and batches endpoints.
+"""
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_FEATURES = {
+    "accessories": ["webasto", "panel słoneczny"],
+    "bed_orientation": "lengthwise",
+    "bed_length": None,
+    "roof_height": "high",
+    "has_solar_panels": True,
+    "front_back_connection": "connected",
+    "kitchen_location": "inside",
+    "has_water_tap_inside": True,
+    "has_roof_window": False,
+    "has_door_window": False,
+    "stealth_level": "unknown",
+    "has_webasto": True,
+    "has_air_conditioning": False,
+    "van_height": "high",
+    "shower_location": "none",
+    "confidence_score": 0.9,
+}
+
+
+def chat_completion(arguments: dict, tool_name: str = "CamperFeatures") -> dict:
+    """Chat completion response body carrying a single tool call"""
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub-model",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "tool_calls",
+            "message": {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": "call_stub",
+                    "type": "function",
+                    "function": {"name": tool_name, "arguments": json.dumps(arguments)},
+                }],
+            },
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+    }
+
+
+class OpenAIStub:
+    """Threaded HTTP server imitating the parts of the OpenAI API the extractor uses"""
+
+    def __init__(self, features: dict = None):
+        self.features = dict(features or DEFAULT_FEATURES)
+        self.requests = []
+        self.fail_next = 0
+        self.fail_status = 429
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle_post(self, path: str, body: dict):
+        """Return (status, response body) for a POST request"""
+        if path.endswith("/chat/completions"):
+            return 200, chat_completion(self.features)
+        return 404, {"error": {"message": f"Unknown path {path}"}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body, content_type: str = "application/json"):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length)
+                content_type = self.headers.get("Content-Type", "")
+                body = json.loads(raw or b"{}") if content_type.startswith("application/json") else raw
+
+                with stub._lock:
+                    stub.requests.append((self.path, body))
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                    failing = stub.fail_next > 0
+                    if failing:
+                        stub.fail_next -= 1
+                try:
+                    if stub.delay:
+                        threading.Event().wait(stub.delay)
+                    if failing:
+                        self._reply(stub.fail_status, {"error": {"message": "stub failure", "type": "rate_limit"}})
+                        return
+                    status, response = stub.handle_post(self.path, body)
+                    self._reply(status, response)
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+            def do_GET(self):
+                status, response = stub.handle_get(self.path)
+                if isinstance(response, bytes):
+                    self._reply(status, response, "application/octet-stream")
+                else:
+                    self._reply(status, response)
+
+        return Handler
+
+    def handle_get(self, path: str):
+        return 404, {"error": {"message": f"Unknown path {path}"}}
+
+
+class BatchOpenAIStub(OpenAIStub):
+    """OpenAIStub that also accepts file uploads and runs batches of chat completions.
+
+    A batch reports "in_progress" for the first `polls_until_complete` retrievals,
+    then completes with an output file answering every request with the stub's
+    features as JSON content (or invalid JSON for custom IDs in `invalid_ids`).
+    """
+
+    def __init__(self, features: dict = None, polls_until_complete: int = 1):
+        super().__init__(features)
+        self.polls_until_complete = polls_until_complete
+        self.invalid_ids = set()
+        self.files = {}
+        self.batches = {}
+        self.batch_requests = []
+        self._ids = itertools.count(1)
+
+    def _file_object(self, file_id: str) -> dict:
+        return {"id": file_id, "object": "file", "bytes": len(self.files[file_id]), "created_at": 0,
+                "filename": f"{file_id}.jsonl", "purpose": "batch", "status": "processed"}
+
+    def _batch_object(self, batch: dict) -> dict:
+        total = len(batch["requests"])
+        done = total if batch["status"] == "completed" else 0
+        return {"id": batch["id"], "object": "batch", "endpoint": "/v1/chat/completions",
+                "completion_window": "24h", "created_at": 0, "input_file_id": batch["input_file_id"],
+                "status": batch["status"], "output_file_id": batch.get("output_file_id"),
+                "error_file_id": None, "request_counts": {"total": total, "completed": done, "failed": 0}}
+
+    def _run_batch(self, batch: dict):
+        lines = []
+        for request in batch["requests"]:
+            custom_id = request["custom_id"]
+            content = "{" if custom_id in self.invalid_ids else json.dumps(self.features)
+            body = chat_completion(self.features)
+            body["choices"][0]["finish_reason"] = "stop"
+            body["choices"][0]["message"] = {"role": "assistant", "content": content}
+            lines.append(json.dumps({"id": f"batch_req_{custom_id}", "custom_id": custom_id,
+                                     "response": {"status_code": 200, "body": body}, "error": None}))
+        output_id = f"file-{next(self._ids)}"
+        self.files[output_id] = ("\n".join(lines) + "\n").encode("utf-8")
+        batch["output_file_id"] = output_id
+        batch["status"] = "completed"
+
+    def handle_post(self, path: str, body):
+        if path.endswith("/files"):
+            # Multipart upload: keep just the JSONL lines of the file part
+            lines = [line for line in body.splitlines() if line.startswith(b"{")]
+            file_id = f"file-{next(self._ids)}"
+            self.files[file_id] = b"\n".join(lines) + b"\n"
+            return 200, self._file_object(file_id)
+        if path.endswith("/batches"):
+            input_file_id = body["input_file_id"]
+            requests = [json.loads(line) for line in self.files[input_file_id].splitlines() if line.strip()]
+            self.batch_requests.extend(requests)
+            batch = {"id": f"batch_{next(self._ids)}", "input_file_id": input_file_id,
+                     "requests": requests, "status": "validating", "polls": 0}
+            self.batches[batch["id"]] = batch
+            return 200, self._batch_object(batch)
+        return super().handle_post(path, body)
+
+    def handle_get(self, path: str):
+        parts = path.strip("/").split("/")
+        if len(parts) == 3 and parts[1] == "batches" and parts[2] in self.batches:
+            batch = self.batches[parts[2]]
+            batch["polls"] += 1
+            if batch["status"] != "completed":
+                if batch["polls"] > self.polls_until_complete:
+                    self._run_batch(batch)
+                else:
+                    batch["status"] = "in_progress"
+            return 200, self._batch_object(batch)
+        if len(parts) == 4 and parts[1] == "files" and parts[3] == "content" and parts[2] in self.files:
+            return 200, self.files[parts[2]]
+        return super().handle_get(path)
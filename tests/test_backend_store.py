@@ -0,0 +1,700 @@
+import importlib
+import json
+import os
+import sys
+import threading
+import pytest
+from pathlib import Path
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from html_store import HtmlSnapshotStore
+from journal import Journal, read_journal
+from storage import JsonFileStorage, SqliteStorage
+from watcher import create_watcher
+
+
+def write_car_file(storage_dir: Path, car_id: str, **data):
+    """Write a car_data_{car_id}_latest.json file the way the backend does"""
+    payload = {
+        "url": f"https://www.otomoto.pl/dostawcze/oferta/test-{car_id}.html",
+        "data": {"car_name": f"Car {car_id}", "price": "10 000", **data},
+    }
+    path = storage_dir / f"car_data_{car_id}_latest.json"
+    path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+class TestBackendStore:
+    @pytest.fixture
+    def backend(self, tmp_path, monkeypatch):
+        """Import the backend app with its storage pointed at a temporary directory"""
+        monkeypatch.chdir(BACKEND_DIR)
+        main = importlib.import_module("main")
+
+        storage_dir = tmp_path / "extracted_data"
+        storage_dir.mkdir()
+        monkeypatch.setattr(main, "STORAGE_DIR", storage_dir)
+        monkeypatch.setattr(main, "STORAGE", JsonFileStorage(storage_dir))
+        monkeypatch.setattr(main, "SNAPSHOT_PATH", str(tmp_path / "index_snapshot.json"))
+        monkeypatch.setattr(main, "HTML_STORE", HtmlSnapshotStore(tmp_path / "html_snapshots"))
+
+        write_car_file(storage_dir, "ID6AAAA1", user_grade=4, user_notes="Nice\nvan")
+        write_car_file(storage_dir, "ID6AAAA2", user_grade="2")
+        main.rebuild_index()
+
+        return main, storage_dir
+
+    def test_records_loaded_once_at_startup(self, backend):
+        """Read endpoints are served from memory after rebuild_index()"""
+        main, storage_dir = backend
+        assert set(main.CAR_RECORDS) == {"ID6AAAA1", "ID6AAAA2"}
+        assert main.CAR_RECORDS["ID6AAAA2"]["user_grade"] == 2
+
+        # Removing the files must not affect reads until the next rebuild
+        for path in storage_dir.iterdir():
+            path.unlink()
+
+        client = TestClient(main.app)
+        data = client.get("/api/known-cars").json()
+        cars = {car["car_id"]: car for car in data["known_cars"]}
+        assert cars["ID6AAAA1"]["user_notes"] == "Nice<br/>van"
+        assert cars["ID6AAAA1"]["has_notes"] is True
+
+        response = client.get("/get-existing-data/ID6AAAA1")
+        assert response.json()["status"] == "found"
+        assert response.json()["user_grade"] == 4
+
+    def test_parallel_rebuild(self, backend, monkeypatch):
+        """Files are parsed on a worker pool in chunks; corrupt files are skipped"""
+        main, storage_dir = backend
+        monkeypatch.setattr("storage.LOAD_CHUNK_SIZE", 8)
+        for i in range(50):
+            write_car_file(storage_dir, f"ID6PAR{i:03d}", user_grade=i % 6)
+        (storage_dir / "car_data_ID6BROKEN_latest.json").write_text("{not json", encoding="utf-8")
+        (storage_dir / "extracted_data_legacy.json").write_text(json.dumps(
+            {"url": "https://www.otomoto.pl/dostawcze/oferta/old-ID6LEGACY.html", "data": {}}), encoding="utf-8")
+
+        monkeypatch.setattr(main, "STORAGE", JsonFileStorage(storage_dir, workers=4))
+        main.rebuild_index()
+
+        assert len(main.CAR_RECORDS) == 52
+        assert main.CAR_RECORDS["ID6PAR007"]["user_grade"] == 1
+        assert "ID6BROKEN" not in main.CAR_INDEX
+        assert main.CAR_INDEX["ID6LEGACY"] == "extracted_data_legacy.json"
+        assert {"parse", "index", "total"} <= set(main.INDEX_TIMINGS)
+
+    def test_restart_from_index_snapshot(self, backend, monkeypatch):
+        """Only files changed since the snapshot are parsed on restart"""
+        main, storage_dir = backend
+        write_car_file(storage_dir, "ID6AAAA1", user_grade=4, user_notes="Nice\nvan", description="Full text")
+        write_car_file(storage_dir, "ID6AAAA3", user_grade=1)
+        main.rebuild_index()
+        assert main.write_index_snapshot() is True
+        assert main.write_index_snapshot() is False  # nothing changed since
+
+        # Edit one car, delete another and add a new one while the backend is down
+        write_car_file(storage_dir, "ID6AAAA2", user_grade=5, user_notes="edited")
+        (storage_dir / "car_data_ID6AAAA3_latest.json").unlink()
+        write_car_file(storage_dir, "ID6AAAA4", user_grade=3)
+
+        parsed = []
+        load_files = main.STORAGE.load_files
+        monkeypatch.setattr(main.STORAGE, "load_files", lambda names: parsed.extend(names) or load_files(names))
+        main.rebuild_index()
+
+        assert sorted(parsed) == ["car_data_ID6AAAA2_latest.json", "car_data_ID6AAAA4_latest.json"]
+        assert set(main.CAR_RECORDS) == {"ID6AAAA1", "ID6AAAA2", "ID6AAAA4"}
+        assert main.CAR_RECORDS["ID6AAAA2"]["user_grade"] == 5
+        assert main.PARTIAL_RECORDS == {"ID6AAAA1"}
+        assert "description" not in main.CAR_RECORDS["ID6AAAA1"]
+
+        client = TestClient(main.app)
+        cars = {car["car_id"]: car for car in client.get("/api/known-cars").json()["known_cars"]}
+        assert cars["ID6AAAA1"]["user_notes"] == "Nice<br/>van"
+        # The detail page loads the full record on demand
+        assert client.get("/car/ID6AAAA1").status_code == 200
+        assert "ID6AAAA1" not in main.PARTIAL_RECORDS
+        assert main.CAR_RECORDS["ID6AAAA1"]["description"] == "Full text"
+
+    def test_file_watcher_applies_external_changes(self, backend):
+        """Files edited, added or deleted by hand reach the index and delta sync"""
+        main, storage_dir = backend
+        client = TestClient(main.app)
+        watcher = create_watcher("poll", storage_dir, main.STORAGE.stat_files, lambda name: True,
+                                 main.reload_car_file, main.forget_car_file)
+        since = client.get("/api/known-cars").json()["version"]
+
+        # A save through the API is not reloaded again
+        client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/test-ID6AAAA1.html",
+            "data": {"car_name": "Car ID6AAAA1", "user_grade": 3},
+        })
+        saved_version = main.CAR_VERSIONS["ID6AAAA1"]
+        watcher.poll()
+        assert main.CAR_VERSIONS["ID6AAAA1"] == saved_version
+
+        path = write_car_file(storage_dir, "ID6AAAA2", user_grade=5, user_notes="edited by hand")
+        os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000))
+        write_car_file(storage_dir, "ID6AAAA5", user_grade=1)
+        (storage_dir / "car_data_ID6AAAA1_latest.json").unlink()
+        watcher.poll()
+
+        assert main.CAR_RECORDS["ID6AAAA2"]["user_notes"] == "edited by hand"
+        assert main.CAR_RECORDS["ID6AAAA5"]["user_grade"] == 1
+        assert "ID6AAAA1" not in main.CAR_INDEX
+
+        delta = client.get(f"/api/known-cars?since={since}").json()
+        assert {car["car_id"] for car in delta["known_cars"]} == {"ID6AAAA2", "ID6AAAA5"}
+        assert delta["deleted"] == ["ID6AAAA1"]
+
+        # A delete event for a file written again since is ignored
+        main.forget_car_file("car_data_ID6AAAA5_latest.json")
+        assert "ID6AAAA5" in main.CAR_RECORDS
+        # Deletes wait for a save in progress on the same car
+        (storage_dir / "car_data_ID6AAAA5_latest.json").unlink()
+        with main.car_lock("ID6AAAA5"):
+            forget = threading.Thread(target=main.forget_car_file, args=("car_data_ID6AAAA5_latest.json",))
+            forget.start()
+            forget.join(0.2)
+            assert forget.is_alive() and "ID6AAAA5" in main.CAR_RECORDS
+        forget.join()
+        assert "ID6AAAA5" not in main.CAR_RECORDS and "ID6AAAA5" not in main.SEARCH.documents
+
+    def test_save_updates_record_in_place(self, backend):
+        """Saving a car updates the resident record without a rescan"""
+        main, storage_dir = backend
+        client = TestClient(main.app)
+
+        response = client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/new-ID6BBBB1.html",
+            "data": {"car_name": "New van", "user_grade": 5},
+        })
+        assert response.status_code == 200
+        assert main.CAR_RECORDS["ID6BBBB1"]["user_grade"] == 5
+        assert (storage_dir / "car_data_ID6BBBB1_latest.json").exists()
+
+        # Empty car_name keeps the existing data and disables the car
+        response = client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/new-ID6BBBB1.html",
+            "data": {"car_name": ""},
+        })
+        assert response.status_code == 200
+        record = main.CAR_RECORDS["ID6BBBB1"]
+        assert record["disabled"] is True
+        assert record["car_name"] == "New van"
+
+        saved = json.loads((storage_dir / "car_data_ID6BBBB1_latest.json").read_text())
+        assert "car_id" not in saved["data"]
+
+    def test_car_detail_not_found(self, backend):
+        """Unknown car IDs return 404"""
+        main, _ = backend
+        client = TestClient(main.app)
+        assert client.get("/car/ID6MISSING").status_code == 404
+        assert client.get("/car/ID6AAAA1").status_code == 200
+
+
+    def test_known_cars_delta_sync(self, backend):
+        """?since=<version> returns only cars changed or deleted after that version"""
+        main, _ = backend
+        client = TestClient(main.app)
+
+        full = client.get("/api/known-cars").json()
+        assert len(full["known_cars"]) == 2
+        version = full["version"]
+
+        delta = client.get(f"/api/known-cars?since={version}").json()
+        assert delta == {"known_cars": [], "deleted": [], "version": version, "full": False}
+
+        saved = client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/test-ID6AAAA2.html",
+            "data": {"car_name": "Updated", "user_grade": 3},
+        }).json()
+        assert saved["version"] > version
+        main.remove_from_index("ID6AAAA1")
+
+        delta = client.get(f"/api/known-cars?since={version}").json()
+        assert [car["car_id"] for car in delta["known_cars"]] == ["ID6AAAA2"]
+        assert delta["known_cars"][0]["user_grade"] == 3
+        assert delta["deleted"] == ["ID6AAAA1"]
+        assert delta["version"] > saved["version"]
+        assert delta["full"] is False
+
+        # Versions from before the last restart can't be replayed
+        stale = client.get("/api/known-cars?since=1").json()
+        assert stale["full"] is True
+        assert [car["car_id"] for car in stale["known_cars"]] == ["ID6AAAA2"]
+
+        # Versions survive a restart
+        main.rebuild_index()
+        assert main.CAR_VERSIONS["ID6AAAA2"] == saved["version"]
+        assert main.STORE_VERSION >= saved["version"]
+
+    def test_etags_and_compression(self, backend):
+        """Read endpoints answer 304 on a matching ETag and compress large bodies"""
+        main, _ = backend
+        client = TestClient(main.app)
+
+        for path in ("/api/known-cars", "/cars", "/car/ID6AAAA1"):
+            response = client.get(path, headers={"Accept-Encoding": "identity"})
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            assert response.headers["cache-control"] == "no-cache"
+
+            response = client.get(path, headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+            assert response.status_code == 304
+            assert response.content == b""
+
+        # Compressed representations carry their own validator
+        response = client.get("/cars", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] in ("gzip", "br")
+        assert "Otomoto Cars Collection" in response.text
+        gzip_etag = response.headers["etag"]
+        assert gzip_etag.endswith('-gzip"')
+        response = client.get("/cars", headers={"If-None-Match": gzip_etag, "Accept-Encoding": "gzip"})
+        assert response.status_code == 304
+        assert response.headers["etag"] == gzip_etag
+
+        # A body under minimum_size is sent as is, and its 304 keeps the unsuffixed validator
+        response = client.get("/api/known-cars", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        small_etag = response.headers["etag"]
+        assert not small_etag.endswith('-gzip"')
+        response = client.get("/api/known-cars", headers={"If-None-Match": small_etag, "Accept-Encoding": "gzip"})
+        assert response.status_code == 304
+        assert response.headers["etag"] == small_etag
+
+        # Any save changes the store-wide and per-car validators
+        old_etag = client.get("/car/ID6AAAA1", headers={"Accept-Encoding": "identity"}).headers["etag"]
+        client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/test-ID6AAAA1.html",
+            "data": {"car_name": "Renamed"},
+        })
+        response = client.get("/car/ID6AAAA1", headers={"If-None-Match": old_etag})
+        assert response.status_code == 200
+        response = client.get("/cars", headers={"If-None-Match": gzip_etag, "Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+
+    def test_compression_passes_through_images_and_streams(self):
+        """Only JSON/HTML bodies of a known length are buffered and compressed"""
+        from compression import CompressionMiddleware
+        from starlette.applications import Starlette
+        from starlette.responses import HTMLResponse, Response, StreamingResponse
+        from starlette.routing import Route
+
+        sent = []
+
+        async def chunks():
+            for i in range(3):
+                sent.append(i)
+                yield b"<p>chunk</p>" * 200
+
+        async def stream(request):
+            return StreamingResponse(chunks(), media_type="text/html")
+
+        async def image(request):
+            return Response(b"\x89PNG" * 1000, media_type="image/png", headers={"ETag": '"img"'})
+
+        async def page(request):
+            return HTMLResponse("<p>page</p>" * 200)
+
+        app = Starlette(routes=[Route("/stream", stream), Route("/image", image), Route("/page", page)])
+        client = TestClient(CompressionMiddleware(app, minimum_size=1024))
+        headers = {"Accept-Encoding": "gzip"}
+
+        response = client.get("/image", headers=headers)
+        assert "content-encoding" not in response.headers and response.headers["etag"] == '"img"'
+        assert response.headers["content-length"] == "4000"
+        response = client.get("/stream", headers=headers)
+        assert "content-encoding" not in response.headers and sent == [0, 1, 2]
+        assert response.text == "<p>chunk</p>" * 600
+        response = client.get("/page", headers=headers)
+        assert response.headers["content-encoding"] == "gzip" and response.text == "<p>page</p>" * 200
+
+    def test_cars_table_pages_sorts_and_filters(self, backend):
+        """/cars renders one page of the precomputed sort order with filters applied"""
+        main, storage_dir = backend
+        for i in range(1, 6):
+            write_car_file(storage_dir, f"ID6SRT{i:03d}", brand="Fiat" if i % 2 else "Ford",
+                           price=f"{i * 10} 000", mileage=f"{(6 - i) * 50} 000 km", year=str(2000 + i))
+        main.rebuild_index()
+        client = TestClient(main.app)
+
+        def car_ids(html):
+            return [car_id for car_id in sorted(main.CAR_RECORDS, key=html.find) if html.find(car_id) >= 0]
+
+        html = client.get("/cars?sort=price&order=desc&page_size=2").text
+        assert car_ids(html) == ["ID6SRT005", "ID6SRT004"]
+        assert "Page 1 of 4" in html
+        html = client.get("/cars?sort=price&order=desc&page_size=2&page=2").text
+        assert car_ids(html) == ["ID6SRT003", "ID6SRT002"]
+
+        # Mileage sorts ascending by default; cars without a value come last
+        html = client.get("/cars?sort=mileage").text
+        assert car_ids(html) == ["ID6SRT005", "ID6SRT004", "ID6SRT003", "ID6SRT002", "ID6SRT001",
+                                 "ID6AAAA1", "ID6AAAA2"]
+
+        html = client.get("/cars?brand=fiat&min_price=20000&max_price=&sort=year").text
+        assert car_ids(html) == ["ID6SRT005", "ID6SRT003"]
+        html = client.get("/cars?min_grade=3").text
+        assert car_ids(html) == ["ID6AAAA1"]
+
+        # Each query has its own validator
+        etag = client.get("/cars?sort=year").headers["etag"]
+        assert client.get("/cars?sort=price", headers={"If-None-Match": etag}).status_code == 200
+        assert client.get("/cars?sort=year", headers={"If-None-Match": etag}).status_code == 304
+
+        # Saves update the sort keys
+        client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/test-ID6SRT001.html",
+            "data": {"car_name": "Cheap", "price": "5 000", "brand": "Fiat"},
+        })
+        html = client.get("/cars?sort=price&brand=Fiat").text
+        assert car_ids(html)[0] == "ID6SRT001"
+
+    def test_numeric_fields_parsed_at_ingest(self, backend):
+        """Saves store integer values next to the display strings; old files are backfilled"""
+        main, storage_dir = backend
+        client = TestClient(main.app)
+        client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/test-ID6NUM001.html",
+            "data": {"car_name": "Van", "price": "39 000", "mileage": "262 000 km",
+                     "cubic_capacity": "2 402 cm3", "year": "2005"},
+        })
+        saved = json.loads((storage_dir / "car_data_ID6NUM001_latest.json").read_text(encoding="utf-8"))
+        assert saved["data"]["price"] == "39 000"
+        assert saved["data"]["numeric"] == {"price": 39000, "mileage": 262000, "cubic_capacity": 2402, "year": 2005}
+
+        # Files written before the numeric fields existed get them at startup and from the backfill
+        assert main.CAR_RECORDS["ID6AAAA1"]["numeric"]["price"] == 10000
+        assert main.STORAGE.backfill_numeric_fields() == 2
+        assert main.STORAGE.backfill_numeric_fields() == 0
+        backfilled = json.loads((storage_dir / "car_data_ID6AAAA2_latest.json").read_text(encoding="utf-8"))
+        assert backfilled["data"]["numeric"] == {"price": 10000, "mileage": None, "cubic_capacity": None, "year": None}
+
+    def test_atomic_writes(self, backend):
+        """A failed write leaves the previous file intact and no temporary file behind"""
+        main, storage_dir = backend
+        path = storage_dir / "car_data_ID6AAAA1_latest.json"
+        before = path.read_bytes()
+        with pytest.raises(TypeError):
+            main.STORAGE.write("ID6AAAA1", {"url": "", "data": {"price": object()}})
+        assert path.read_bytes() == before
+        assert not list(storage_dir.glob(".*.tmp"))
+
+        (storage_dir / ".car_data_ID6AAAA1_latest.json.1.2.tmp").write_text("{", encoding="utf-8")
+        assert main.STORAGE.remove_temp_files() == 1
+
+    def test_journal_group_commit(self, backend, monkeypatch, tmp_path):
+        """Saves waiting on an in-flight fsync are made durable together by the next one"""
+        release = threading.Event()
+        real_fsync = os.fsync
+        fsynced = []
+
+        def slow_fsync(fd):
+            if not fsynced:
+                release.wait(5)
+            fsynced.append(fd)
+            real_fsync(fd)
+
+        monkeypatch.setattr("journal.os.fsync", slow_fsync)
+        journal = Journal(tmp_path / "journal.log")
+        threads = [threading.Thread(target=journal.append, args=({"n": n},)) for n in range(3)]
+        threads[0].start()
+        while journal._appended < 1:
+            pass
+        for thread in threads[1:]:
+            thread.start()
+        while journal._appended < 3:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert journal.fsyncs == 2
+        assert sorted(entry["n"] for entry in read_journal(tmp_path / "journal.log")) == [0, 1, 2]
+
+    def test_journal_replay(self, backend, monkeypatch, tmp_path):
+        """Saves in the journal that never reached their file are replayed at startup"""
+        main, storage_dir = backend
+        journal_path = tmp_path / "saves.journal"
+        monkeypatch.setattr(main, "JOURNAL_PATH", str(journal_path))
+        lost = {"url": "https://www.otomoto.pl/dostawcze/oferta/test-ID6AAAA2.html",
+                "data": {"car_name": "Journaled", "user_grade": 5}, "version": 10 ** 15}
+        journal_path.write_text(json.dumps({"car_id": "ID6AAAA2", "payload": lost}) + "\n{\"car_id\": \"ID6",
+                                encoding="utf-8")
+
+        main.open_journal()
+        try:
+            assert main.STORAGE.read("ID6AAAA2")["data"]["car_name"] == "Journaled"
+            assert journal_path.stat().st_size == 0
+
+            client = TestClient(main.app)
+            client.post("/save-extracted-data", json={
+                "url": "https://www.otomoto.pl/dostawcze/oferta/test-ID6AAAA1.html",
+                "data": {"car_name": "Saved"},
+            })
+            entries = [json.loads(line) for line in journal_path.read_text(encoding="utf-8").splitlines()]
+            assert [entry["car_id"] for entry in entries] == ["ID6AAAA1"]
+            assert main.STORAGE.read("ID6AAAA1")["data"]["car_name"] == "Saved"
+        finally:
+            main.close_journal()
+        assert journal_path.stat().st_size == 0
+
+    def test_save_html_deduplicates(self, backend):
+        """Identical captures of an offer page are stored once"""
+        main, _ = backend
+        client = TestClient(main.app)
+        payload = {"url": "https://www.otomoto.pl/dostawcze/oferta/test-ID6AAAA1.html",
+                   "html_content": "<html>" + "<div>boilerplate</div>" * 500 + "</html>"}
+
+        first = client.post("/save-html", json=payload).json()
+        second = client.post("/save-html", json=payload).json()
+        assert first["car_id"] == "ID6AAAA1"
+        assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+        assert first["hash"] == second["hash"]
+        assert first["stored_bytes"] < len(payload["html_content"]) / 10
+        assert main.HTML_STORE.read(first["hash"]) == payload["html_content"]
+        assert len(main.HTML_STORE.captures("ID6AAAA1")) == 1
+
+    def test_cars_lookup(self, backend):
+        """POST /api/cars/lookup returns only the requested known cars"""
+        main, _ = backend
+        client = TestClient(main.app)
+
+        response = client.post("/api/cars/lookup", json={"car_ids": ["ID6AAAA1", "ID6UNKNOWN", "ID6AAAA1"]})
+        assert response.status_code == 200
+        assert response.json() == {"cars": [{
+            "car_id": "ID6AAAA1",
+            "user_grade": 4,
+            "has_notes": True,
+            "user_notes": "Nice<br/>van",
+            "disabled": False,
+        }]}
+
+        response = client.post("/api/cars/lookup", json={"car_ids": [f"ID{i}" for i in range(501)]})
+        assert response.status_code == 422
+
+    def test_vin_index_and_relists(self, backend):
+        """Cars sharing a normalized VIN or plate are linked; placeholders are ignored"""
+        main, _ = backend
+        client = TestClient(main.app)
+
+        def save(car_id, **data):
+            return client.post("/save-extracted-data", json={
+                "url": f"https://www.otomoto.pl/dostawcze/oferta/van-{car_id}.html",
+                "data": {"car_name": f"Van {car_id}", "price": "50 000", **data}})
+
+        save("ID6OLD", vin="WF0XXXTTFXDG30573", registration_number="DW 1234A")
+        save("ID6NEW", vin="wf0x-xxtt-fxdg-30573")
+        save("ID6PLATE", vin="", registration_number="dw1234a")
+        save("ID6MASK1", vin="XXXXXXXXXXXXXXXXX", registration_number="XXXXXXX")
+        save("ID6MASK2", vin="XXXXXXXXXXXXXXXXX")
+
+        response = client.get("/api/cars/by-vin/wf0xxxttfxdg30573").json()
+        assert response["vin"] == "WF0XXXTTFXDG30573"
+        assert [car["car_id"] for car in response["cars"]] == ["ID6OLD", "ID6NEW"]
+        assert client.get("/api/cars/by-vin/XXXXXXXXXXXXXXXXX").status_code == 400
+        assert client.get("/api/cars/by-vin/1GNEK13ZX3R298984").json()["cars"] == []
+
+        assert main.IDENTIFIERS.other_listings("ID6OLD") == ["ID6NEW", "ID6PLATE"]
+        assert main.IDENTIFIERS.other_listings("ID6MASK1") == []
+        table = client.get("/cars").text
+        assert table.count('class="relisted-badge"') == 3
+        detail = client.get("/car/ID6PLATE").text
+        assert "Listing History (1 other listing)" in detail and "Same registration" in detail
+
+        # A corrected VIN drops the link
+        save("ID6NEW", vin="WF0XXXTTFXDG99999")
+        assert [car["car_id"] for car in client.get("/api/cars/by-vin/WF0XXXTTFXDG30573").json()["cars"]] == ["ID6OLD"]
+
+    def test_identifier_placeholders(self):
+        """Masked, dummy and mistyped identifiers from real listings are not indexed"""
+        from identifiers import normalize_plate, normalize_vin
+
+        for vin in ["WDBXXXXXXXXXXXXXX", "VF3XXXXXXXXXXXXXX", "WDB906XXXXXXXXXXX", "12345678987655659",
+                    "RENAULT1234567891", "WDB12345HKJMN7864", "WV1ZZZ7HZ7H777777",
+                    # Wrong check digits (North America, China)
+                    "1HGCM82634A004352", "LSGKB54H0HV123403"]:
+            assert normalize_vin(vin) is None, vin
+        # Ford and VW filler and valid check digits are kept
+        for vin in ["WF0XXXTTFX9A46870", "WF0WXXTACWHD54870", "WV1ZZZ2EZ86043433", "1HGCM82633A004352",
+                    "LSGKB54H6HV123403", "ZFA24400007808080"]:
+            assert normalize_vin(vin) == vin
+        for plate in ["WX XXX", "DOL12345", "WS12345", "XXX"]:
+            assert normalize_plate(plate) is None, plate
+        assert normalize_plate("po 7wx64") == "PO7WX64"
+
+    def test_full_text_search(self, backend, monkeypatch, tmp_path):
+        """/api/search ranks cars by name, description, notes and accessories, folding Polish words"""
+        main, _ = backend
+        features_dir = tmp_path / "parsed_data"
+        features_dir.mkdir()
+        monkeypatch.setattr(main, "FEATURES_DIR", features_dir)
+        (features_dir / "features_ID6AAAA1_latest.json").write_text(json.dumps({
+            "car_id": "ID6AAAA1", "features": {"accessories": ["lodówka na 12V", "ogrzewanie Webasto"]}}),
+            encoding="utf-8")
+        client = TestClient(main.app)
+        client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/van-ID6SRCH1.html",
+            "data": {"car_name": "Ford Transit", "description": "Kamper z markizą i lodówką <tanio>."}})
+        main.rebuild_feature_index()
+        main.rebuild_search_index()
+
+        response = client.get("/api/search", params={"q": "Lodowki"}).json()
+        assert response["complete"] is True
+        assert [car["car_id"] for car in response["results"]] == ["ID6AAAA1", "ID6SRCH1"]
+        found = {car["car_id"]: car for car in response["results"]}
+        assert found["ID6AAAA1"]["highlights"] == {"accessories": "<mark>lodówka</mark> na 12V\nogrzewanie Webasto"}
+        assert found["ID6SRCH1"]["highlights"]["description"] == "Kamper z markizą i <mark>lodówką</mark> &lt;tanio&gt;."
+
+        # Notes are searchable, and a name match outranks the description
+        assert [car["car_id"] for car in client.get("/api/search?q=nice").json()["results"]] == ["ID6AAAA1"]
+        client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/van-ID6SRCH2.html",
+            "data": {"car_name": "Kamper z markizą", "description": "Zadbany."}})
+        ranked = [car["car_id"] for car in client.get("/api/search?q=markiza").json()["results"]]
+        assert ranked == ["ID6SRCH2", "ID6SRCH1"]
+
+        # New extractions and deleted cars are reflected without a rebuild
+        (features_dir / "features_ID6SRCH2_latest.json").write_text(json.dumps({
+            "car_id": "ID6SRCH2", "features": {"accessories": ["panele solarne"]}}), encoding="utf-8")
+        main.reload_features_file("features_ID6SRCH2_latest.json")
+        assert client.get("/api/search?q=solarny+panel").json()["total"] == 1
+        main.remove_from_index("ID6SRCH2")
+        assert client.get("/api/search?q=solarny").json()["total"] == 0
+        assert client.get("/api/search?q=i+w+z").json()["results"] == []
+
+
+    def test_feature_facets(self, backend, monkeypatch, tmp_path):
+        """/cars and /api/facets filter by CamperFeatures combinations with facet counts"""
+        main, storage_dir = backend
+        features_dir = tmp_path / "parsed_data"
+        features_dir.mkdir()
+        monkeypatch.setattr(main, "FEATURES_DIR", features_dir)
+
+        def write_features(car_id, **features):
+            (features_dir / f"features_{car_id}_latest.json").write_text(
+                json.dumps({"car_id": car_id, "features": features}), encoding="utf-8")
+
+        write_car_file(storage_dir, "ID6FACE3", car_name="Camper three")
+        main.rebuild_index()
+        write_features("ID6AAAA1", has_webasto=True, has_solar_panels=True, bed_orientation="lengthwise",
+                       kitchen_location="inside")
+        write_features("ID6AAAA2", has_webasto=True, has_solar_panels=False, bed_orientation="widthwise",
+                       kitchen_location="inside")
+        write_features("ID6FACE3", has_webasto=False, has_solar_panels=True, bed_orientation="lengthwise",
+                       kitchen_location="outside")
+        # Features of cars the backend doesn't know are not counted
+        write_features("ID6GONE", has_webasto=True)
+        main.rebuild_feature_index()
+        client = TestClient(main.app)
+
+        response = client.get("/api/facets", params={"has_webasto": "true", "bed_orientation": "lengthwise"}).json()
+        assert (response["total"], response["car_ids"]) == (1, ["ID6AAAA1"])
+        # Counts of a field ignore its own filter
+        assert response["facets"]["has_webasto"] == {"false": 1, "true": 1}
+        assert response["facets"]["bed_orientation"] == {"lengthwise": 1, "widthwise": 1}
+        assert response["facets"]["kitchen_location"] == {"inside": 1, "outside": 0}
+
+        response = client.get("/api/facets?kitchen_location=inside,outside&has_solar_panels=true").json()
+        assert sorted(response["car_ids"]) == ["ID6AAAA1", "ID6FACE3"]
+        assert client.get("/api/facets").json()["total"] == 3
+
+        page = client.get("/cars?has_solar_panels=true&kitchen_location=outside")
+        assert 'data-car-id="ID6FACE3"' in page.text and 'data-car-id="ID6AAAA1"' not in page.text
+        assert '<option value="true" selected>Yes (1)' in page.text
+
+        # A new extraction changes the filters (and the page ETag) without a save
+        etag = client.get("/cars?has_webasto=false").headers["etag"]
+        write_features("ID6AAAA2", has_webasto=False, kitchen_location="none")
+        main.reload_features_file("features_ID6AAAA2_latest.json")
+        response = client.get("/cars?has_webasto=false", headers={"If-None-Match": etag})
+        assert response.status_code == 200 and 'data-car-id="ID6AAAA2"' in response.text
+        main.remove_from_index("ID6FACE3")
+        assert client.get("/api/facets?has_webasto=false").json()["car_ids"] == ["ID6AAAA2"]
+
+
+class TestSqliteStorage:
+    @pytest.fixture
+    def backend(self, tmp_path, monkeypatch):
+        """Import the backend app with SQLite storage imported from a JSON directory"""
+        monkeypatch.chdir(BACKEND_DIR)
+        main = importlib.import_module("main")
+
+        storage_dir = tmp_path / "extracted_data"
+        storage_dir.mkdir()
+        write_car_file(storage_dir, "ID6CCCC1", user_grade=3, price="39 000", year="2005")
+        write_car_file(storage_dir, "ID6CCCC2", user_grade=5, price="120 500", year="2012")
+        write_car_file(storage_dir, "ID6CCCC3", price="", year="2010")
+
+        storage = SqliteStorage(tmp_path / "cars.db")
+        imported = storage.import_directories(storage_dir, BACKEND_DIR / "parsed_data")
+        assert imported["cars"] == 3
+        assert imported["features"] > 0
+
+        monkeypatch.setattr(main, "STORAGE", storage)
+        main.rebuild_index()
+        return main, storage
+
+    def test_wal_mode_and_indexes(self, backend):
+        """The database runs in WAL mode with indexes on the query columns"""
+        _, storage = backend
+        conn = storage.connection()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(cars)")}
+        for column in ("user_grade", "price", "year", "disabled"):
+            assert f"idx_cars_{column}" in indexes
+
+    def test_index_backed_queries(self, backend):
+        """Sorting, filtering and counting happen in SQL"""
+        _, storage = backend
+        assert storage.query_car_ids() == ["ID6CCCC2", "ID6CCCC1", "ID6CCCC3"]
+        assert storage.query_car_ids(order_by="price", descending=False) == ["ID6CCCC1", "ID6CCCC2", "ID6CCCC3"]
+        assert storage.query_car_ids(order_by="year", limit=1, offset=1) == ["ID6CCCC3"]
+        assert storage.count_cars(min_grade=3) == 2
+        assert storage.rating_stats() == {"rated_cars_count": 2, "average_rating": 4.0}
+        with pytest.raises(ValueError):
+            storage.query_car_ids(order_by="price; DROP TABLE cars")
+
+    def test_cars_table_filters_in_sql(self, backend):
+        """/cars pages, sorts and filters through the indexed columns"""
+        main, storage = backend
+        assert storage.query_car_ids(min_price=40_000, max_price=200_000) == ["ID6CCCC2"]
+        client = TestClient(main.app)
+
+        html = client.get("/cars?sort=year&page_size=1&page=2").text
+        assert "ID6CCCC3" in html and "ID6CCCC2" not in html
+        assert "Page 2 of 3" in html
+        html = client.get("/cars?sort=price&max_price=50000").text
+        assert "ID6CCCC1" in html and "ID6CCCC2" not in html
+
+    def test_numeric_backfill(self, backend):
+        """The backfill adds data["numeric"] to imported rows and fills the cubic_capacity column"""
+        _, storage = backend
+        storage.connection().execute("UPDATE cars SET cubic_capacity = NULL")
+        storage.connection().execute(
+            "UPDATE cars SET data = json_set(data, '$.cubic_capacity', '2 198 cm3') WHERE car_id = 'ID6CCCC1'")
+        assert storage.backfill_numeric_fields() == 3
+        assert storage.read("ID6CCCC1")["data"]["numeric"] == {
+            "price": 39000, "mileage": None, "cubic_capacity": 2198, "year": 2005}
+        assert storage.query_car_ids(order_by="cubic_capacity", limit=1) == ["ID6CCCC1"]
+
+    def test_save_and_read_through_sqlite(self, backend):
+        """Saves go to the database and show up in the /cars table"""
+        main, storage = backend
+        client = TestClient(main.app)
+
+        response = client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/new-ID6CCCC4.html",
+            "data": {"car_name": "Top van", "price": "50 000", "user_grade": 5},
+        })
+        assert response.status_code == 200
+        assert storage.read("ID6CCCC4")["data"]["car_name"] == "Top van"
+        assert storage.query_car_ids(order_by="price")[0] == "ID6CCCC2"
+
+        html = client.get("/cars").text
+        assert html.index("ID6CCCC4") < html.index("ID6CCCC1")
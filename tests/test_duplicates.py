@@ -0,0 +1,63 @@
+import random
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from duplicates import DuplicateIndex, MultiIndexHash
+from image_store import ImageStore
+
+
+def flip(value: int, bits: list) -> int:
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+class TestDuplicates:
+    def test_multi_index_matches_brute_force(self):
+        rng = random.Random(7)
+        index = MultiIndexHash(max_distance=6)
+        values = [rng.getrandbits(64) for _ in range(3000)]
+        # Near copies at every distance up to one past the limit
+        values += [flip(values[i], rng.sample(range(64), i % 8)) for i in range(200)]
+        for value in values:
+            index.add(value)
+        assert len(index) == len(set(values))
+
+        for query in values[:50] + [flip(values[i], rng.sample(range(64), 5)) for i in range(50)]:
+            expected = sorted(((query ^ value).bit_count(), value) for value in set(values)
+                              if (query ^ value).bit_count() <= 6)
+            assert index.search(query) == expected
+
+    def test_cars_sharing_photos_are_linked(self, tmp_path):
+        """Re-encoded photos (a few bits apart) link the cars showing them"""
+        index = DuplicateIndex(ImageStore(tmp_path / "images"), max_distance=6, min_matches=2)
+        rng = random.Random(3)
+        photos = {f"{i:064x}": rng.getrandbits(64) | 0xFF for i in range(6)}
+        # The repost shows re-encoded copies of the first car's photos 0 and 1
+        photos["a" * 64] = flip(photos[f"{0:064x}"], [60, 40, 20])
+        photos["b" * 64] = flip(photos[f"{1:064x}"], [50])
+        index.fingerprints.update(photos)
+
+        for i in range(3):
+            index.add("ID6FIRST", f"{i:064x}")
+        for image_hash in ["a" * 64, "b" * 64, f"{5:064x}"]:
+            index.add("ID6REPOST", image_hash)
+        index.add("ID6OTHER", f"{3:064x}")
+        index.add("ID6OTHER", f"{4:064x}")
+        # Sharing a single photo is not enough
+        index.add("ID6ONE", "a" * 64)
+        index.add("ID6ONE", f"{4:064x}")
+
+        assert index.duplicates("ID6REPOST") == {"ID6FIRST": 2}
+        assert index.duplicates("ID6FIRST") == {"ID6REPOST": 2}
+        assert index.duplicates("ID6OTHER") == {}
+        # With fewer hashed photos than min_matches, one shared photo proves nothing
+        index.add("ID6MAIN", f"{0:064x}")
+        assert index.duplicates("ID6MAIN") is None
+        assert "ID6MAIN" not in index.duplicates("ID6FIRST")
+
+        index.remove_car("ID6FIRST")
+        assert index.duplicates("ID6REPOST") == {}
@@ -0,0 +1,80 @@
+import csv
+import importlib
+import json
+import sys
+import pytest
+from pathlib import Path
+
+pytest.importorskip("pydantic")
+
+EXTRACTOR_DIR = Path(__file__).parent.parent / "extractor"
+sys.path.insert(0, str(EXTRACTOR_DIR))
+
+from openai_stub import DEFAULT_FEATURES
+
+
+def write_json(path: Path, payload: dict):
+    path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+
+
+class TestExport:
+    @pytest.fixture
+    def exporter(self, tmp_path, monkeypatch):
+        export_csv = importlib.import_module("export_csv")
+        parsed_dir = tmp_path / "parsed_data"
+        original_dir = tmp_path / "extracted_data"
+        parsed_dir.mkdir()
+        original_dir.mkdir()
+        monkeypatch.setattr(export_csv, "INPUT_DIR", parsed_dir)
+        monkeypatch.setattr(export_csv, "ORIGINAL_DIR", original_dir)
+        monkeypatch.setattr(export_csv, "OUTPUT_FILE", tmp_path / "camper_features.csv")
+
+        for car_id, grade, features in [
+            ("ID6EXP1", 4, DEFAULT_FEATURES),
+            ("ID6EXP2", "2", dict(DEFAULT_FEATURES, has_webasto=False, stealth_level="low", bed_length="190cm")),
+            ("ID6EXP3", None, dict(DEFAULT_FEATURES, roof_height="unknown")),
+        ]:
+            url = f"https://www.otomoto.pl/dostawcze/oferta/test-{car_id}.html"
+            write_json(parsed_dir / f"features_{car_id}_latest.json",
+                       {"car_id": car_id, "url": url, "features": features})
+            if grade is not None:
+                write_json(original_dir / f"car_data_{car_id}_latest.json",
+                           {"url": url, "data": {"user_grade": grade}})
+        return export_csv, tmp_path
+
+    def test_csv_export(self, exporter, monkeypatch):
+        """Each file is read once and grades are joined on car_id"""
+        export_csv, tmp_path = exporter
+        loads = []
+        load_json_file = export_csv.load_json_file
+        monkeypatch.setattr(export_csv, "load_json_file", lambda path: loads.append(path) or load_json_file(path))
+
+        assert export_csv.export_to_csv() == 3
+        assert len(loads) == 5
+
+        with open(tmp_path / "camper_features.csv", newline="", encoding="utf-8") as f:
+            rows = {row["url"].rsplit("-", 1)[1][:-5]: row for row in csv.DictReader(f)}
+        assert list(rows["ID6EXP1"]) == export_csv.CSV_COLUMNS
+        assert rows["ID6EXP1"]["user_grade"] == "4"
+        assert rows["ID6EXP1"]["has_webasto"] == "true"
+        assert rows["ID6EXP2"]["user_grade"] == "2"
+        assert rows["ID6EXP2"]["has_webasto"] == ""
+        assert rows["ID6EXP2"]["bed_length"] == "190cm"
+        assert rows["ID6EXP3"]["user_grade"] == ""
+        assert rows["ID6EXP3"]["roof_height"] == ""
+        assert rows["ID6EXP3"]["confidence_score"] == "0.9"
+
+    def test_typed_parquet_export(self, exporter):
+        pyarrow = pytest.importorskip("pyarrow")
+        import pyarrow.parquet
+        export_csv, tmp_path = exporter
+
+        export_csv.export_to_csv(parquet_file=tmp_path / "features.parquet", arrow_file=tmp_path / "features.arrow")
+
+        table = pyarrow.parquet.read_table(tmp_path / "features.parquet")
+        assert table.schema.field("has_webasto").type == pyarrow.bool_()
+        assert pyarrow.types.is_dictionary(table.schema.field("stealth_level").type)
+        assert table.schema.field("confidence_score").type == pyarrow.float32()
+        grades = dict(zip(table.column("car_id").to_pylist(), table.column("user_grade").to_pylist()))
+        assert grades == {"ID6EXP1": 4, "ID6EXP2": 2, "ID6EXP3": None}
+        assert (tmp_path / "features.arrow").exists()
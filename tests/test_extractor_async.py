@@ -0,0 +1,106 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+import time
+import pytest
+from pathlib import Path
+
+pytest.importorskip("instructor")
+import instructor
+from openai import AsyncOpenAI, OpenAI
+
+from openai_stub import OpenAIStub
+
+EXTRACTOR_DIR = Path(__file__).parent.parent / "extractor"
+sys.path.insert(0, str(EXTRACTOR_DIR))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import rate_limit
+from cache import ExtractionCache
+from manifest import ExtractionManifest
+
+
+def write_car_file(input_dir: Path, car_id: str, description: str):
+    payload = {
+        "url": f"https://www.otomoto.pl/dostawcze/oferta/test-{car_id}.html",
+        "data": {"car_name": f"Car {car_id}", "description": description},
+    }
+    (input_dir / f"car_data_{car_id}_latest.json").write_text(json.dumps(payload), encoding="utf-8")
+
+
+class TestAsyncExtraction:
+    @pytest.fixture
+    def stub(self):
+        with OpenAIStub() as stub:
+            yield stub
+
+    @pytest.fixture
+    def extractor(self, stub, tmp_path, monkeypatch):
+        """extract_features with its clients pointed at the local stub"""
+        extract_features = importlib.import_module("extract_features")
+        monkeypatch.setattr(extract_features, "client", instructor.from_openai(
+            OpenAI(api_key="test-key", base_url=stub.base_url, max_retries=0)))
+        monkeypatch.setattr(extract_features, "async_client", instructor.from_openai(
+            AsyncOpenAI(api_key="test-key", base_url=stub.base_url, max_retries=0)))
+
+        input_dir = tmp_path / "extracted_data"
+        output_dir = tmp_path / "parsed_data"
+        input_dir.mkdir()
+        monkeypatch.setattr(extract_features, "INPUT_DIR", input_dir)
+        monkeypatch.setattr(extract_features, "OUTPUT_DIR", output_dir)
+        monkeypatch.setattr(extract_features, "backoff_delay", lambda attempt, base=1.0, cap=60.0: 0.01)
+        monkeypatch.setattr(extract_features, "_cache", ExtractionCache(tmp_path / "cache"))
+        monkeypatch.setattr(extract_features, "_manifest", ExtractionManifest(tmp_path / "manifest.json"))
+        return extract_features, input_dir, output_dir
+
+    async def test_concurrent_extraction(self, stub, extractor):
+        """All pending listings are extracted with bounded concurrency"""
+        extract_features, input_dir, output_dir = extractor
+        for i in range(12):
+            write_car_file(input_dir, f"ID6ASYNC{i}", f"Kamper z webasto nr {i}")
+        write_car_file(input_dir, "ID6EMPTY", "")
+        stub.delay = 0.05
+
+        stats = await extract_features.process_all_files_async(concurrency=4, requests_per_minute=6000,
+                                                               tokens_per_minute=10_000_000)
+
+        assert stats == {"processed": 12, "errors": 0}
+        assert 1 < stub.max_active <= 4
+        result = json.loads((output_dir / "features_ID6ASYNC3_latest.json").read_text())
+        assert result["features"]["has_webasto"] is True
+        assert result["source_description"] == "Kamper z webasto nr 3"
+        assert not (output_dir / "features_ID6EMPTY_latest.json").exists()
+
+    async def test_retries_rate_limited_requests(self, stub, extractor):
+        """429 and 5xx responses are retried with backoff, other errors are not"""
+        extract_features, _, _ = extractor
+        limiter = rate_limit.RateLimiter(6000, 10_000_000)
+
+        stub.fail_next, stub.fail_status = 2, 429
+        result = await extract_features.extract_features_async("opis 1", "ID6RETRY", "url", limiter)
+        assert result.features.roof_height == "high"
+        assert len(stub.requests) == 3
+
+        stub.fail_next, stub.fail_status = 1, 503
+        await extract_features.extract_features_async("opis 2", "ID6RETRY", "url", limiter)
+        assert len(stub.requests) == 5
+
+        stub.fail_next, stub.fail_status = 1, 400
+        with pytest.raises(Exception):
+            await extract_features.extract_features_async("opis 3", "ID6RETRY", "url", limiter)
+        assert len(stub.requests) == 6
+
+
+class TestTokenBucket:
+    async def test_bucket_limits_rate(self):
+        """Once the burst capacity is spent, acquisitions wait for the refill"""
+        bucket = rate_limit.TokenBucket(rate_per_minute=600, capacity=5)  # 10 tokens per second
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(8)))
+        assert time.monotonic() - started >= 0.25
+
+    def test_retryable_errors(self):
+        assert rate_limit.is_retryable(ValueError("boom")) is False
+        assert 0 <= rate_limit.backoff_delay(3, base=1.0, cap=4.0) <= 4.0
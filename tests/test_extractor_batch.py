@@ -0,0 +1,122 @@
+import importlib
+import json
+import os
+import sys
+import pytest
+from pathlib import Path
+
+pytest.importorskip("instructor")
+import instructor
+from openai import OpenAI
+
+from openai_stub import BatchOpenAIStub
+
+EXTRACTOR_DIR = Path(__file__).parent.parent / "extractor"
+sys.path.insert(0, str(EXTRACTOR_DIR))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from cache import ExtractionCache
+from manifest import ExtractionManifest
+
+
+def write_car_file(input_dir: Path, car_id: str, description: str):
+    payload = {
+        "url": f"https://www.otomoto.pl/dostawcze/oferta/test-{car_id}.html",
+        "data": {"car_name": f"Car {car_id}", "description": description},
+    }
+    (input_dir / f"car_data_{car_id}_latest.json").write_text(json.dumps(payload), encoding="utf-8")
+
+
+class TestBatchExtraction:
+    @pytest.fixture
+    def stub(self):
+        with BatchOpenAIStub(polls_until_complete=2) as stub:
+            yield stub
+
+    @pytest.fixture
+    def extractor(self, stub, tmp_path, monkeypatch):
+        """extract_features with the Batch API pointed at the local fake"""
+        extract_features = importlib.import_module("extract_features")
+        raw_client = OpenAI(api_key="test-key", base_url=stub.base_url, max_retries=0)
+        monkeypatch.setattr(extract_features, "openai_client", raw_client)
+        monkeypatch.setattr(extract_features, "client", instructor.from_openai(raw_client))
+
+        input_dir = tmp_path / "extracted_data"
+        output_dir = tmp_path / "parsed_data"
+        input_dir.mkdir()
+        monkeypatch.setattr(extract_features, "INPUT_DIR", input_dir)
+        monkeypatch.setattr(extract_features, "OUTPUT_DIR", output_dir)
+        monkeypatch.setattr(extract_features, "BATCH_DIR", tmp_path / "batches")
+        monkeypatch.setattr(extract_features, "_cache", ExtractionCache(tmp_path / "cache"))
+        monkeypatch.setattr(extract_features, "_manifest", ExtractionManifest(tmp_path / "manifest.json"))
+        return extract_features, input_dir, output_dir
+
+    def test_batch_round_trip(self, stub, extractor, tmp_path):
+        """Pending cars go out in one batch file and come back as validated features files"""
+        extract_features, input_dir, output_dir = extractor
+        for i in range(5):
+            write_car_file(input_dir, f"ID6BATCH{i}", f"Kamper z webasto nr {i}")
+        stub.invalid_ids = {"ID6BATCH4"}
+
+        stats = extract_features.process_all_files_batch(poll_interval=0.01)
+
+        assert stats == {"submitted": 5, "cached": 0, "processed": 4, "errors": 1}
+        assert len(stub.batches) == 1
+        request = stub.batch_requests[0]
+        assert request["url"] == "/v1/chat/completions"
+        assert request["body"]["response_format"]["json_schema"]["name"] == "CamperFeatures"
+        assert not any(path.endswith("/chat/completions") for path, _ in stub.requests)
+
+        result = json.loads((output_dir / "features_ID6BATCH2_latest.json").read_text())
+        assert result["features"]["has_webasto"] is True
+        assert result["source_description"] == "Kamper z webasto nr 2"
+        assert not (output_dir / "features_ID6BATCH4_latest.json").exists()
+        assert not list((tmp_path / "batches").iterdir())
+
+        # Only the invalid car is submitted again; the rest are up to date
+        stats = extract_features.process_all_files_batch(poll_interval=0.01)
+        assert stats["submitted"] == 1
+        assert [r["custom_id"] for r in stub.batch_requests[5:]] == ["ID6BATCH4"]
+
+    def test_submit_without_waiting(self, stub, extractor):
+        """Outstanding batches are collected by a later run instead of being resubmitted"""
+        extract_features, input_dir, output_dir = extractor
+        write_car_file(input_dir, "ID6LATER1", "Kamper z klimatyzacją")
+
+        stats = extract_features.process_all_files_batch(wait=False)
+        assert stats["submitted"] == 1
+        assert not output_dir.joinpath("features_ID6LATER1_latest.json").exists()
+
+        # A duplicate description is served from the cache once the batch is collected
+        stats = extract_features.process_all_files_batch(poll_interval=0.01)
+        assert stats == {"submitted": 0, "cached": 0, "processed": 1, "errors": 0}
+        assert len(stub.batches) == 1
+
+        write_car_file(input_dir, "ID6LATER2", "Kamper z klimatyzacją")
+        stats = extract_features.process_all_files_batch(poll_interval=0.01)
+        assert stats == {"submitted": 0, "cached": 1, "processed": 0, "errors": 0}
+        assert output_dir.joinpath("features_ID6LATER2_latest.json").exists()
+
+    def test_collect_uses_rules_from_submit_time(self, stub, extractor, monkeypatch):
+        """Answers are merged with the fields the rules decided when the batch was sent"""
+        extract_features, input_dir, output_dir = extractor
+        rules = importlib.import_module("rules")
+        monkeypatch.setattr(extract_features, "USE_RULES", True)
+        write_car_file(input_dir, "ID6RULES1", "Kamper z klimatyzacją")
+        extract_features.process_all_files_batch(wait=False)
+        properties = stub.batch_requests[0]["body"]["response_format"]["json_schema"]["schema"]["properties"]
+        assert "has_air_conditioning" not in properties
+        submitted_version = rules.RULES_VERSION
+
+        # The rules change before the batch is collected
+        monkeypatch.setattr(rules, "decide_fields", lambda description: {})
+        monkeypatch.setattr(rules, "RULES_VERSION", "changed")
+        stats = extract_features.process_all_files_batch(poll_interval=0.01)
+        assert stats["processed"] == 1 and stats["errors"] == 0
+
+        result = json.loads((output_dir / "features_ID6RULES1_latest.json").read_text())
+        assert result["features"]["has_air_conditioning"] is True
+        cache = extract_features.get_cache()
+        assert cache.get(extract_features.description_cache_key(
+            "Kamper z klimatyzacją", use_rules=True, rules_version=submitted_version)) is not None
+        assert cache.get(extract_features.description_cache_key("Kamper z klimatyzacją", use_rules=True)) is None
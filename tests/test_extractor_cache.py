@@ -0,0 +1,64 @@
+import importlib
+import os
+import sys
+import pytest
+from pathlib import Path
+
+pytest.importorskip("instructor")
+import instructor
+from openai import OpenAI
+
+from openai_stub import OpenAIStub
+
+EXTRACTOR_DIR = Path(__file__).parent.parent / "extractor"
+sys.path.insert(0, str(EXTRACTOR_DIR))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from cache import ExtractionCache, cache_key
+
+
+class TestExtractionCache:
+    def test_key_covers_prompt_schema_and_model(self):
+        """Whitespace edits share a key, prompt/schema/model changes don't"""
+        base = cache_key("Kamper  z webasto\n", "prompt", {"a": 1}, "gpt-4o-mini")
+        assert cache_key(" Kamper z webasto", "prompt", {"a": 1}, "gpt-4o-mini") == base
+        assert cache_key("Kamper z klimą", "prompt", {"a": 1}, "gpt-4o-mini") != base
+        assert cache_key("Kamper z webasto", "prompt v2", {"a": 1}, "gpt-4o-mini") != base
+        assert cache_key("Kamper z webasto", "prompt", {"a": 2}, "gpt-4o-mini") != base
+        assert cache_key("Kamper z webasto", "prompt", {"a": 1}, "gpt-4o") != base
+
+    def test_eviction_keeps_recently_used(self, tmp_path):
+        """Least recently used entries are evicted once max_entries is exceeded"""
+        cache = ExtractionCache(tmp_path, max_entries=10)
+        keys = [cache_key(f"opis {i}", "p", {}, "m") for i in range(10)]
+        for i, key in enumerate(keys):
+            cache.put(key, {"n": i})
+            path = cache._path(key)
+            os.utime(path, (1000 + i, 1000 + i))
+
+        assert cache.get(keys[0]) == {"n": 0}  # touch the oldest entry
+        cache.put(cache_key("opis new", "p", {}, "m"), {"n": "new"})
+
+        assert cache.get(keys[0]) == {"n": 0}
+        assert cache.get(keys[1]) is None
+        assert cache.stats["evictions"] == 2
+        assert "hit rate" in cache.summary()
+
+        # The entry count survives a restart
+        assert ExtractionCache(tmp_path, max_entries=10)._entries == 9
+
+    def test_reposted_description_skips_the_model(self, tmp_path, monkeypatch):
+        """The same description under another car ID is served from the cache"""
+        extract_features = importlib.import_module("extract_features")
+        with OpenAIStub() as stub:
+            monkeypatch.setattr(extract_features, "client", instructor.from_openai(
+                OpenAI(api_key="test-key", base_url=stub.base_url, max_retries=0)))
+            monkeypatch.setattr(extract_features, "_cache", ExtractionCache(tmp_path))
+
+            first = extract_features.extract_features_from_description("Kamper z webasto", "ID6FIRST", "url-1")
+            second = extract_features.extract_features_from_description("Kamper  z webasto ", "ID6REPOST", "url-2")
+
+            assert len(stub.requests) == 1
+            assert second.car_id == "ID6REPOST"
+            assert second.features.model_dump() == first.features.model_dump()
+            assert extract_features.get_cache().stats["hits"] == 1
@@ -0,0 +1,108 @@
+import importlib
+import json
+import os
+import sys
+import pytest
+from pathlib import Path
+
+pytest.importorskip("instructor")
+import instructor
+from openai import OpenAI
+
+from openai_stub import OpenAIStub
+
+EXTRACTOR_DIR = Path(__file__).parent.parent / "extractor"
+sys.path.insert(0, str(EXTRACTOR_DIR))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from cache import ExtractionCache
+from manifest import ExtractionManifest
+
+
+def write_car_file(input_dir: Path, car_id: str, description: str):
+    payload = {
+        "url": f"https://www.otomoto.pl/dostawcze/oferta/test-{car_id}.html",
+        "data": {"car_name": f"Car {car_id}", "description": description},
+    }
+    path = input_dir / f"car_data_{car_id}_latest.json"
+    path.write_text(json.dumps(payload), encoding="utf-8")
+    return path
+
+
+class TestIncrementalExtraction:
+    @pytest.fixture
+    def extractor(self, tmp_path, monkeypatch):
+        """extract_features with a stub API, temporary directories, cache and manifest"""
+        extract_features = importlib.import_module("extract_features")
+        with OpenAIStub() as stub:
+            monkeypatch.setattr(extract_features, "client", instructor.from_openai(
+                OpenAI(api_key="test-key", base_url=stub.base_url, max_retries=0)))
+            input_dir = tmp_path / "extracted_data"
+            output_dir = tmp_path / "parsed_data"
+            input_dir.mkdir()
+            monkeypatch.setattr(extract_features, "INPUT_DIR", input_dir)
+            monkeypatch.setattr(extract_features, "OUTPUT_DIR", output_dir)
+            monkeypatch.setattr(extract_features, "_cache", ExtractionCache(tmp_path / "cache"))
+            monkeypatch.setattr(extract_features, "_manifest", ExtractionManifest(tmp_path / "manifest.json"))
+            yield extract_features, stub, input_dir, output_dir
+
+    def model_calls(self, stub):
+        return sum(1 for path, body in stub.requests
+                   if path.endswith("/chat/completions") and body["messages"][0]["content"] != "Test connection")
+
+    def test_only_new_and_changed_listings_are_extracted(self, extractor):
+        extract_features, stub, input_dir, output_dir = extractor
+        write_car_file(input_dir, "ID6INC1", "Kamper z webasto")
+        changed = write_car_file(input_dir, "ID6INC2", "Kamper z klimą")
+
+        extract_features.process_all_files()
+        assert self.model_calls(stub) == 2
+
+        # Nothing changed: no parsing of inputs beyond a stat, no model calls
+        loaded = []
+        original_load = extract_features.load_car_data
+        extract_features.load_car_data = lambda path: loaded.append(path) or original_load(path)
+        try:
+            extract_features.process_all_files()
+        finally:
+            extract_features.load_car_data = original_load
+        assert loaded == []
+        assert self.model_calls(stub) == 2
+
+        # A touched file with the same description is not re-extracted
+        os.utime(changed, (1, 1))
+        extract_features.process_all_files()
+        assert self.model_calls(stub) == 2
+
+        # An edited description is
+        write_car_file(input_dir, "ID6INC2", "Kamper z klimą i panelem słonecznym")
+        extract_features.process_all_files()
+        assert self.model_calls(stub) == 3
+        result = json.loads((output_dir / "features_ID6INC2_latest.json").read_text())
+        assert result["source_description"] == "Kamper z klimą i panelem słonecznym"
+
+    def test_orphaned_features_are_removed(self, extractor):
+        extract_features, stub, input_dir, output_dir = extractor
+        write_car_file(input_dir, "ID6KEEP", "Kamper z webasto")
+        gone = write_car_file(input_dir, "ID6GONE", "Kamper z klimą")
+        extract_features.process_all_files()
+        assert (output_dir / "features_ID6GONE_latest.json").exists()
+
+        gone.unlink()
+        extract_features.process_all_files()
+        assert not (output_dir / "features_ID6GONE_latest.json").exists()
+        assert (output_dir / "features_ID6KEEP_latest.json").exists()
+        assert "ID6GONE" not in extract_features.get_manifest().entries
+
+    def test_existing_features_without_manifest(self, extractor):
+        """Features written before the manifest existed are matched by their source description"""
+        extract_features, stub, input_dir, output_dir = extractor
+        write_car_file(input_dir, "ID6OLD", "Kamper z webasto")
+        output_dir.mkdir()
+        (output_dir / "features_ID6OLD_latest.json").write_text(json.dumps({
+            "car_id": "ID6OLD", "source_description": "Kamper z webasto", "features": {},
+        }))
+
+        extract_features.process_all_files()
+        assert self.model_calls(stub) == 0
+        assert "ID6OLD" in extract_features.get_manifest().entries
@@ -0,0 +1,95 @@
+import importlib
+import os
+import sys
+import pytest
+from pathlib import Path
+
+pytest.importorskip("instructor")
+import instructor
+from openai import OpenAI
+
+from openai_stub import DEFAULT_FEATURES, OpenAIStub
+
+EXTRACTOR_DIR = Path(__file__).parent.parent / "extractor"
+sys.path.insert(0, str(EXTRACTOR_DIR))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import rules
+from cache import ExtractionCache
+
+
+class TestKeywordRules:
+    def test_plain_mentions(self):
+        """Keywords decide fields as True, including text without Polish diacritics"""
+        decided = rules.decide_fields("Kamper z Webasto i klimatyzacją. Panele sloneczne 200W, okno dachowe Heki.")
+        assert decided == {"has_webasto": True, "has_air_conditioning": True,
+                           "has_solar_panels": True, "has_roof_window": True}
+
+    def test_negations_and_missing_mentions(self):
+        """Negated or absent features are False; negations don't leak across punctuation"""
+        decided = rules.decide_fields("Brak klimatyzacji. Bez wypadków, webasto sprawne.")
+        assert decided == {"has_webasto": True, "has_air_conditioning": False,
+                           "has_solar_panels": False, "has_roof_window": False}
+
+    def test_ambiguous_mentions_are_left_to_the_model(self):
+        """Hints, uncertain and contradictory mentions stay undecided"""
+        decided = rules.decide_fields("Ogrzewanie działa. Możliwość montażu paneli solarnych. "
+                                      "Klimatyzacja, brak klimy z tyłu.")
+        assert decided == {"has_roof_window": False}
+
+    @pytest.mark.parametrize("description, field", [
+        ("Okno kamperowe Dometic z moskitierą, ogrzewanie.", "has_roof_window"),
+        ("Na dachu dwa onka dachowe, jedno w łazience.", "has_roof_window"),
+        ("Szczelnie zasłonięte + otwierany dach.", "has_roof_window"),
+        ("Pod sufitem, jest też duże uchylne okno.", "has_roof_window"),
+        ("Silnik 2,49 osobowyklimasuper stanidealny.", "has_air_conditioning"),
+        ("Wyposażony w ubikację, bateria słoneczna, zbiornik na wodę.", "has_solar_panels"),
+        ("Ogrzewanie gazowe Truma - butla pod siedziskiem.", "has_webasto"),
+        ("Zamontować 2 okna dachowe z wentylatorami – mam je, są nowe.", "has_roof_window"),
+    ])
+    def test_wording_the_rules_miss_is_left_to_the_model(self, description, field):
+        """Listings from parsed_data where the rules used to contradict the model"""
+        assert field not in rules.decide_fields(description)
+
+    @pytest.mark.parametrize("description, field, value", [
+        ("Webasto: brak", "has_webasto", False),
+        ("Klimatyzacja - nie", "has_air_conditioning", False),
+        ("klimatyzacja brak", "has_air_conditioning", False),
+        ("panele słoneczne brak", "has_solar_panels", False),
+        ("okno dachowe: nie", "has_roof_window", False),
+        ("klimatyzacja nie działa", "has_air_conditioning", None),
+        ("Wyposażenie: webasto (niesprawne)", "has_webasto", None),
+        ("brak klimy, webasto, paneli", "has_webasto", None),
+        ("Klimatyzacja sprawna, nie wymaga napraw", "has_air_conditioning", True),
+    ])
+    def test_negations_after_the_mention(self, description, field, value):
+        """Negations following a mention within its phrase decide False or leave the field to the model"""
+        assert rules.decide_fields(description).get(field) is value
+
+    def test_reduced_model(self):
+        model = rules.reduced_model(frozenset({"has_webasto", "has_solar_panels"}))
+        assert "has_webasto" not in model.model_fields
+        assert "bed_orientation" in model.model_fields
+        assert rules.reduced_model(frozenset()) is rules.CamperFeatures
+
+
+class TestRuleAssistedExtraction:
+    def test_model_only_asked_for_undecided_fields(self, tmp_path, monkeypatch):
+        """The request schema omits decided fields and the result merges both sources"""
+        extract_features = importlib.import_module("extract_features")
+        monkeypatch.setattr(extract_features, "_cache", ExtractionCache(tmp_path / "cache"))
+        monkeypatch.setattr(extract_features, "USE_RULES", True)
+
+        with OpenAIStub(dict(DEFAULT_FEATURES, has_webasto=False, has_air_conditioning=True)) as stub:
+            monkeypatch.setattr(extract_features, "client", instructor.from_openai(
+                OpenAI(api_key="test-key", base_url=stub.base_url, max_retries=0)))
+            result = extract_features.extract_features_from_description(
+                "Kamper z webasto, bez klimatyzacji. Ogrzewanie podłogowe.", "ID6RULES", "url")
+
+        properties = stub.requests[0][1]["tools"][0]["function"]["parameters"]["properties"]
+        assert "has_air_conditioning" not in properties
+        assert "has_webasto" not in properties  # a hint doesn't override a plain mention
+        assert "bed_orientation" in properties
+        assert result.features.has_air_conditioning is False
+        assert result.features.has_webasto is True
+        assert result.features.has_roof_window is False
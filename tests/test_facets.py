@@ -0,0 +1,98 @@
+import random
+import sys
+import threading
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from facets import FacetIndex, facet_value, parse_selection
+
+
+def random_features(rng: random.Random) -> dict:
+    return {
+        "has_webasto": rng.random() < 0.4,
+        "has_solar_panels": rng.random() < 0.5,
+        "bed_orientation": rng.choice(["lengthwise", "widthwise", "unknown"]),
+        "kitchen_location": rng.choice(["inside", "outside", "none", "unknown"]),
+        "bed_length": "200cm",
+    }
+
+
+def brute_force(features: dict, selection) -> set:
+    return {car_id for car_id, car in features.items()
+            if all(facet_value(field, car.get(field)) in values for field, values in selection)}
+
+
+class TestFacets:
+    def test_selection_matches_brute_force(self):
+        rng = random.Random(11)
+        index = FacetIndex()
+        features = {f"ID6F{i:04d}": random_features(rng) for i in range(500)}
+        for car_id, car in features.items():
+            index.set(car_id, car)
+        # Updates and removals reuse bit positions
+        for car_id in rng.sample(sorted(features), 100):
+            features[car_id] = random_features(rng)
+            index.set(car_id, features[car_id])
+        for car_id in rng.sample(sorted(features), 50):
+            del features[car_id]
+            index.remove(car_id)
+        for i in range(20):
+            features[f"ID6NEW{i}"] = random_features(rng)
+            index.set(f"ID6NEW{i}", features[f"ID6NEW{i}"])
+        assert len(index) == len(features) == 470
+
+        for params in [
+            {},
+            {"has_webasto": "true"},
+            {"has_webasto": "true", "has_solar_panels": "true", "bed_orientation": "lengthwise",
+             "kitchen_location": "inside"},
+            {"kitchen_location": "inside, OUTSIDE", "has_solar_panels": "false"},
+            {"bed_orientation": "sideways"},
+        ]:
+            selection = parse_selection(params)
+            expected = brute_force(features, selection)
+            assert index.filter(selection).bit_count() == len(expected)
+            selected = index.select(selection)
+            assert len(selected) == len(expected) and set(selected) == expected
+
+            counts = index.counts(selection)
+            for field in ("has_webasto", "kitchen_location"):
+                others = tuple(item for item in selection if item[0] != field)
+                within = brute_force(features, others)
+                for value, count in counts[field].items():
+                    assert count == sum(1 for car_id in within
+                                        if facet_value(field, features[car_id][field]) == value)
+
+    def test_select_while_positions_are_reused(self):
+        """Concurrent removals and re-adds never make a selection return another car"""
+        index = FacetIndex()
+        for i in range(200):
+            index.set(f"ID6W{i:03d}", {"has_webasto": i % 2 == 0})
+        stop = threading.Event()
+
+        def churn():
+            rng = random.Random(5)
+            while not stop.is_set():
+                # Freed positions are taken by cars without webasto
+                car_id = f"ID6W{rng.randrange(0, 200, 2):03d}"
+                index.remove(car_id)
+                index.set(f"ID6NO{rng.randrange(1000)}", {"has_webasto": False})
+                index.set(car_id, {"has_webasto": True})
+
+        thread = threading.Thread(target=churn)
+        thread.start()
+        try:
+            for _ in range(200):
+                selected = index.select(parse_selection({"has_webasto": "true"}))
+                assert all(int(car_id[4:]) % 2 == 0 for car_id in selected)
+        finally:
+            stop.set()
+            thread.join()
+
+    def test_parse_selection(self):
+        assert parse_selection({"has_webasto": "True", "bed_length": "200cm", "kitchen_location": ""}) == (
+            ("has_webasto", ("true",)),)
+        assert facet_value("has_webasto", "yes") is None
+        assert facet_value("roof_height", " High ") == "high"
@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from html_store import HtmlSnapshotStore, car_id_from_html, import_legacy
+
+
+def offer_page(car_id: str, rng: random.Random) -> str:
+    """Synthetic offer page: shared page chrome around a car-specific part"""
+    chrome = "".join(f'<li class="nav-item"><a href="/kategoria-{i}">Kategoria {i}</a></li>' for i in range(300))
+    words = ["kamper", "webasto", "lodówka", "markiza", "silnik", "przebieg", "bagażnik", "łazienka"]
+    description = " ".join(rng.choice(words) for _ in range(400))
+    return (f'<html><head><link rel="canonical" href="https://www.otomoto.pl/dostawcze/oferta/van-{car_id}.html">'
+            f"</head><body><nav>{chrome}</nav><main><h1>{car_id}</h1><p>{description}</p>"
+            f"<span>{rng.randint(20, 250)} 000 PLN</span></main><footer>{chrome}</footer></body></html>")
+
+
+class TestHtmlSnapshotStore:
+    def test_dictionary_compression_and_dedup(self, tmp_path):
+        """A trained dictionary shrinks stored pages; identical captures share one object"""
+        store = HtmlSnapshotStore(tmp_path, train_samples=10)
+        rng = random.Random(1)
+        pages = {f"ID6H{i:04d}": offer_page(f"ID6H{i:04d}", rng) for i in range(30)}
+        for car_id, html in pages.items():
+            store.save(car_id, "", html)
+        assert store.dictionary_id
+
+        saved = store.save("ID6H0001", "", pages["ID6H0001"])
+        assert saved.deduplicated
+        stats = store.stats()
+        assert stats["objects"] == 30 and stats["captures"] == 30
+        assert stats["stored_bytes"] * 10 < stats["html_bytes"]
+
+        # Objects written before and after training both read back
+        for car_id, html in pages.items():
+            assert store.read(store.captures(car_id)[-1]["hash"]) == html
+
+    def test_retention_and_gc(self, tmp_path):
+        """Only the newest captures per car are kept and unreferenced objects are collected"""
+        store = HtmlSnapshotStore(tmp_path, keep_per_car=2, train_samples=0)
+        hashes = [store.save("ID6RET1", "", f"<html>version {i}</html>").hash for i in range(4)]
+        assert [capture["hash"] for capture in store.captures("ID6RET1")] == hashes[2:]
+        # Recapturing the latest page only touches last_seen
+        store.save("ID6RET1", "", "<html>version 3</html>")
+        assert len(store.captures("ID6RET1")) == 2
+
+        assert store.gc(grace_seconds=3600) == 0
+        assert store.gc(grace_seconds=0) == 2
+        assert sorted(store.object_hashes()) == sorted(hashes[2:])
+
+        # A save deduplicating against an old unreferenced object while gc runs keeps it alive
+        orphan = store.save("ID6RET2", "", "<html>orphan</html>").hash
+        (tmp_path / "cars" / "ID6RET2.json").unlink()
+        os.utime(store.object_path(orphan), (0, 0))
+        object_hashes = store.object_hashes
+
+        def save_during_gc():
+            assert store.save("ID6RET3", "", "<html>orphan</html>").deduplicated
+            return object_hashes()
+
+        store.object_hashes = save_during_gc
+        assert store.gc(grace_seconds=3600) == 0
+        assert store.read(orphan) == "<html>orphan</html>"
+
+    def test_import_legacy_files(self, tmp_path):
+        legacy = tmp_path / "page_html_20250101_120000.html"
+        html = offer_page("ID6LEG1", random.Random(2))
+        legacy.write_text(html, encoding="utf-8")
+        assert car_id_from_html(html) == "ID6LEG1"
+
+        store = HtmlSnapshotStore(tmp_path)
+        assert import_legacy(store, tmp_path, remove=True) == 1
+        assert not legacy.exists()
+        assert store.read(store.captures("ID6LEG1")[0]["hash"]) == html
@@ -0,0 +1,209 @@
+import importlib
+import struct
+import sys
+import threading
+import urllib.error
+import zlib
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from duplicates import DuplicateIndex
+from html_store import HtmlSnapshotStore
+from image_store import ImageFetcher, ImageStore, allowed_url, fetch_url
+from storage import JsonFileStorage
+
+
+def png(width: int, height: int, color: bytes) -> bytes:
+    """A solid RGB PNG image"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + color * width for _ in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+IMAGES = {
+    "/v1/files/red/image": png(640, 480, b"\xff\x00\x00"),
+    "/v1/files/blue/image": png(320, 240, b"\x00\x00\xff"),
+    # The same photo under another listing
+    "/v1/files/red-copy/image": png(640, 480, b"\xff\x00\x00"),
+}
+
+
+@pytest.fixture
+def cdn():
+    """Local HTTP server standing in for the image CDN; yields (base URL, request log)"""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            if self.path.startswith("/redirect?to="):
+                self.send_response(302)
+                self.send_header("Location", self.path.split("=", 1)[1])
+                self.end_headers()
+                return
+            content = IMAGES.get(self.path)
+            if content is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", requests
+    server.shutdown()
+    server.server_close()
+
+
+class TestImageStore:
+    def test_fetcher_mirrors_and_deduplicates(self, tmp_path, cdn):
+        base_url, requests = cdn
+        store = ImageStore(tmp_path / "images")
+        fetcher = ImageFetcher(store, workers=2, retry_seconds=3600, hosts=("127.0.0.1",))
+        urls = [base_url + path for path in IMAGES] + [base_url + "/v1/files/gone/image"]
+
+        assert fetcher.enqueue(urls + urls) == 4
+        fetcher.wait(timeout=10)
+        assert len(store.hashes) == 3
+        assert store.hash_of(urls[0]) == store.hash_of(urls[2])
+        assert store.stats()["objects"] == 2
+
+        # Mirrored and recently failed URLs are not fetched again
+        assert fetcher.enqueue(urls) == 0
+        assert len(requests) == 4
+        fetcher.stop()
+
+        # The URL map survives a restart
+        assert ImageStore(tmp_path / "images").hashes == store.hashes
+
+    def test_fetcher_only_downloads_from_image_hosts(self, tmp_path, cdn):
+        """URLs and redirects outside the allowed hosts are never requested"""
+        base_url, requests = cdn
+        assert allowed_url("https://ireland.apollo.olxcdn.com/v1/files/abc/image")
+        assert not allowed_url("https://olxcdn.com.evil.example/image")
+        assert not allowed_url("http://olxcdn.com@169.254.169.254/latest/meta-data")
+        assert not allowed_url("file:///etc/passwd")
+
+        store = ImageStore(tmp_path / "images")
+        fetcher = ImageFetcher(store, workers=1)
+        assert fetcher.enqueue([base_url + "/v1/files/red/image", "http://169.254.169.254/latest"]) == 0
+        fetcher.stop()
+
+        # The local CDN redirects to the same server under another name
+        port = base_url.rsplit(":", 1)[1]
+        with pytest.raises(urllib.error.HTTPError):
+            fetch_url(f"{base_url}/redirect?to=http://localhost:{port}/v1/files/red/image", hosts=("127.0.0.1",))
+        assert fetch_url(f"{base_url}/redirect?to={base_url}/v1/files/red/image", hosts=("127.0.0.1",)) == \
+            IMAGES["/v1/files/red/image"]
+        assert [path for path in requests if path.startswith("/v1")] == ["/v1/files/red/image"]
+
+    def test_thumbnails(self, tmp_path):
+        pytest.importorskip("PIL")
+        from PIL import Image
+
+        store = ImageStore(tmp_path / "images", sizes=(160, 480))
+        image_hash = store.add("https://cdn.example/red", IMAGES["/v1/files/red/image"])
+        path, media_type = store.image(image_hash, "160")
+        assert media_type == "image/webp"
+        with Image.open(path) as thumbnail:
+            assert thumbnail.size == (160, 120)
+        assert store.image(image_hash, "200")[0] == store.thumbnail_path(image_hash, 480)
+        assert store.image(image_hash, "orig")[1] == "image/png"
+
+
+class TestImageEndpoint:
+    @pytest.fixture
+    def backend(self, tmp_path, monkeypatch, cdn):
+        """The backend app with an image fetcher that downloads from the fake CDN"""
+        monkeypatch.chdir(BACKEND_DIR)
+        main = importlib.import_module("main")
+
+        storage_dir = tmp_path / "extracted_data"
+        storage_dir.mkdir()
+        monkeypatch.setattr(main, "STORAGE_DIR", storage_dir)
+        monkeypatch.setattr(main, "STORAGE", JsonFileStorage(storage_dir))
+        monkeypatch.setattr(main, "SNAPSHOT_PATH", "")
+        monkeypatch.setattr(main, "HTML_STORE", HtmlSnapshotStore(tmp_path / "html_snapshots"))
+        store = ImageStore(tmp_path / "images")
+        monkeypatch.setattr(main, "IMAGE_STORE", store)
+        monkeypatch.setattr(main, "DUPLICATES", DuplicateIndex(store))
+        monkeypatch.setattr(main, "IMAGE_URL_CARS", {})
+        fetcher = ImageFetcher(store, workers=2, on_added=main.image_mirrored, hosts=("127.0.0.1",))
+        monkeypatch.setattr(main, "IMAGE_FETCHER", fetcher)
+        main.rebuild_index()
+        yield main, fetcher, cdn[0]
+        fetcher.stop()
+
+    def test_saved_images_served_locally(self, backend):
+        """Images of a saved car are mirrored and the pages link the local copies"""
+        main, fetcher, base_url = backend
+        client = TestClient(main.app)
+        image_main = base_url + "/v1/files/red/image"
+        images = [image_main, base_url + "/v1/files/blue/image"]
+        response = client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/van-ID6IMG01.html",
+            "data": {"car_name": "Van", "image_main": image_main, "images": images}})
+        assert response.status_code == 200
+        fetcher.wait(timeout=10)
+
+        image_hash = main.IMAGE_STORE.hash_of(image_main)
+        assert f'src="/img/{image_hash}/160"' in client.get("/cars").text
+        assert f'/img/{image_hash}/480' in client.get("/car/ID6IMG01").text
+
+        response = client.get(f"/img/{image_hash}/160")
+        assert response.status_code == 200
+        # The original standing in for a thumbnail (no Pillow) is not cached for good
+        expected = ("public, max-age=31536000, immutable" if response.headers["content-type"] == "image/webp"
+                    else "public, max-age=3600")
+        assert response.headers["cache-control"] == expected
+        assert response.headers["content-type"] in ("image/webp", "image/png")
+        response = client.get(f"/img/{image_hash}/orig")
+        assert response.content == IMAGES["/v1/files/red/image"]
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+
+        assert client.get(f"/img/{'0' * 64}/160").status_code == 404
+        assert client.get("/img/../160").status_code == 404
+        assert client.get(f"/img/{image_hash}/huge").status_code == 404
+
+    def test_reposted_listing_flagged(self, backend):
+        """A car saved with the photos of another car is linked to it"""
+        main, fetcher, base_url = backend
+        client = TestClient(main.app)
+        red, blue, red_copy = (base_url + path for path in IMAGES)
+        client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/van-ID6FIRST.html",
+            "data": {"car_name": "Van", "image_main": red, "images": [red, blue]}})
+        fetcher.wait(timeout=10)
+
+        # Same photos under new CDN URLs: linked as soon as they are mirrored
+        repost = {"url": "https://www.otomoto.pl/dostawcze/oferta/van-ID6AGAIN.html",
+                  "data": {"car_name": "Van", "image_main": red_copy, "images": [red_copy, blue]}}
+        assert client.post("/save-extracted-data", json=repost).json()["images_pending"] == 1
+        fetcher.wait(timeout=10)
+        response = client.get("/api/cars/ID6AGAIN/duplicates").json()
+        assert response["status"] == "checked"
+        assert [(car["car_id"], car["shared_images"]) for car in response["duplicates"]] == [("ID6FIRST", 2)]
+        assert client.post("/save-extracted-data", json=repost).json()["images_pending"] == 0
+        assert 'href="/car/ID6AGAIN"' in client.get("/car/ID6FIRST").text
+
+        # A single photo, e.g. a shared stock image, can't tell
+        client.post("/save-extracted-data", json={
+            "url": "https://www.otomoto.pl/dostawcze/oferta/van-ID6STOCK.html",
+            "data": {"car_name": "Van", "image_main": red, "images": [red]}})
+        response = client.get("/api/cars/ID6STOCK/duplicates").json()
+        assert (response["status"], response["duplicates"]) == ("unknown", [])
+
+        assert client.get("/api/cars/ID6NOPE/duplicates").status_code == 404
@@ -0,0 +1,102 @@
+import json
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from html_store import HtmlSnapshotStore
+from reparse import apply_results, extract_page_data, format_date, parse_document, reparse_all
+from storage import JsonFileStorage
+
+OFFER_PAGE = """<!DOCTYPE html>
+<html><head><title>Ford Transit kamper</title><meta charset="utf-8"></head>
+<body>
+  <h1 class="offer-title big-text">Ford Transit Kamper 2.2 TDCi</h1>
+  <p class="e1kkw2jt0 ooa-1">Używany • Do negocjacji</p>
+  <span class="offer-price__number">39 000 </span>
+  <p class="ef0vquw1">Boguszów-Gorce, wałbrzyski, Dolnośląskie</p>
+  <div class="params">
+    <p class="ez0zock2">262 000 km</p>
+    <p class="ez0zock2">Diesel</p>
+    <p class="ez0zock2">Manualna</p>
+    <p class="ez0zock2">Kamper</p>
+    <p class="ez0zock2">2 198 cm3</p>
+  </div>
+  <div data-testid="phone-section"><button><span class="n-button-text-wrapper">+48 600 100 200</span></button></div>
+  <div class="ooa-unlmzs e11t9j224"><p>Ogrzewanie Webasto,<br>lodówka &amp; markiza.</p></div>
+  <div class="row"><div><p>Marka pojazdu</p></div><div><p>Ford</p></div></div>
+  <div class="row"><div><p>Model pojazdu</p></div><div><p>Transit</p></div></div>
+  <div class="row"><div><p>Rok produkcji</p></div><div><p>2013</p></div></div>
+  <div class="row"><div><p>VIN</p></div><div><p>WF0XXXTTFXDG12345</p></div></div>
+  <div class="row"><div><p>Numer rejestracyjny pojazdu</p></div><div><p>DW 12345</p></div></div>
+  <div class="row"><div><p>Data pierwszej rejestracji w historii pojazdu</p></div><div><p>5 marca 2013</p></div></div>
+  <div class="embla-thumbs__container">
+    <img src="https://ireland.apollo.olxcdn.com/v1/files/a/image;s=148x110">
+    <img src="https://ireland.apollo.olxcdn.com/v1/files/b/image;s=148x110" />
+    <img alt="no source">
+  </div>
+</body></html>"""
+
+
+class TestReparse:
+    def test_extract_page_data(self):
+        """The same fields extractPageData() reads in the browser come out of saved HTML"""
+        data = extract_page_data(OFFER_PAGE, parser="builtin")
+        assert data == {
+            "car_name": "Ford Transit Kamper 2.2 TDCi",
+            "price": "39 000",
+            "location": "Boguszów-Gorce, wałbrzyski, Dolnośląskie",
+            "description": "Ogrzewanie Webasto,lodówka & markiza.",
+            "phone": "48 600 100 200",  # same \b match as the userscript
+            "vin": "WF0XXXTTFXDG12345",
+            "car_type": "Używany",
+            "negotiable": "Do negocjacji",
+            "mileage": "262 000 km",
+            "fuel": "Diesel",
+            "transmission": "Manualna",
+            "vehicle_type": "Kamper",
+            "cubic_capacity": "2 198 cm3",
+            "brand": "Ford",
+            "model": "Transit",
+            "registration_number": "DW 12345",
+            "first_registration_date": "05.03.2013",
+            "images": ["https://ireland.apollo.olxcdn.com/v1/files/a/image",
+                       "https://ireland.apollo.olxcdn.com/v1/files/b/image"],
+            "image_main": "https://ireland.apollo.olxcdn.com/v1/files/a/image",
+            "year": "2013",
+        }
+        assert format_date("12 października 2020") == "12.10.2020"
+        assert format_date("2020") == "2020"
+
+    def test_selectors(self):
+        document = parse_document(OFFER_PAGE, parser="builtin")
+        assert [e.text() for e in document.select("div.params p")][:2] == ["262 000 km", "Diesel"]
+        assert len(document.select('[data-testid*="phone"] span')) == 1
+        assert document.select("div.missing p") == []
+
+    def test_bulk_reparse_updates_records(self, tmp_path):
+        """Re-extraction merges page fields into saved records and keeps user fields"""
+        store = HtmlSnapshotStore(tmp_path / "html", train_samples=0)
+        storage = JsonFileStorage(tmp_path / "extracted_data")
+        for i in range(3):
+            car_id = f"ID6REP{i}"
+            store.save(car_id, "", OFFER_PAGE.replace("39 000", f"{40 + i} 000"))
+            storage.write(car_id, {"url": f"https://www.otomoto.pl/oferta/van-{car_id}.html", "version": 5, "data": {
+                "car_name": "Old name", "price": "1", "phone": "", "user_notes": "call", "user_grade": 4}})
+        storage.write("ID6NOHTML", {"url": "", "data": {"car_name": "x"}})
+
+        car_ids = ["ID6REP0", "ID6REP1", "ID6REP2", "ID6NOHTML"]
+        stats = apply_results(storage, reparse_all(store.directory, car_ids, workers=2, parser="builtin"))
+        assert (stats["parsed"], stats["updated"], stats["errors"]) == (3, 3, 1)
+        assert stats["fields"]["price"] == 3
+
+        saved = json.loads((tmp_path / "extracted_data" / "car_data_ID6REP1_latest.json").read_text(encoding="utf-8"))
+        assert saved["data"]["price"] == "41 000"
+        assert saved["data"]["numeric"]["price"] == 41000
+        assert saved["data"]["phone"] == "48 600 100 200"
+        assert (saved["data"]["user_notes"], saved["data"]["user_grade"]) == ("call", 4)
+        assert saved["version"] > 5
+
+        again = apply_results(storage, reparse_all(store.directory, car_ids[:3], workers=1, parser="builtin"))
+        assert (again["updated"], again["unchanged"]) == (0, 3)